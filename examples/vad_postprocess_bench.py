@@ -0,0 +1,82 @@
+'''
+@Project:       examples
+@File:          vad_postprocess_bench.py
+@File Created:  Kyle Wang(kylewang1977@gmail.com) @[2026-10-17 20:40:00]
+@Last Modified: 2026-10-17 20:40:00
+@Copyright:     MIT License 2024-2034 Kyle
+@Function:      FSMN VAD 各阶段耗时: 分贝计算、FSMN 模型、后处理(逐帧状态机与片段记录)。
+                后处理耗时按 每秒语音 的毫秒数给出, 用于比较后处理优化前后的开销。
+                python examples/vad_postprocess_bench.py [--audio ref.wav] [--seconds 60] [--runs 3]
+'''
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from libsensevoiceOne.profile_bench import reference_clip
+from libsensevoiceOne.utils.fsmn_vad import FSMNVad
+
+
+def bench_once(vad, waveform):
+    """与 E2EVadModel.infer_offline 相同的步骤, 分别计时; 返回 (各阶段秒数, 语音片段)"""
+    feats, _ = vad.extract_feature(waveform)
+    model = vad.vad
+    model.waveform = waveform[None, ...]
+    times = {}
+
+    start = time.perf_counter()
+    model.compute_decibel()
+    times["decibel"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    model.compute_scores(feats[None, ...])
+    times["fsmn"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    model.detect_last_frames()
+    times["post"] = time.perf_counter() - start
+
+    segments = [[buf.start_ms, buf.end_ms] for buf in model.output_data_buf
+                if buf.contain_seg_start_point and buf.contain_seg_end_point]
+    model.all_reset_detection()
+    return times, segments
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="FSMN VAD post-processing benchmark")
+    parser.add_argument("--audio", default=None, help="16k wav, default: synthetic speech")
+    parser.add_argument("--seconds", type=float, default=60.0, help="length of the synthetic audio")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--vad-dir", default=os.path.join(project_root, "resources", "vad"))
+    args = parser.parse_args(argv)
+
+    if args.audio is not None:
+        import soundfile as sf
+        waveform, sr = sf.read(args.audio, dtype="float32")
+        assert sr == 16000, f"only support 16k sample rate, current sample rate is {sr}"
+        if waveform.ndim > 1:
+            waveform = waveform[:, 0]
+    else:
+        waveform = reference_clip(args.seconds)
+
+    vad = FSMNVad(args.vad_dir)
+    runs = [bench_once(vad, waveform) for _ in range(args.runs)]
+    segments = runs[0][1]
+    speech = sum(end - beg for beg, end in segments) / 1000
+    duration = waveform.shape[0] / 16000
+    print(f"audio {duration:.1f} s, {len(segments)} segments, speech {speech:.1f} s")
+    for name in ("decibel", "fsmn", "post"):
+        cost = statistics.median(times[name] for times, _ in runs)
+        print(f"  {name:<8} {cost * 1000:9.1f} ms")
+    post = statistics.median(times["post"] for times, _ in runs)
+    print(f"  post-processing per second of speech: {post * 1000 / max(speech, 1e-3):.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
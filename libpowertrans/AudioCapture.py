@@ -16,6 +16,7 @@ import threading
 import wave
 import pyaudio
 import numpy as np
+from collections import deque
 from datetime import datetime
 from typing import Union, Tuple
 
@@ -30,6 +31,10 @@ from libpowertrans.funcsLib import (
         log_init, 
         find_stereo_mix_device,
         print_progress_bar)
+from libsensevoiceOne.utils.resample import PolyphaseResampler
+from libsensevoiceOne.thread_budget import pin_current_thread
+
+_VAD_SAMPLE_RATE = 16000    # FSMN VAD 只支持 16k 输入
 
 _paFormat2Name = {
     pyaudio.paFloat32: 'paFloat32',
@@ -60,6 +65,12 @@ class Recorder(object):
         self.audio_queue = queue.Queue(maxsize=maxQueueSize)
         self.listenT = None
         self.isRunning = False
+        self.vad_blocks = deque()   # listen_vad: 尚未切出的音频块, 首个采样在流中的序号为 vad_buf_beg
+        self.vad_buf_len = 0        # listen_vad: vad_blocks 的总采样数
+        self.vad_buf_beg = 0
+        self.vad_start = None       # listen_vad: 当前语音段的起点(ms), 未开始时为 None
+        self.vad_segments = deque() # listen_vad: 已切出、尚未返回的语音段
+        self.vad_resampler = None   # listen_vad: 采样率不是 16k 时, 送入 VAD 前的流式重采样
         self.PyAudio = pyaudio.PyAudio()
         logging.debug('*** Recorder object init ***')
 
@@ -124,12 +135,17 @@ class Recorder(object):
         save_wave:bool=False, 
         mute_check:bool=False,
         speech_completeness:bool=False,
+        cpu_affinity:list=None,
+        vad=None,
         )->None:
         """
         loop for continuously generate the audio file.
         put the result into the queue: data queue and manage it.
         """
         if not self.isInit: raise RuntimeError(f"未初始化!")
+        # 只绑定本录音线程(Linux), 与推理线程池分开, 避免推理时录音溢出
+        if pin_current_thread(cpu_affinity):
+            logging.info(f'listen_loop cpu affinity: {sorted(cpu_affinity)}')
         logging.info('listen_loop start')
         self.isRunning = True
         while True:
@@ -142,6 +158,7 @@ class Recorder(object):
                                      save_wave=save_wave,
                                      mute_check=mute_check,
                                      speech_completeness=speech_completeness,
+                                     vad=vad,
                                      )
             if self.isStop: break
             self.audio_queue.put(listen_res)
@@ -155,6 +172,7 @@ class Recorder(object):
         file_name:str=None, 
         mute_check:bool=True,
         speech_completeness:bool=False,
+        vad=None,
         ):
         """
         Capture the audio data from the select input stream to a file or a ndarray.
@@ -169,6 +187,8 @@ class Recorder(object):
         :param speech_completeness: whether to secure a speech is completed. 
                             when it's true, the duration will be a dynamic one and a max 10 seconds more data could be added.
                             if the mute_check is on, then, the start silent segments will be discard untill there is a voice.
+        :param vad:         streaming VAD session (FSMNVad.stream()). When given, one utterance is cut
+                            at the VAD's speech start/end (see listen_vad); seconds/mute_check are ignored.
 
         Return: Dict["is_save":bool, "file":str, "is_array":bool, "array":np.ndarry, "is_mute":bool]
         ----------
@@ -181,7 +201,14 @@ class Recorder(object):
         res = {"is_save": save_wave, "file": file_name, "is_mute":False, "array":None}
         logging.debug((f"数据获取-audioId[{self.audioId}]:{seconds}s ch={self.channels}; sr:{(self.framerate/1000):.3g}k "
                         f"save:{save_wave}; mute_check:{mute_check}; speech_completeness:{speech_completeness}"))
-        if not speech_completeness or seconds<5:
+        if vad is not None:
+            array = self.listen_vad(vad)
+            if save_wave and not self.isStop:
+                file_name = self.__saveF(file_name, self.channels, 2, self.framerate, array)
+                res["file"] = file_name
+            if not self.isStop:
+                res["array"] = array
+        elif not speech_completeness or seconds<5:
             second_bytes_list = []
             total_frames = int(self.framerate*seconds)
             remaining_frames = total_frames
@@ -280,11 +307,71 @@ class Recorder(object):
             return None
         return array
 
+    def listen_vad(self, vad, keep_seconds:float=2.0)->np.ndarray:
+        """
+        以流式 VAD 切分语音: 每读一块(chunkSize)就送入 VAD, 在 VAD 判定的语音起点到终点处切出一句,
+        不再按 1 秒的能量批次判断, 切分延迟由 VAD 的尾部静音参数决定。
+        VAD 状态、未切出的音频和已切出未返回的语音段都在多次调用之间保留:
+        一块音频中结束的多个语音段依次由之后的调用返回, 不会丢失。
+        采样率不是 16k 时, 送入 VAD 的音频先流式重采样到 16k, 返回的语音段仍是原采样率。
+
+        Parameters
+        ----------
+        :param vad:         streaming VAD session (FSMNVad.stream()), fed with the mean of the channels.
+        :param keep_seconds: 无语音时保留的音频长度(秒), 需大于 VAD 的起点回看时长。
+
+        Return: 
+        ----------
+        np.ndarray: shape=(frames, channels); dtype=np.float32; data range=[-1, 1]. None when stopped.
+        """
+        if not self.isInit: raise RuntimeError(f"未初始化!")
+        samples_per_ms = self.framerate / 1000
+        if self.framerate != _VAD_SAMPLE_RATE and (
+                self.vad_resampler is None or self.vad_resampler.orig_sr != self.framerate):
+            self.vad_resampler = PolyphaseResampler(self.framerate, _VAD_SAMPLE_RATE)
+        while not self.vad_segments and not self.isStop:
+            data = self.PyStream.read(self.chunkSize)
+            block = self.__b2array([data], self.format)
+            # 只追加块, 切出语音段时才拼接一次
+            self.vad_blocks.append(block)
+            self.vad_buf_len += block.shape[0]
+            mono = block.mean(axis=1)
+            if self.framerate != _VAD_SAMPLE_RATE:
+                mono = self.vad_resampler.process(mono)
+            # 处理本块的全部事件, 结束的语音段先入队
+            for start_ms, end_ms in vad.accept(mono):
+                if start_ms >= 0:
+                    self.vad_start = start_ms
+                if end_ms < 0 or self.vad_start is None:
+                    continue
+                beg = max(0, int(self.vad_start * samples_per_ms) - self.vad_buf_beg)
+                end = max(beg, int(end_ms * samples_per_ms) - self.vad_buf_beg)
+                buf = self.vad_blocks[0] if len(self.vad_blocks) == 1 else np.concatenate(self.vad_blocks)
+                array = buf[beg:end]
+                self.vad_blocks.clear()
+                if end < buf.shape[0]:
+                    self.vad_blocks.append(buf[end:])
+                self.vad_buf_len = max(0, buf.shape[0] - end)
+                self.vad_buf_beg += end
+                logging.debug(f"VAD 语音段: [{self.vad_start}, {end_ms}]ms, 时长:{array.shape[0]/self.framerate:.2f}s")
+                self.vad_start = None
+                self.vad_segments.append(array)
+            if self.vad_start is None:
+                # 按整块丢弃, 保留的音频不少于 keep_seconds
+                keep = int(keep_seconds * self.framerate)
+                while self.vad_blocks and self.vad_buf_len - self.vad_blocks[0].shape[0] >= keep:
+                    drop = self.vad_blocks.popleft().shape[0]
+                    self.vad_buf_len -= drop
+                    self.vad_buf_beg += drop
+        return self.vad_segments.popleft() if self.vad_segments else None
+
     def run(self, 
         seconds=1,
         save_wave:bool=False, 
         mute_check:bool=True,
         speech_completeness:bool=True,
+        cpu_affinity:list=None,
+        vad=None,
         ):
         """ 
         Auto run. start the listen_t thread. 
@@ -295,10 +382,14 @@ class Recorder(object):
         :param seconds:     recording time length. in seconds.
         :param save_wave:   whether save the listen data to a wave file.
         :param mute_check:  whether to check the audio signal is mute or not.
+        :param cpu_affinity: CPU ids the listen thread is bound to (Linux only), 
+                            e.g. ThreadBudget.capture_cores. None: no binding.
+        :param vad:         streaming VAD session (FSMNVad.stream()): cut utterances at the VAD's
+                            speech boundaries instead of energy batches. None: energy based.
         """
         if not self.isInit: raise RuntimeError(f"未初始化!")
         self.listenT = threading.Thread(target=self.listen_t, 
-                                        args=(seconds, save_wave, mute_check, speech_completeness), 
+                                        args=(seconds, save_wave, mute_check, speech_completeness, cpu_affinity, vad), 
                                         daemon=True)
         self.listenT.start()
 
@@ -9,13 +9,16 @@
 # Description : SenseVoice Onnx模型的使用类定义。重新封装了接口，简化了使用方式。
 #               如OpenAi-whisper一样，通过调用load_model、transcribe两步完成调用。
 # =========================================
+import copy
+import gc
 import os
 import re
 import time
 import logging
-import soundfile
+import threading
 import numpy as np
-import librosa
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Union, Tuple
 
 if __name__ == "__main__":
@@ -23,9 +26,11 @@ if __name__ == "__main__":
     project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
     sys.path.insert(0, project_root)
 
-from libsensevoiceOne.onnx.sense_voice_ort_session import SenseVoiceInferenceSession
-from libsensevoiceOne.utils.frontend import WavFrontend
-from libsensevoiceOne.utils.fsmn_vad import FSMNVad
+from libsensevoiceOne.onnx.decode_model import decode_model_path
+from libsensevoiceOne.utils.ctc import LFR_FRAME_SHIFT
+from libsensevoiceOne.utils.resample import PolyphaseResampler, resample
+# 重依赖(onnxruntime、sentencepiece、soundfile、yaml、kaldi_native_fbank)在首次使用时才导入,
+# 导入本模块只需要 numpy。各阶段耗时见: python -m libsensevoiceOne.startup_report
 
 languages = {"auto": 0, "zh": 3, "en": 4, "yue": 7, "ja": 11, "ko": 12, "nospeech": 13}
 
@@ -34,6 +39,8 @@ class SenseVoiceOne(object):
     This is the main class used for ASR.
     """
     model = None; front = None; isVad = False; vad = None; isInit = False
+    load_times = None; _load_future = None; _language_cache = None
+    model_file = None; _load_args = None; _swap_future = None
 
     def __init__(self, 
         senseVoice_model_file:str = None, 
@@ -48,6 +55,9 @@ class SenseVoiceOne(object):
         """
         Objects init, load models for sensevoice-onnx、front、vad.
         """
+        # 正在使用各 SenseVoice 会话的请求数, 用于 swap_model() 切换后等待旧会话的请求结束
+        self._model_cond = threading.Condition()
+        self._in_flight = {}
         if  senseVoice_model_file is not None:
             self.load_model(senseVoice_model_file, senseVoice_model_dir, 
                             embedding_model_file, bpe_model_file, 
@@ -64,7 +74,14 @@ class SenseVoiceOne(object):
         front_dir:str = "./resources/front", cmvn_file:str = "am.mvn",
         is_vad:bool=True, 
         vad_dir:os.PathLike = "./resources/vad",
-        )-> None:
+        block:bool=True,
+        use_ort_cache:bool=True,
+        prefer_decode_model:bool=True,
+        length_buckets:tuple=None,
+        profile:Union[str, dict]=None,
+        providers:list=None,
+        thread_budget=None,
+        )-> Future:
         '''
         Objects init, load models for sensevoice-onnx、front、vad.
 
@@ -85,57 +102,265 @@ class SenseVoiceOne(object):
             whether use the vad model to detect human voice and process the human voice only.
         vad_dir : os.PathLike
             folder of fsmn_vad model files. If is_vad==False, vad_dia could be None.
+        block : bool
+            True: 等待加载完成后返回。
+            False: 在后台线程中并行加载并立即返回, 用 ready()/wait_ready() 查询或等待。
+            transcribe() 在模型未就绪时会自动等待。
+        use_ort_cache : bool
+            是否使用 ORT 优化模型的磁盘缓存(模型目录下的 .ort_cache), 加快再次启动。
+        prefer_decode_model : bool
+            模型目录中存在 <stem>.decode.onnx(由 libsensevoiceOne.onnx.decode_model 生成)时优先使用,
+            argmax 在图中完成, 不再取回整个 ctc_logits。
+        length_buckets : tuple
+            None: 不分桶(默认)。否则为升序的帧长(含 4 个提示帧, 1帧=60ms), 或 True 使用
+            DEFAULT_LENGTH_BUCKETS。输入补齐到桶长, 开启 ORT 内存池与内存模式复用,
+            并在加载时对每个桶预热一次, 降低首句延迟。
+        profile : Union[str, dict]
+            ORT 会话配置方案: "default"(默认)、"pi5-realtime"、"desktop-batch"、"low-memory",
+            或自定义 dict, 见 libsensevoiceOne.onnx.session_profiles。各方案在本机的 RTF 对比:
+            python -m libsensevoiceOne.profile_bench
+        providers : list
+            按优先级排列的执行后端, 如 ["XnnpackExecutionProvider", "CPUExecutionProvider"],
+            覆盖 profile 中的设置。不可用的后端自动跳过, 最后回退到 CPU。
+        thread_budget : libsensevoiceOne.thread_budget.ThreadBudget
+            进程级线程预算。按其方案设置 ASR/VAD 的线程数(覆盖 n_threads 与 profile 中的线程设置)
+            与线程池的 CPU 绑定。调用 transcribe() 的线程需自行 thread_budget.pin_inference_thread()。
+
+        Returns: concurrent.futures.Future
+        -------
+            加载任务的 future, 完成时 ready() 为 True。
         '''
-        if self.isInit:
+        if self.isInit or (self._load_future is not None and not self._load_future.done()):
             raise RuntimeError("Reload the model.")
-        
-        self.__load_ss_model(
-            senseVoice_model_dir, senseVoice_model_file, 
-            embedding_model_file, bpe_model_file, 
-            device, n_threads
-            )
-        
+
+        # 文件检查在调用线程中完成, 缺少文件时立即报错
+        model_file = os.path.join(senseVoice_model_dir, senseVoice_model_file)
+        if not os.path.exists(model_file):
+            raise FileNotFoundError(f"模型文件 {model_file} 不存在！")
+        decode_file = decode_model_path(model_file)
+        if prefer_decode_model and decode_file.exists():
+            logging.info(f"使用 decode 模型: {decode_file}")
+            model_file = str(decode_file)
+        embedding_model_file = os.path.join(senseVoice_model_dir, embedding_model_file)
+        if not os.path.exists(embedding_model_file):
+            raise FileNotFoundError(f"embedding_model_file {embedding_model_file} 不存在！")
+        bpe_model_file = os.path.join(senseVoice_model_dir, bpe_model_file)
+        if not os.path.exists(bpe_model_file):
+            raise FileNotFoundError(f"bpe_model_file {bpe_model_file} 不存在！")
         cmvn_file = os.path.join(front_dir, cmvn_file)
         if not os.path.exists(cmvn_file):
             raise FileNotFoundError(f"cmvn_file {cmvn_file} 不存在！")
-        self.front = WavFrontend(cmvn_file)
-        logging.debug("WavFrontend ready")
-        
+
+        if thread_budget is not None:
+            logging.info(f"线程预算: {thread_budget.plan()}")
+            profile = thread_budget.profile(profile)
+            n_threads = thread_budget.asr_threads
+
+        # swap_model() 使用相同的参数加载新的编码器
+        self._load_args = dict(
+            senseVoice_model_dir=senseVoice_model_dir, embedding_model_file=embedding_model_file,
+            bpe_model_file=bpe_model_file, device=device, n_threads=n_threads,
+            use_ort_cache=use_ort_cache, prefer_decode_model=prefer_decode_model,
+            length_buckets=length_buckets, profile=profile, providers=providers,
+            thread_budget=thread_budget)
+        self.model_file = model_file
+
+        loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="SenseVoiceLoad")
+        self._load_future = loader.submit(
+            self.__load_all, model_file, embedding_model_file, bpe_model_file,
+            device, n_threads, cmvn_file, is_vad, vad_dir, use_ort_cache, length_buckets,
+            profile, providers, thread_budget)
+        loader.shutdown(wait=False)
+        if block:
+            self.wait_ready()
+        return self._load_future
+
+    def ready(self) -> bool:
+        """模型是否已加载完成(不阻塞)"""
+        return self.isInit
+
+    def wait_ready(self, timeout: float = None) -> None:
+        """
+        等待后台加载完成。加载过程中的异常会在这里重新抛出。
+        timeout 秒后仍未完成则抛出 concurrent.futures.TimeoutError。
+        """
+        if self.isInit:
+            return
+        if self._load_future is None:
+            raise RuntimeError("模型未加载, 请先调用 load_model()")
+        self._load_future.result(timeout)
+
+    def swap_model(self,
+        senseVoice_model_file:str,
+        block:bool=False,
+        drain_timeout:float=None,
+        **load_kwargs,
+        )-> Future:
+        '''
+        不停止服务地切换 SenseVoice 编码器(如 sense-voice-encoder.onnx <-> sense-voice-encoder-int8.onnx)。
+
+        新会话在后台线程中创建(旧会话继续服务); 创建完成后在两次请求之间原子地切换,
+        之后的 transcribe()/detect_language() 使用新会话; 等待仍在使用旧会话的请求结束后释放旧会话。
+
+        Parameters
+        ----------
+        senseVoice_model_file : str
+            新的模型文件名(相对 load_model 时的 senseVoice_model_dir)。
+        block : bool
+            是否等待切换(包括旧会话释放)完成。
+        drain_timeout : float
+            等待旧会话请求结束的最长时间(秒), 超时后不再等待, 旧会话在最后一个请求结束时释放。
+        **load_kwargs :
+            覆盖 load_model 时的参数: n_threads、profile、providers、length_buckets、use_ort_cache 等。
+
+        Returns: concurrent.futures.Future
+        -------
+            结果为切换后的模型文件路径。加载失败时旧会话保持不变, 异常在 future 中。
+        '''
+        self.wait_ready()
+        if self._swap_future is not None and not self._swap_future.done():
+            raise RuntimeError("上一次模型切换尚未完成")
+        args = {**self._load_args, **load_kwargs}
+        model_file = os.path.join(args["senseVoice_model_dir"], senseVoice_model_file)
+        if not os.path.exists(model_file):
+            raise FileNotFoundError(f"模型文件 {model_file} 不存在！")
+        decode_file = decode_model_path(model_file)
+        if args["prefer_decode_model"] and decode_file.exists():
+            model_file = str(decode_file)
+
+        swapper = ThreadPoolExecutor(max_workers=1, thread_name_prefix="SenseVoiceSwap")
+        self._swap_future = swapper.submit(self.__swap, model_file, args, drain_timeout)
+        swapper.shutdown(wait=False)
+        if block:
+            self._swap_future.result()
+        return self._swap_future
+
+    def release_buffers(self)->None:
+        '''
+        释放各推理线程中 SenseVoice 会话的可复用输入/输出缓冲区(例如转写过很长的音频之后),
+        之后的推理按需重新分配。
+        '''
+        with self._use_model() as model:
+            model.release_buffers()
+
+    def __swap(self, model_file, args, drain_timeout):
+        if args["thread_budget"] is not None:
+            args["thread_budget"].pin_inference_thread()
+        start = time.perf_counter()
+        new_model = self.__load_ss_model(
+            model_file, args["embedding_model_file"], args["bpe_model_file"],
+            args["device"], args["n_threads"], args["use_ort_cache"],
+            args["length_buckets"], args["profile"], args["providers"])
+        with self._model_cond:
+            old_model, self.model = self.model, new_model
+            old_file, self.model_file = self.model_file, model_file
+            self._load_args = args
+            logging.info(f"模型已切换: {old_file} -> {model_file}, 加载耗时 {time.perf_counter() - start:.2f}s")
+            if not self._model_cond.wait_for(lambda: id(old_model) not in self._in_flight, drain_timeout):
+                logging.warning(f"等待旧模型的请求结束超时({drain_timeout}s)")
+        # 各推理线程中旧会话的复用缓冲区随之释放(仍在进行的请求持有自己的数组, 不受影响)
+        old_model.release_buffers()
+        del old_model
+        gc.collect()
+        return model_file
+
+    @contextmanager
+    def _use_model(self):
+        """取得当前的 SenseVoice 会话, 整个请求期间使用同一个会话(不受 swap_model 影响)"""
+        with self._model_cond:
+            model = self.model
+            self._in_flight[id(model)] = self._in_flight.get(id(model), 0) + 1
+        try:
+            yield model
+        finally:
+            with self._model_cond:
+                count = self._in_flight.pop(id(model)) - 1
+                if count > 0:
+                    self._in_flight[id(model)] = count
+                self._model_cond.notify_all()
+
+    def __load_all(self,
+        model_file, embedding_model_file, bpe_model_file,
+        device, n_threads, cmvn_file, is_vad, vad_dir, use_ort_cache, length_buckets,
+        profile, providers, thread_budget,
+        )->None:
+        '''并行加载 SenseVoice 模型、前端和 VAD。ORT 建图时会释放 GIL, 各部分可以真正并行'''
+        if thread_budget is not None:
+            # 加载(建图、优化)也只占用推理核
+            thread_budget.pin_inference_thread()
+        load_times = {}
+        start = time.perf_counter()
+
+        def timed(name, func, *args):
+            t = time.perf_counter()
+            obj = func(*args)
+            load_times[name] = time.perf_counter() - t
+            return obj
+
+        with ThreadPoolExecutor(max_workers=3, thread_name_prefix="SenseVoiceLoad") as pool:
+            ss_future = pool.submit(
+                timed, "SenseVoice", self.__load_ss_model,
+                model_file, embedding_model_file, bpe_model_file, device, n_threads, use_ort_cache,
+                length_buckets, profile, providers)
+            front_future = pool.submit(timed, "front", self.__load_front, cmvn_file)
+            vad_future = pool.submit(
+                timed, "vad", self.__load_vad, vad_dir, use_ort_cache, profile) if is_vad else None
+            model = ss_future.result()
+            front = front_future.result()
+            vad = vad_future.result() if vad_future is not None else None
+
+        load_times.update(model.load_times)
+        load_times["total"] = time.perf_counter() - start
+        self.model, self.front = model, front
         # FSMN Vad 即基于前馈序列记忆网络（Feedforward Sequential Memory Network，FSMN）
         #          的语音活动检测（Voice Activity Detection，VAD）
-        self.isVad = is_vad
+        self.isVad, self.vad = is_vad, vad
         if self.isVad:
-            self.vad = FSMNVad(vad_dir)
             logging.info("启用VAD. FSMNVad ready")
-
+        self.load_times = load_times
         self.isInit = True
+        logging.info(f"模型加载完成, 耗时 {load_times['total']:.2f}s")
 
-    def __load_ss_model(self, 
-        model_dir, model_file, 
-        embedding_model_file, bpe_model_file, 
-        device, n_threads
-        )->None:
+    @staticmethod
+    def __load_front(cmvn_file):
+        from libsensevoiceOne.utils.frontend import WavFrontend
+        front = WavFrontend(cmvn_file)
+        logging.debug("WavFrontend ready")
+        return front
+
+    @staticmethod
+    def __load_vad(vad_dir, use_ort_cache, profile):
+        from libsensevoiceOne.utils.fsmn_vad import FSMNVad
+        return FSMNVad(vad_dir, use_ort_cache, profile)
+
+    @staticmethod
+    def __load_ss_model(
+        model_file, embedding_model_file, bpe_model_file,
+        device, n_threads, use_ort_cache, length_buckets, profile, providers,
+        ):
         '''加载SenseVoice模型'''
+        from libsensevoiceOne.onnx.sense_voice_ort_session import (
+            DEFAULT_LENGTH_BUCKETS, SenseVoiceInferenceSession)
 
-        model_file = os.path.join(model_dir, model_file)
-        if not os.path.exists(model_file):
-            raise FileNotFoundError(f"模型文件 {model_file} 不存在！")
-        
-        embedding_model_file = os.path.join(model_dir, embedding_model_file)
-        if not os.path.exists(embedding_model_file):
-            raise FileNotFoundError(f"embedding_model_file {embedding_model_file} 不存在！")
-        
-        bpe_model_file = os.path.join(model_dir, bpe_model_file)
-        if not os.path.exists(bpe_model_file):
-            raise FileNotFoundError(f"bpe_model_file {bpe_model_file} 不存在！")
-       
-        self.model = SenseVoiceInferenceSession(
+        if length_buckets is True:
+            length_buckets = DEFAULT_LENGTH_BUCKETS
+
+        model = SenseVoiceInferenceSession(
             embedding_model_file,
             model_file,
             bpe_model_file,
             device_id=device,
-            intra_op_num_threads=n_threads,)
+            intra_op_num_threads=n_threads,
+            use_ort_cache=use_ort_cache,
+            length_buckets=length_buckets,
+            profile=profile,
+            providers=providers,)
+        if length_buckets:
+            start = time.perf_counter()
+            model.warmup()
+            model.load_times["warmup"] = time.perf_counter() - start
         logging.debug(f"SenseVoiceInferenceSession ready")
+        return model
 
     def transcribe(
         self, 
@@ -144,7 +369,14 @@ class SenseVoiceOne(object):
         use_itn:bool=True,
         use_vad:bool=True,
         ForceMono:bool=True,
-        str_result:bool=True
+        str_result:bool=True,
+        sr:int=16000,
+        batch_size:int=8,
+        max_batch_frames:int=1000,
+        token_timestamps:bool=False,
+        language_key=None,
+        chunk_seconds:float=None,
+        chunk_overlap:float=3.0,
         )->Union[dict, str]:
         '''Transcribe an audio file using Whisper. 音频文件的加载、处理、转文字.
         
@@ -168,6 +400,24 @@ class SenseVoiceOne(object):
             是否强制单声道。如果是, 则对双声道数据进行简单平均, 单声道数据保持不变。
         str_result: bool
             是否只是返回文字结果。
+        sr: int
+            ndarray 输入的采样率。不是 16k 时会在内部重采样到 16k。文件输入时忽略(读取文件自身的采样率)。
+        batch_size: int
+            VAD 模式下每次编码器推理最多合并的语音片段数(按片段先后凑批)。<=1 时逐个片段推理。
+        max_batch_frames: int
+            VAD 模式下每批补齐后的最大帧数(片段数 x 最长片段帧数, 1帧=60ms), 限制 ctc_logits 的内存。
+        token_timestamps: bool
+            是否在每个 part 中增加 "tokens": [{"token":"▁hello", "times":[s, e]}, ...],
+            时间(秒)由同一次编码器输出的 CTC 帧对齐得到, 精度 60ms。
+        language_key: hashable
+            language="auto" 时, 如果 detect_language(..., cache_key=language_key) 已经为该流/文件
+            确定了语言, 直接使用该语言。
+        chunk_seconds: float
+            不使用 VAD 时, 超过该时长的声道按固定长度的窗口分块推理(流式计算特征),
+            内存占用与音频总时长无关(例如 30.0)。默认 None: 整段一次推理。
+            分块时每个窗口只看到自身的上下文, 结果可能与整段推理略有不同, 需要时显式开启。
+        chunk_overlap: float
+            相邻窗口的重叠时长(秒)。在重叠区内按 CTC 帧对齐拼接, 边界处的词不重复、不丢失。
 
         Returns: Union[dict, str]
         -------
@@ -188,53 +438,141 @@ class SenseVoiceOne(object):
         :str: if the str_result is True.
             a text result only. Equal to the sum of dict["segments"][0]["parts"] "text" items.
         '''
-        waveform = self.load_audio(audio, ForceMono)
-        result = {"isVad":False, "channels":1, "language":"auto", "segments":[]}
-        result["language"] = language
-        result["channels"] = waveform.shape[0]
-        # segment = {"time":None, "tags":None, "text":None}
-        if self.isVad and use_vad:  # 使用语音检测
-            logging.debug("use vad")
-            result["isVad"] = True
-            for i in range(waveform.shape[0]):
-                channel_data = waveform[i]
-                segments = self.vad.segments_offline(channel_data)
-                segmentsRes = {"channel":i, "parts":[]}
-                for part in segments:
-                    logging.debug("part process start")
-                    audio_feats = self.front.get_features(channel_data[part[0]*16 : part[1]*16])
-                    asr_result = self.model.inference(audio_feats[None, ...],
-                                    language=languages[language], use_itn=use_itn,)
-                    res = self.res_re(asr_result)
-                    res['time'] = [part[0]/1000, part[1]/1000]
+        self.wait_ready()
+        if language == "auto" and language_key is not None and language_key in (self._language_cache or {}):
+            language = self._language_cache[language_key][0]
+        with self._use_model() as model:
+            waveform = self.load_audio(audio, ForceMono, sr)
+            result = {"isVad":False, "channels":1, "language":"auto", "segments":[]}
+            result["language"] = language
+            result["channels"] = waveform.shape[0]
+            # segment = {"time":None, "tags":None, "text":None}
+            if self.isVad and use_vad:  # 使用语音检测
+                logging.debug("use vad")
+                result["isVad"] = True
+                # VAD 与 ASR 前端的 fbank 配置相同时, 每个声道只计算一次 fbank:
+                # VAD 用它做 LFR(5/1)+CMVN, 各语音片段直接按帧号切片后做 LFR(7/6)+CMVN
+                share_fbank = self.front.same_fbank(self.vad.frontend)
+                for i in range(waveform.shape[0]):
+                    channel_data = waveform[i]
+                    fbank = self.front.fbank(channel_data)[0] if share_fbank else None
+                    segments = self.vad.segments_offline(channel_data, fbank=fbank)
+                    segmentsRes = {"channel":i, "parts":[]}
+                    # 片段特征逐个生成, 内存中最多只有一批
+                    feats = self.__segment_features(channel_data, fbank, segments)
+                    if batch_size > 1:
+                        # 语音片段按顺序凑满一批(batch_size / max_batch_frames)就送入编码器
+                        asr_results = model.inference_batch_iter(
+                            feats, language=languages[language], use_itn=use_itn,
+                            batch_size=batch_size, max_batch_frames=max_batch_frames,
+                            with_timestamps=token_timestamps)
+                    else:
+                        asr_results = (model.inference(audio_feats[None, ...],
+                                            language=languages[language], use_itn=use_itn,
+                                            with_timestamps=token_timestamps)
+                                       for audio_feats in feats)
+                    for part, asr_result in zip(segments, asr_results):
+                        res = self.__part_res(asr_result, part[0]/1000)
+                        res['time'] = [part[0]/1000, part[1]/1000]
+                        segmentsRes["parts"].append(res)
+                        logging.debug(f"ch{i}-[{res['time'][0]}s-{res['time'][1]}s] tags: {res['tags']}")
+                        logging.debug(f"ch{i}-[{res['time'][0]}s-{res['time'][1]}s] text: {res['text']}")
+                    self.vad.vad.all_reset_detection()
+                    result["segments"].append(segmentsRes)
+            else:
+                for i in range(waveform.shape[0]):
+                    segmentsRes = {"channel":i, "parts":[]}
+                    channel_data = waveform[i]
+                    if chunk_seconds and len(channel_data) > chunk_seconds * 16000:
+                        # 长音频: 分块计算特征, 固定长度的窗口滑动推理
+                        window = int(round(chunk_seconds / LFR_FRAME_SHIFT))
+                        asr_result = model.inference_chunked(
+                                                self.__iter_features(channel_data, int(chunk_seconds * 16000)),
+                                                language = languages[language],
+                                                use_itn = use_itn,
+                                                window = window,
+                                                overlap = min(int(round(chunk_overlap / LFR_FRAME_SHIFT)), window - 1),
+                                                with_timestamps = token_timestamps,)
+                    else:
+                        audio_feats = self.front.get_features(channel_data)
+                        asr_result = model.inference(
+                                                audio_feats[None, ...],
+                                                language = languages[language],
+                                                use_itn = use_itn,
+                                                with_timestamps = token_timestamps,)
+                    res = self.__part_res(asr_result, 0)
+                    res['time'] = [0, round(len(channel_data)/16000, 2)]
                     segmentsRes["parts"].append(res)
-                    logging.debug(f"ch{i}-[{res['time'][0]}s-{res['time'][1]}s] tags: {res['tags']}")
-                    logging.debug(f"ch{i}-[{res['time'][0]}s-{res['time'][1]}s] text: {res['text']}")
-                self.vad.vad.all_reset_detection()
-                result["segments"].append(segmentsRes)
-        else:
-            for i in range(waveform.shape[0]):
-                segmentsRes = {"channel":i, "parts":[]}
-                channel_data = waveform[i]
-                audio_feats = self.front.get_features(channel_data)
-                asr_result = self.model.inference(
-                                            audio_feats[None, ...],
-                                            language = languages[language],
-                                            use_itn = use_itn,)
-                res = self.res_re(asr_result)
-                res['time'] = [0, round(len(channel_data)/16000, 2)]
-                segmentsRes["parts"].append(res)
-                result["segments"].append(segmentsRes)
-                logging.debug(f"ch{i}-tags: {res['tags']}")
-                logging.debug(f"ch{i}-text: {res['text']}")
+                    result["segments"].append(segmentsRes)
+                    logging.debug(f"ch{i}-tags: {res['tags']}")
+                    logging.debug(f"ch{i}-text: {res['text']}")
         
         if str_result:
             return self.dict2str(result)
         return result
 
+    def detect_language(self,
+        audio: Union[os.PathLike, np.ndarray],
+        max_seconds:float=3.0,
+        scan_seconds:float=30.0,
+        sr:int=16000,
+        use_vad:bool=True,
+        cache_key=None,
+        )->Tuple[str, dict]:
+        """
+        快速语种识别: 只取前 max_seconds 秒的人声(VAD 检测, 最多扫描前 scan_seconds 秒),
+        编码器推理一次, 由语言标签位置(第 0 帧)的输出得到各语言的概率。
+
+        cache_key: 流或文件的标识(如文件路径)。已缓存时直接返回缓存结果; 之后
+            transcribe(..., language_key=cache_key) 会直接使用该语言。
+
+        Return: (language, probs)
+            language: languages 中的键, 如 "zh"; probs: {"zh":0.93, "en":0.02, ...}
+        """
+        self.wait_ready()
+        if self._language_cache is None:
+            self._language_cache = {}
+        if cache_key is not None and cache_key in self._language_cache:
+            return self._language_cache[cache_key]
+
+        waveform = self.load_audio(audio, True, sr)[0]
+        max_samples = int(max_seconds * 16000)
+        prefix = waveform[: int(scan_seconds * 16000)]
+        if self.isVad and use_vad:
+            segments = self.vad.segments_offline(prefix)
+            self.vad.vad.all_reset_detection()
+            voiced, total = [], 0
+            for beg, end in segments:
+                if total >= max_samples:
+                    break
+                part = prefix[beg*16 : min(end*16, beg*16 + max_samples - total)]
+                voiced.append(part)
+                total += part.shape[0]
+            if total > 0:
+                prefix = np.concatenate(voiced)
+        prefix = prefix[:max_samples]
+
+        with self._use_model() as model:
+            tags = {name: model.sp.piece_to_id(f"<|{name}|>") for name in languages if name != "auto"}
+            probs = model.language_probs(self.front.get_features(prefix), tags)
+        result = (max(probs, key=probs.get), probs)
+        if cache_key is not None:
+            self._language_cache[cache_key] = result
+        return result
+
+    def forget_language(self, cache_key=None) -> None:
+        """清除 cache_key 的语种缓存; cache_key=None 时清除全部"""
+        if self._language_cache is None:
+            return
+        if cache_key is None:
+            self._language_cache.clear()
+        else:
+            self._language_cache.pop(cache_key, None)
+
     def load_audio(self, 
         audio: Union[os.PathLike, np.ndarray], 
-        isMone:bool
+        isMone:bool,
+        sr:int=16000,
         )-> np.ndarray:
         """
         Audio data process from the audio file or numpy ndarray.
@@ -245,6 +583,8 @@ class SenseVoiceOne(object):
         audio: Union[os.PathLike, np.ndarray]
             :os.PathLike: file path. It will be resampled to 16k HZ if the sr isn't 16k.
             :np.ndarray: it's suggested that the array shape=(channels, frames) 
+        sr: int
+            sample rate of the ndarray input. It will be resampled to 16k HZ if the sr isn't 16k.
         
         Return
         ---------
@@ -252,12 +592,26 @@ class SenseVoiceOne(object):
         """
         
         if isinstance(audio, (os.PathLike, str)):  # 音频文件加载
-            waveform, sr = soundfile.read(audio, dtype="float32", always_2d=True)
-            waveform = waveform.T
-            if waveform.shape[0] == 2 and isMone:
-                waveform = waveform.mean(axis=0).reshape(1, -1)
-            if sr != 16000:
-                waveform = librosa.resample(waveform, orig_sr=sr, target_sr=16000)
+            import soundfile
+            info = soundfile.info(audio)
+            sr = info.samplerate
+            if sr == 16000:
+                waveform, sr = soundfile.read(audio, dtype="float32", always_2d=True)
+                waveform = waveform.T
+                if waveform.shape[0] == 2 and isMone:
+                    waveform = waveform.mean(axis=0).reshape(1, -1)
+            else:
+                # 分块读取并流式重采样, 内存中只保留 16k 的结果
+                resampler = PolyphaseResampler(sr, 16000)
+                parts = []
+                for block in soundfile.blocks(audio, blocksize=sr*30, dtype="float32", always_2d=True):
+                    block = block.T
+                    if block.shape[0] == 2 and isMone:
+                        block = block.mean(axis=0).reshape(1, -1)
+                    parts.append(resampler.process(block))
+                channels = 1 if info.channels == 2 and isMone else info.channels
+                parts.append(resampler.process(np.zeros((channels, 0), dtype=np.float32), is_final=True))
+                waveform = np.concatenate(parts, axis=1)
             audioArray = np.ascontiguousarray(waveform)
             logging.debug(f"from file:{audio}. sr={sr}. res Arr shape={audioArray.shape}")
         elif isinstance(audio, np.ndarray):  # ndarray标准化
@@ -270,12 +624,55 @@ class SenseVoiceOne(object):
                 audio = audio.T
             if audio.shape[0] > 1 and isMone:
                 audio = audio.mean(axis=0).reshape(1, -1)
+            if sr != 16000:
+                audio = resample(audio, sr, 16000)
             audioArray = audio
             # logging.debug(f"from ndarray. res Arr shape={audioArray.shape}")
         else:
             raise ValueError(f"audio 参数必须是文件路径或 NumPy 数组. type(audio)={type(audio)}")
         return audioArray
 
+    def __segment_features(self, channel_data:np.ndarray, fbank:np.ndarray, segments:list):
+        """
+        逐个生成 VAD 语音片段的 LFR+CMVN 特征。
+        fbank: 整个声道的 fbank(与 VAD 共享时), 片段按帧号切片; 为 None 或无法切片时按片段音频重新计算。
+        """
+        for part in segments:
+            part_fbank = None
+            if fbank is not None:
+                part_fbank = self.front.slice_fbank(
+                    fbank, part[0]*16, part[1]*16, channel_data.shape[0])
+            if part_fbank is not None:
+                audio_feats, _ = self.front.lfr_cmvn(part_fbank)
+            else:
+                audio_feats = self.front.get_features(channel_data[part[0]*16 : part[1]*16])
+            yield audio_feats
+
+    def __iter_features(self, waveform:np.ndarray, block_samples:int):
+        """按块流式计算 LFR+CMVN 特征, 内存中只有当前块"""
+        # 每次调用用独立的前端副本(共享 cmvn 等只读数据), 流式状态不影响 self.front 的其它使用者
+        front = copy.copy(self.front)
+        front.reset_status()
+        for beg in range(0, waveform.shape[0], block_samples):
+            front.accept_waveform(waveform[beg : beg + block_samples])
+            yield front.pop_features()
+        yield front.pop_features(is_final=True)
+
+    def __part_res(self, asr_result:Union[str, dict], offset:float)->dict:
+        """
+        inference 结果 -> part 字典。带时间戳的结果增加 "tokens",
+        时间加上片段起点 offset(秒), <|...|> 标签 token 不计入。
+        """
+        if isinstance(asr_result, str):
+            return self.res_re(asr_result)
+        res = self.res_re(asr_result["text"])
+        res["tokens"] = [
+            {"token": tok["token"],
+             "times": [round(offset + tok["times"][0], 3), round(offset + tok["times"][1], 3)]}
+            for tok in asr_result["tokens"] if not re.fullmatch(r"<\|[^|]+\|>", tok["token"])
+        ]
+        return res
+
     def res_re(self, result:str)->dict:
         """
         使用正则表达式匹配标签和文本内容, 结构化结果输出
@@ -0,0 +1,125 @@
+# =========================================
+# -*- coding: utf-8 -*-
+# Project     : SenseVoiceOne
+# Module      : decode_model.py
+# Author      : KyleWang[kylewang1977@gmail.com]
+# Time        : 2026-10-17 16:20
+# Version     : 1.0.0
+# Last Updated:
+# Description : 模型准备工具: 在 SenseVoice 编码器图的 ctc_logits 之后追加 ArgMax 等节点,
+#               保存为 "可直接解码" 的 <stem>.decode.onnx。
+#               推理时只需取回每帧一个 token id, 不再把 (T, 25055) 的 float32 后验拷回 Python。
+#               python -m libsensevoiceOne.onnx.decode_model resources/SenseVoice/sense-voice-encoder-int8.onnx
+#               需要 onnx 包(pip install onnx), 只在生成模型时使用, 推理时不需要。
+# =========================================
+import argparse
+import os
+import sys
+from pathlib import Path
+
+# decode 模型的输出名, 会话通过 TOKEN_IDS 判断是否为 decode 模型
+TOKEN_IDS = "token_ids"             # (B, T) int64, 每帧概率最大的 token
+TOKEN_LOGPROB = "token_logprob"     # (B, T) float32, 该 token 的 log 概率(置信度), 需 with_logprob
+PROMPT_LOGITS = "prompt_logits"     # (B, prompt_frames, vocab) float32, 前几帧(语言/事件/情感/ITN)的 logits
+DECODE_SUFFIX = ".decode.onnx"
+
+
+def decode_model_path(model_file: os.PathLike) -> Path:
+    """sense-voice-encoder-int8.onnx -> sense-voice-encoder-int8.decode.onnx"""
+    model_file = Path(model_file)
+    return model_file.with_name(model_file.stem + DECODE_SUFFIX)
+
+
+def make_decode_model(
+    model_file: os.PathLike,
+    out_file: os.PathLike = None,
+    with_logprob: bool = False,
+    prompt_frames: int = 4,
+    logits_name: str = "ctc_logits",
+) -> Path:
+    """
+    Append ArgMax (and optionally LogSoftmax+ReduceMax, a prompt-frame Slice) after
+    `logits_name` and drop the full logits output. Other outputs are kept.
+    with_logprob: also output TOKEN_LOGPROB. It costs a softmax over the whole vocabulary on
+        every run and nothing in the transcription path reads it, so it is off by default.
+    Return: path of the saved decode model.
+    """
+    try:
+        import onnx
+        from onnx import TensorProto, helper
+    except ImportError as e:
+        raise ImportError("生成 decode 模型需要 onnx 包: pip install onnx") from e
+
+    model = onnx.load(str(model_file))
+    graph = model.graph
+    outputs = {o.name: o for o in graph.output}
+    if TOKEN_IDS in outputs:
+        raise ValueError(f"{model_file} 已经是 decode 模型")
+    if logits_name not in outputs:
+        raise ValueError(f"{model_file} 没有输出 {logits_name}, 实际输出: {list(outputs)}")
+    opset = next(o.version for o in model.opset_import if o.domain in ("", "ai.onnx"))
+    dims = outputs[logits_name].type.tensor_type.shape.dim
+    batch_dim, time_dim, vocab_dim = (d.dim_param or d.dim_value for d in dims)
+
+    nodes = [helper.make_node(
+        "ArgMax", [logits_name], [TOKEN_IDS], axis=-1, keepdims=0, name="decode_argmax")]
+    new_outputs = [helper.make_tensor_value_info(TOKEN_IDS, TensorProto.INT64, [batch_dim, time_dim])]
+
+    if with_logprob:
+        # max(log_softmax(x)) = max(x) - logsumexp(x)
+        nodes.append(helper.make_node(
+            "LogSoftmax", [logits_name], ["decode_log_softmax"], axis=-1, name="decode_log_softmax"))
+        if opset >= 18:
+            axes = helper.make_tensor("decode_axes", TensorProto.INT64, [1], [-1])
+            graph.initializer.append(axes)
+            nodes.append(helper.make_node(
+                "ReduceMax", ["decode_log_softmax", "decode_axes"], [TOKEN_LOGPROB],
+                keepdims=0, name="decode_reduce_max"))
+        else:
+            nodes.append(helper.make_node(
+                "ReduceMax", ["decode_log_softmax"], [TOKEN_LOGPROB],
+                axes=[-1], keepdims=0, name="decode_reduce_max"))
+        new_outputs.append(helper.make_tensor_value_info(
+            TOKEN_LOGPROB, TensorProto.FLOAT, [batch_dim, time_dim]))
+
+    if prompt_frames > 0:
+        graph.initializer.extend([
+            helper.make_tensor("decode_slice_starts", TensorProto.INT64, [1], [0]),
+            helper.make_tensor("decode_slice_ends", TensorProto.INT64, [1], [prompt_frames]),
+            helper.make_tensor("decode_slice_axes", TensorProto.INT64, [1], [1]),
+        ])
+        nodes.append(helper.make_node(
+            "Slice",
+            [logits_name, "decode_slice_starts", "decode_slice_ends", "decode_slice_axes"],
+            [PROMPT_LOGITS], name="decode_prompt_slice"))
+        new_outputs.append(helper.make_tensor_value_info(
+            PROMPT_LOGITS, TensorProto.FLOAT, [batch_dim, prompt_frames, vocab_dim]))
+
+    graph.node.extend(nodes)
+    kept = [o for o in graph.output if o.name != logits_name]
+    del graph.output[:]
+    graph.output.extend(new_outputs + kept)
+    onnx.checker.check_model(model)
+
+    out_file = Path(out_file) if out_file is not None else decode_model_path(model_file)
+    onnx.save(model, str(out_file))
+    return out_file
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Append ArgMax decoding to a SenseVoice encoder ONNX model")
+    parser.add_argument("model_file", help="SenseVoice encoder onnx, e.g. sense-voice-encoder-int8.onnx")
+    parser.add_argument("-o", "--output", default=None, help="default: <stem>.decode.onnx next to the model")
+    parser.add_argument("--with-logprob", action="store_true",
+                        help="also emit the per-frame max log-probability (vocabulary-wide softmax per run)")
+    parser.add_argument("--prompt-frames", type=int, default=4,
+                        help="number of leading frames whose full logits are kept (0: none)")
+    args = parser.parse_args(argv)
+    out_file = make_decode_model(
+        args.model_file, args.output, with_logprob=args.with_logprob, prompt_frames=args.prompt_frames)
+    print(f"saved: {out_file}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -17,11 +17,14 @@ from onnxruntime import (
 )
 
 
+from libsensevoiceOne.onnx.ort_cache import cached_session
+from libsensevoiceOne.onnx.session_profiles import get_profile, make_session_options, profile_key, resolve_providers
+
+
 class VadOrtInferRuntimeSession:
-    def __init__(self, config, root_dir: Path):
-        sess_opt = SessionOptions()
+    def __init__(self, config, root_dir: Path, use_cache: bool = True, profile=None, providers=None):
+        sess_opt = make_session_options(profile, vad=True)
         sess_opt.log_severity_level = 4
-        sess_opt.enable_cpu_mem_arena = False
         sess_opt.graph_optimization_level = GraphOptimizationLevel.ORT_ENABLE_ALL
 
         cuda_ep = "CUDAExecutionProvider"
@@ -30,21 +33,31 @@ class VadOrtInferRuntimeSession:
             "arena_extend_strategy": "kSameAsRequested",
         }
 
-        EP_list = []
-        if (
-            config["use_cuda"]
-            and get_device() == "GPU"
-            and cuda_ep in get_available_providers()
-        ):
-            EP_list = [(cuda_ep, config[cuda_ep])]
-        EP_list.append((cpu_ep, cpu_provider_options))
+        providers = providers or get_profile(profile)["providers"]
+        if providers is None:
+            EP_list = []
+            if (
+                config["use_cuda"]
+                and get_device() == "GPU"
+                and cuda_ep in get_available_providers()
+            ):
+                EP_list = [(cuda_ep, config[cuda_ep])]
+            EP_list.append((cpu_ep, cpu_provider_options))
+        else:
+            EP_list = resolve_providers(providers, {
+                cuda_ep: config.get(cuda_ep) or {},
+                cpu_ep: cpu_provider_options,
+            })
 
         config["model_path"] = root_dir / str(config["model_path"])
         self._verify_model(config["model_path"])
         logging.debug(f"Loading onnx model at {str(config['model_path'])}")
-        self.session = InferenceSession(
-            str(config["model_path"]), sess_options=sess_opt, providers=EP_list
-        )
+        if use_cache:
+            self.session = cached_session(config["model_path"], sess_opt, EP_list, options_key=profile_key(profile))
+        else:
+            self.session = InferenceSession(
+                str(config["model_path"]), sess_options=sess_opt, providers=EP_list
+            )
 
         if config["use_cuda"] and cuda_ep not in self.session.get_providers():
             logging.warning(
@@ -0,0 +1,189 @@
+# =========================================
+# -*- coding: utf-8 -*-
+# Project     : SenseVoiceOne
+# Module      : ort_cache.py
+# Author      : KyleWang[kylewang1977@gmail.com]
+# Time        : 2026-10-17 15:10
+# Version     : 1.0.0
+# Last Updated:
+# Description : ORT 优化后模型的磁盘缓存。
+#               首次创建 session 时把图优化(ORT_ENABLE_ALL)后的模型保存到缓存目录,
+#               之后直接加载优化后的模型并关闭图优化, 省去每次启动的优化过程。
+#               缓存键: 模型文件 sha1 + onnxruntime 版本 + CPU 架构与指令集特性 + 优化级别
+#               + 影响优化的会话选项(执行模式、配置项) + 调用方的 options_key(session profile)
+#               + 执行后端 + 缓存格式,
+#               (ORT_ENABLE_ALL 优化后的模型与硬件相关, 只能在生成它的环境中使用)
+#               任何一项变化都会生成新的缓存文件, 旧文件自动删除。
+# =========================================
+import hashlib
+import json
+import logging
+import os
+import platform
+import re
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+import onnxruntime
+from onnxruntime import GraphOptimizationLevel, InferenceSession, SessionOptions
+
+CACHE_FORMATS = ("onnx", "ort")
+_INDEX_FILE = "index.json"
+# 会改变优化结果的会话配置项, 设置了的才计入缓存键
+_KEY_CONFIG_ENTRIES = (
+    "session.disable_prepacking",
+    "session.disable_quant_qdq",
+    "session.enable_quant_qdq_cleanup",
+    "session.qdqisint8allowed",
+    "session.disable_double_qdq_remover",
+    "session.disable_aot_function_inlining",
+    "optimization.disable_specified_optimizers",
+    "optimization.minimal_build_optimizations",
+    "mlas.enable_gemm_fastmath_arm64_bfloat16",
+)
+
+
+def default_cache_dir(model_file: os.PathLike) -> Path:
+    return Path(model_file).parent / ".ort_cache"
+
+
+def model_hash(model_file: os.PathLike, cache_dir: os.PathLike) -> str:
+    """
+    模型文件内容的 sha1。结果按 (路径, 大小, mtime) 记录在缓存目录的 index.json 中,
+    模型文件不变时不会重复计算。
+    """
+    model_file = Path(model_file).resolve()
+    stat = model_file.stat()
+    index_file = Path(cache_dir) / _INDEX_FILE
+    index = {}
+    if index_file.exists():
+        try:
+            index = json.loads(index_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            index = {}
+    entry = index.get(str(model_file))
+    if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        return entry["sha1"]
+
+    sha1 = hashlib.sha1()
+    with open(model_file, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha1.update(block)
+    index[str(model_file)] = {
+        "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha1": sha1.hexdigest()}
+    try:
+        tmp_file = index_file.with_name(f"{_INDEX_FILE}.{os.getpid()}-{threading.get_ident()}.tmp")
+        tmp_file.write_text(json.dumps(index, indent=1), encoding="utf-8")
+        os.replace(tmp_file, index_file)
+    except OSError as e:
+        logging.debug(f"ORT 缓存索引写入失败: {e}")
+    return index[str(model_file)]["sha1"]
+
+
+@lru_cache(maxsize=None)
+def cpu_features() -> str:
+    """
+    CPU 指令集特性(Linux: /proc/cpuinfo 的 flags / Features, 排序去重), 其它系统为 platform.processor()。
+    优化后的模型可能包含只适用于当前指令集的 kernel。
+    """
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name.strip() in ("flags", "Features"):
+                    return " ".join(sorted(set(value.split())))
+    except OSError:
+        pass
+    return platform.processor()
+
+
+def session_options_key(sess_opt: SessionOptions) -> str:
+    """影响优化结果、且能从 SessionOptions 读回的设置"""
+    items = [
+        f"level={sess_opt.graph_optimization_level}",
+        f"mode={sess_opt.execution_mode}",
+        f"deterministic={sess_opt.use_deterministic_compute}",
+    ]
+    for entry in _KEY_CONFIG_ENTRIES:
+        try:
+            items.append(f"{entry}={sess_opt.get_session_config_entry(entry)}")
+        except RuntimeError:
+            pass    # 未设置
+    return ";".join(items)
+
+
+def _provider_names(providers) -> list:
+    return [p[0] if isinstance(p, (tuple, list)) else p for p in providers]
+
+
+def cached_session(
+    model_file: os.PathLike,
+    sess_opt: SessionOptions,
+    providers: list,
+    cache_dir: os.PathLike = None,
+    cache_format: str = "onnx",
+    options_key: str = "",
+) -> InferenceSession:
+    """
+    Create an InferenceSession, loading the optimized graph from the on-disk cache when possible.
+
+    options_key: extra cache key from the caller for settings that can not be read back from
+        sess_opt (free dimension overrides, ...), e.g. session_profiles.profile_key(profile).
+
+    sess_opt is modified: on a cache hit graph optimization is disabled; on a miss
+    `optimized_model_filepath` is set so ORT writes the optimized graph into the cache.
+    Only CPU-only provider lists are cached (compiled GPU nodes can not be serialized).
+    """
+    if cache_format not in CACHE_FORMATS:
+        raise ValueError(f"cache_format 只能是 {CACHE_FORMATS}, 实际是: {cache_format}")
+    model_file = Path(model_file)
+    if _provider_names(providers) != ["CPUExecutionProvider"]:
+        return InferenceSession(str(model_file), sess_options=sess_opt, providers=providers)
+
+    cache_dir = Path(cache_dir) if cache_dir is not None else default_cache_dir(model_file)
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        key_src = "|".join([
+            model_hash(model_file, cache_dir),
+            onnxruntime.__version__,
+            platform.machine(),
+            cpu_features(),
+            session_options_key(sess_opt),
+            options_key,
+            ",".join(_provider_names(providers)),
+            cache_format,
+        ])
+    except OSError as e:
+        logging.warning(f"ORT 缓存目录 {cache_dir} 不可用, 不使用缓存: {e}")
+        return InferenceSession(str(model_file), sess_options=sess_opt, providers=providers)
+    key = hashlib.sha1(key_src.encode("utf-8")).hexdigest()[:16]
+    cache_file = cache_dir / f"{model_file.stem}.{key}.{cache_format}"
+
+    if cache_file.exists():
+        level = sess_opt.graph_optimization_level
+        sess_opt.graph_optimization_level = GraphOptimizationLevel.ORT_DISABLE_ALL
+        try:
+            session = InferenceSession(str(cache_file), sess_options=sess_opt, providers=providers)
+            logging.debug(f"ORT 缓存命中: {cache_file}")
+            return session
+        except Exception as e:
+            logging.warning(f"ORT 缓存 {cache_file} 加载失败, 重新生成: {e}")
+            sess_opt.graph_optimization_level = level
+            cache_file.unlink(missing_ok=True)
+
+    stale_pattern = re.compile(rf"{re.escape(model_file.stem)}\.[0-9a-f]{{16}}\.{cache_format}")
+    for stale in cache_dir.iterdir():
+        if stale_pattern.fullmatch(stale.name):
+            stale.unlink(missing_ok=True)
+    tmp_file = cache_file.with_name(f"{cache_file.stem}.{os.getpid()}-{threading.get_ident()}.tmp.{cache_format}")
+    sess_opt.optimized_model_filepath = str(tmp_file)
+    if cache_format == "ort":
+        sess_opt.add_session_config_entry("session.save_model_format", "ORT")
+    session = InferenceSession(str(model_file), sess_options=sess_opt, providers=providers)
+    try:
+        os.replace(tmp_file, cache_file)
+        logging.info(f"ORT 优化模型已缓存: {cache_file}")
+    except OSError as e:
+        logging.warning(f"ORT 优化模型缓存失败: {e}")
+    return session
@@ -4,8 +4,12 @@
 # @Author    :lovemefan
 # @Email     :lovemefan@outlook.com
 import logging
+import threading
 import time
 import warnings
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 from pathlib import Path
 
 import numpy as np
@@ -19,18 +23,63 @@ from onnxruntime import (
 )
 
 
+from libsensevoiceOne.onnx.decode_model import PROMPT_LOGITS, TOKEN_IDS
+from libsensevoiceOne.onnx.ort_cache import cached_session
+from libsensevoiceOne.onnx.session_profiles import get_profile, make_session_options, profile_key, resolve_providers
+from libsensevoiceOne.utils.ctc import CTCGreedyDecoder, ctc_collapse, stitch_cut
+
+# onnx 类型字符串 -> numpy 类型, 用于 IOBinding 输出缓冲区
+_ORT_NP_TYPES = {
+    "tensor(float)": np.float32,
+    "tensor(float16)": np.float16,
+    "tensor(double)": np.float64,
+    "tensor(int64)": np.int64,
+    "tensor(int32)": np.int32,
+}
+# 单个可复用缓冲区的上限(字节); 更大的输入/输出每次单独分配(输出由 ORT 分配), 用完即释放,
+# 避免长输入的 ctc_logits (帧数 x 25055 x 4 字节) 在每个推理线程中常驻
+MAX_BUFFER_BYTES = 64 << 20
+# 长度分桶模式下的默认桶长(帧, 含 4 个提示帧, 1帧=60ms): 约 3.8s / 7.7s / 15s / 30s,
+# 更长的输入补齐到最大桶长的整数倍
+DEFAULT_LENGTH_BUCKETS = (64, 128, 256, 512)
+
+
+def bucket_length(frames: int, buckets) -> int:
+    """不小于 frames 的最小桶长"""
+    for bucket in buckets:
+        if frames <= bucket:
+            return bucket
+    return -(-frames // buckets[-1]) * buckets[-1]
+
+class _BindingState:
+    """一个线程的 IOBinding 与可复用缓冲区"""
+
+    def __init__(self, binding):
+        self.binding = binding
+        self.buffers = {}
+
+
 class OrtInferRuntimeSession:
-    def __init__(self, model_file, device_id=-1, intra_op_num_threads=4):
+    def __init__(self, model_file, device_id=-1, intra_op_num_threads=4, use_cache=True, cache_dir=None,
+                 use_io_binding=False, mem_reuse=False, profile=None, providers=None,
+                 max_buffer_bytes=MAX_BUFFER_BYTES):
+        """
+        profile: session profile name or dict (see session_profiles.SESSION_PROFILES), default "default".
+        providers: ordered EP list overriding the profile's, unavailable ones are skipped.
+        max_buffer_bytes: size limit of one reusable IOBinding buffer, see buffer().
+        """
         device_id = str(device_id)
-        sess_opt = SessionOptions()
-        sess_opt.intra_op_num_threads = intra_op_num_threads
+        sess_opt = make_session_options(profile, intra_op_num_threads)
         sess_opt.log_severity_level = 4
-        sess_opt.enable_cpu_mem_arena = False
+        # mem_reuse: 开启内存池与内存模式(memory pattern)复用, 适合输入形状固定(分桶)的场景
+        if mem_reuse:
+            sess_opt.enable_cpu_mem_arena = True
+            sess_opt.enable_mem_pattern = True
         sess_opt.graph_optimization_level = GraphOptimizationLevel.ORT_ENABLE_ALL
 
         cuda_ep = "CUDAExecutionProvider"
         cuda_provider_options = {
-            "device_id": device_id,
+            "device_id": device_id if device_id != "-1" else "0",
             "arena_extend_strategy": "kNextPowerOfTwo",
             "cudnn_conv_algo_search": "EXHAUSTIVE",
             "do_copy_in_default_stream": "true",
@@ -40,20 +89,31 @@ class OrtInferRuntimeSession:
             "arena_extend_strategy": "kSameAsRequested",
         }
 
-        EP_list = []
-        if (
-            device_id != "-1"
-            and get_device() == "GPU"
-            and cuda_ep in get_available_providers()
-        ):
-            EP_list = [(cuda_ep, cuda_provider_options)]
-        EP_list.append((cpu_ep, cpu_provider_options))
+        providers = providers or get_profile(profile)["providers"]
+        if providers is None:
+            EP_list = []
+            if (
+                device_id != "-1"
+                and get_device() == "GPU"
+                and cuda_ep in get_available_providers()
+            ):
+                EP_list = [(cuda_ep, cuda_provider_options)]
+            EP_list.append((cpu_ep, cpu_provider_options))
+        else:
+            EP_list = resolve_providers(providers, {
+                cuda_ep: cuda_provider_options,
+                cpu_ep: cpu_provider_options,
+                "XnnpackExecutionProvider": {"intra_op_num_threads": max(1, intra_op_num_threads or 1)},
+            })
 
         self._verify_model(model_file)
 
-        self.session = InferenceSession(
-            model_file, sess_options=sess_opt, providers=EP_list
-        )
+        if use_cache:
+            self.session = cached_session(model_file, sess_opt, EP_list, cache_dir, options_key=profile_key(profile))
+        else:
+            self.session = InferenceSession(
+                model_file, sess_options=sess_opt, providers=EP_list
+            )
 
         # delete binary of model file to save memory
         del model_file
@@ -67,24 +127,118 @@ class OrtInferRuntimeSession:
                 RuntimeWarning,
             )
 
+        # 输入输出的元数据在构造时缓存, 每次推理不再遍历 get_inputs()/get_outputs()
+        self.input_names = [v.name for v in self.session.get_inputs()]
+        self.output_names = [v.name for v in self.session.get_outputs()]
+        self.output_types = [_ORT_NP_TYPES.get(v.type) for v in self.session.get_outputs()]
+        self.use_io_binding = use_io_binding
+        # IOBinding 与复用缓冲区按线程各自一份, 多线程同时推理时互不覆盖;
+        # _states 弱引用各线程的状态, 供 release_buffers() 使用, 线程结束后自动移除
+        self.max_buffer_bytes = max_buffer_bytes
+        self._local = threading.local()
+        self._states = weakref.WeakSet()
+
     def __call__(self, input_content) -> np.ndarray:
-        input_dict = dict(zip(self.get_input_names(), input_content))
+        input_dict = dict(zip(self.input_names, input_content))
         try:
-            result = self.session.run(self.get_output_names(), input_dict)
+            result = self.session.run(self.output_names, input_dict)
             return result
         except Exception as e:
             print(e)
             raise RuntimeError(f"ONNXRuntime inferece failed. ") from e
 
+    def _thread_state(self):
+        """当前线程的 IOBinding 与缓冲区, 首次使用时创建"""
+        state = getattr(self._local, "state", None)
+        if state is None:
+            state = _BindingState(self.session.io_binding() if self.use_io_binding else None)
+            self._local.state = state
+            self._states.add(state)
+        return state
+
+    def buffer(self, key: str, shape, dtype=np.float32):
+        """
+        A C-contiguous view of shape `shape` into a reusable flat buffer of the calling thread.
+        The buffer grows in power-of-two buckets (capped at max_buffer_bytes), so once the
+        longest input has been seen no further allocation happens. The content is not cleared.
+        Return None when the array alone is larger than max_buffer_bytes: the caller
+        allocates it for this call only.
+        """
+        size = int(np.prod(shape))
+        itemsize = np.dtype(dtype).itemsize
+        if size * itemsize > self.max_buffer_bytes:
+            return None
+        buffers = self._thread_state().buffers
+        buf = buffers.get(key)
+        if buf is None or buf.size < size or buf.dtype != dtype:
+            capacity = 1 << max(size - 1, 0).bit_length()
+            if capacity * itemsize > self.max_buffer_bytes:
+                capacity = self.max_buffer_bytes // itemsize
+            buf = np.empty(capacity, dtype=dtype)
+            buffers[key] = buf
+        return buf[:size].reshape(shape)
+
+    def release_buffers(self) -> None:
+        """
+        Drop the reusable buffers of all threads. Arrays returned before stay valid
+        (they keep their memory alive); later calls allocate again.
+        """
+        for state in list(self._states):
+            state.buffers = {}
+
+    def run_with_binding(self, input_content, output_shapes) -> list:
+        """
+        Run with IOBinding: inputs are bound in place (no copy), outputs are written
+        into preallocated buffers of the given shapes (None: let ORT allocate).
+        Each thread has its own binding and buffers; the returned arrays are views into
+        them and are only valid until the same thread's next call.
+        Falls back to __call__ when binding is disabled, or for this call only when it fails.
+        """
+        if not self.use_io_binding:
+            return self(input_content)
+        binding = self._thread_state().binding
+        try:
+            inputs = []  # 保持引用直到推理结束
+            for name, arr in zip(self.input_names, input_content):
+                arr = np.ascontiguousarray(arr)
+                inputs.append(arr)
+                binding.bind_input(name, "cpu", 0, arr.dtype.type, arr.shape, arr.ctypes.data)
+            outputs = []
+            for name, dtype, shape in zip(self.output_names, self.output_types, output_shapes):
+                if shape is None or dtype is None:
+                    binding.bind_output(name, "cpu")
+                    outputs.append(None)
+                    continue
+                out = self.buffer(f"out:{name}", shape, dtype)
+                if out is None:
+                    # 超过 max_buffer_bytes 的输出由 ORT 分配, 不常驻
+                    binding.bind_output(name, "cpu")
+                    outputs.append(None)
+                    continue
+                binding.bind_output(name, "cpu", 0, dtype, out.shape, out.ctypes.data)
+                outputs.append(out)
+            self.session.run_with_iobinding(binding)
+            if any(out is None for out in outputs):
+                ort_outputs = binding.copy_outputs_to_cpu()
+                outputs = [ort if out is None else out for out, ort in zip(outputs, ort_outputs)]
+            return outputs
+        except Exception as e:
+            # 只对本次调用回退, 不关闭其它调用方的 IOBinding
+            logging.warning(f"IOBinding 推理失败, 本次改用普通推理: {e}")
+            return self(input_content)
+        finally:
+            binding.clear_binding_inputs()
+            binding.clear_binding_outputs()
+
     def get_input_names(
         self,
     ):
-        return [v.name for v in self.session.get_inputs()]
+        return list(self.input_names)
 
     def get_output_names(
         self,
     ):
-        return [v.name for v in self.session.get_outputs()]
+        return list(self.output_names)
 
     def get_character_list(self, key: str = "character"):
         return self.meta_dict[key].splitlines()
@@ -123,53 +277,355 @@ class SenseVoiceInferenceSession:
         bpe_model_file,
         device_id=-1,
         intra_op_num_threads=4,
+        use_ort_cache=True,
+        use_io_binding=True,
+        length_buckets=None,
+        profile=None,
+        providers=None,
     ):
+        """
+        length_buckets: None, or ascending frame lengths (prompt included). When set, inputs are
+            zero-padded up to a bucket length (speech_lengths keeps the true length) and the
+            encoder session reuses its memory arena/pattern; call warmup() once after loading.
+        profile / providers: ORT session profile and ordered EP list, see OrtInferRuntimeSession.
+        """
         logging.debug(f"Loading model from {embedding_model_file}")
-
-        self.embedding = np.load(embedding_model_file)
-        logging.debug(f"Loading model {encoder_model_file}")
-        start = time.time()
-        self.encoder = OrtInferRuntimeSession(
-            encoder_model_file,
-            device_id=device_id,
-            intra_op_num_threads=intra_op_num_threads,
-        )
-        logging.info(f"Loading {encoder_model_file} takes {time.time() - start:.2f} seconds")
+        self.length_buckets = tuple(sorted(length_buckets)) if length_buckets else None
+        self.load_times = {}
         self.blank_id = 0
-        self.sp = spm.SentencePieceProcessor()
-        self.sp.load(bpe_model_file)
+        self._queries = {}
+
+        def timed(name, func, *args, **kwargs):
+            start = time.perf_counter()
+            obj = func(*args, **kwargs)
+            self.load_times[name] = time.perf_counter() - start
+            return obj
+
+        # 编码器建图(释放 GIL)、embedding 与 bpe 模型的读取并行进行
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            encoder_future = pool.submit(
+                timed, "encoder", OrtInferRuntimeSession,
+                encoder_model_file,
+                device_id=device_id,
+                intra_op_num_threads=intra_op_num_threads,
+                use_cache=use_ort_cache,
+                use_io_binding=use_io_binding,
+                mem_reuse=self.length_buckets is not None,
+                profile=profile,
+                providers=providers,
+            )
+            embedding_future = pool.submit(timed, "embedding", np.load, embedding_model_file)
+            sp_future = pool.submit(timed, "bpe", self._load_sp, bpe_model_file)
+            self.embedding = embedding_future.result()
+            self.sp = sp_future.result()
+            self.encoder = encoder_future.result()
+        self.decoder = CTCGreedyDecoder(self.sp, self.blank_id)
+        # decode 模型(decode_model.py 生成)在图中完成 argmax, 直接输出每帧的 token id
+        self.is_decode_model = TOKEN_IDS in self.encoder.output_names
+        # 输出形状模板: 第 0 维为 batch, 第 1 维(非固定时)为帧数, 其余未知维度交给 ORT 分配
+        self._output_dims = [
+            [d if isinstance(d, int) else None for d in v.shape]
+            for v in self.encoder.session.get_outputs()]
+        logging.info(f"Loading {encoder_model_file} takes {self.load_times['encoder']:.2f} seconds")
+
+    @staticmethod
+    def _load_sp(bpe_model_file):
+        sp = spm.SentencePieceProcessor()
+        sp.load(bpe_model_file)
+        return sp
+
+    def query(self, language: int, use_itn: bool) -> np.ndarray:
+        """
+        The 4 prompt rows put in front of the speech features:
+        language, event/emotion (1, 2) and text normalization (14 with itn, 15 without).
+        Return: float32 (4, dim), cached per (language, use_itn).
+        """
+        key = (language, bool(use_itn))
+        query = self._queries.get(key)
+        if query is None:
+            query = self.embedding[[language, 1, 2, 14 if use_itn else 15]].astype(np.float32)
+            query.setflags(write=False)
+            self._queries[key] = query
+        return query
+
+    def _output_shape(self, dims: list, batch: int, frames: int):
+        shape = [batch] + [frames if i == 1 and d is None else d for i, d in enumerate(dims) if i > 0]
+        return None if None in shape else tuple(shape)
+
+    def _encode(self, input_content: np.ndarray, input_length: np.ndarray) -> dict:
+        """
+        Run the encoder.
+        Return: dict of outputs by name, always with TOKEN_IDS (B, T) and "encoder_out_lens" (B,).
+        For a decode model the argmax comes from the graph, otherwise from ctc_logits (the first output).
+        """
+        batch, frames = input_content.shape[:2]
+        out_shapes = [self._output_shape(dims, batch, frames) for dims in self._output_dims]
+        outputs = self.encoder.run_with_binding((input_content, input_length), out_shapes)
+        encoder_out = dict(zip(self.encoder.output_names, outputs))
+        if not self.is_decode_model:
+            encoder_out[TOKEN_IDS] = outputs[0].argmax(axis=-1)
+        encoder_out.setdefault("encoder_out_lens", input_length)
+        return encoder_out
 
-    def inference(self, speech, language: int, use_itn: bool) -> np.ndarray:
+    def _input_buffers(self, batch: int, frames: int) -> tuple:
+        """(input_content (B, T, dim), input_length (B,)), the calling thread's bound buffers when IOBinding is on"""
+        dim = self.embedding.shape[-1]
+        speech = lengths = None
+        if self.encoder.use_io_binding:
+            speech = self.encoder.buffer("in:speech", (batch, frames, dim), np.float32)
+            lengths = self.encoder.buffer("in:speech_lengths", (batch,), np.int64)
+        if speech is None:
+            speech = np.empty((batch, frames, dim), dtype=np.float32)
+        if lengths is None:
+            lengths = np.empty((batch,), dtype=np.int64)
+        return speech, lengths
+
+    def release_buffers(self) -> None:
+        """释放编码器各线程的可复用输入/输出缓冲区(见 OrtInferRuntimeSession.release_buffers)"""
+        self.encoder.release_buffers()
+
+    def padded_length(self, frames: int) -> int:
+        """分桶模式下补齐后的帧数, 否则不变"""
+        if self.length_buckets is None:
+            return frames
+        return bucket_length(frames, self.length_buckets)
+
+    def warmup(self, language: int = 0, use_itn: bool = True) -> None:
+        """对每个桶长各推理一次, 让 ORT 预先完成内存规划, 避免首句的额外延迟"""
+        dim = self.embedding.shape[-1]
+        for bucket in self.length_buckets or ():
+            self.inference(np.zeros((1, bucket - 4, dim), dtype=np.float32), language, use_itn)
+
+    def language_probs(self, speech: np.ndarray, tags: dict) -> dict:
+        """
+        Language probabilities from the language-tag position (output frame 0) of an
+        "auto" query, in a single encoder run.
+
+        speech: float32 (T, 560) LFR+CMVN features, a few seconds are enough
+        tags: {name: token id} of the candidate language tags, e.g. {"zh": 24884, ...}
+        Return: {name: probability}, softmax over the candidate tags only
+        """
+        query = self.query(0, True)
+        n_query = query.shape[0]
+        frames = n_query + speech.shape[0]
+        input_content, input_length = self._input_buffers(1, self.padded_length(frames))
+        input_content[0, :n_query] = query
+        input_content[0, n_query:frames] = speech
+        input_content[0, frames:] = 0
+        input_length[0] = frames
+        encoder_out = self._encode(input_content, input_length)
+        if self.is_decode_model:
+            if PROMPT_LOGITS not in encoder_out:
+                raise RuntimeError("decode 模型没有 prompt_logits 输出, 无法检测语言(生成时 --prompt-frames 需 > 0)")
+            logits = encoder_out[PROMPT_LOGITS][0, 0]
+        else:
+            logits = encoder_out[self.encoder.output_names[0]][0, 0]
+        names = list(tags)
+        tag_logits = logits[[tags[name] for name in names]].astype(np.float64)
+        probs = np.exp(tag_logits - tag_logits.max())
+        probs /= probs.sum()
+        return dict(zip(names, probs.tolist()))
+
+    def inference(self, speech, language: int, use_itn: bool, with_timestamps: bool = False):
         logging.debug(f"inference start")
-        language_query = self.embedding[[[language]]]
-        
-        # 14 means with itn, 15 means without itn
-        event_emo_query = self.embedding[[[1, 2]]]
-        text_norm_query = self.embedding[[[14 if use_itn else 15]]]
-
-        input_content = np.concatenate(
-            [
-                language_query,
-                event_emo_query,
-                text_norm_query,
-                speech,
-            ],
-            axis=1,
-        ).astype(np.float32)
-        input_length = np.array([input_content.shape[1]], dtype=np.int64)
-
-        encoder_out = self.encoder((input_content, input_length))[0]
-
-        def unique_consecutive(arr):
-            if len(arr) == 0:
-                return arr
-            # Create a boolean mask where True indicates the element is different from the previous one
-            mask = np.append([True], arr[1:] != arr[:-1])
-            out = arr[mask]
-            out = out[out != self.blank_id]
-            return out.tolist()
-
-        hypos = unique_consecutive(encoder_out[0].argmax(axis=-1))
-
-        text = self.sp.DecodeIds(hypos)
-        return text
+        query = self.query(language, use_itn)
+        n_query = query.shape[0]
+        frames = n_query + speech.shape[1]
+        # 提示行与语音特征直接写入(绑定的)输入缓冲区, 不再 np.concatenate
+        input_content, input_length = self._input_buffers(speech.shape[0], self.padded_length(frames))
+        input_content[:, :n_query] = query
+        input_content[:, n_query:frames] = speech
+        input_content[:, frames:] = 0
+        input_length[:] = frames
+
+        encoder_out = self._encode(input_content, input_length)
+        # with_timestamps: {"text":..., "tokens":[...]}, 见 CTCGreedyDecoder
+        return self.decoder.decode(
+            encoder_out[TOKEN_IDS][:1], encoder_out["encoder_out_lens"][:1],
+            with_timestamps=with_timestamps)[0]
+
+    @staticmethod
+    def make_batches(lengths, batch_size: int, max_batch_frames: int) -> list:
+        """
+        Group items into batches, longest first so each batch holds similar lengths.
+        A batch holds at most batch_size items and at most max_batch_frames padded
+        frames (items x longest item); a single longer item still gets its own batch.
+        Return: list of index lists into lengths.
+        """
+        order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+        batches, batch = [], []
+        for i in order:
+            # 按长度降序, 批内第一个就是最长的
+            if batch and (len(batch) >= batch_size
+                          or (len(batch) + 1) * lengths[batch[0]] > max_batch_frames):
+                batches.append(batch)
+                batch = []
+            batch.append(i)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def inference_batch(
+        self,
+        speech_list: list,
+        language: int,
+        use_itn: bool,
+        batch_size: int = 8,
+        max_batch_frames: int = 1000,
+        with_timestamps: bool = False,
+    ) -> list:
+        """
+        Batched inference for several utterances (e.g. VAD segments).
+
+        speech_list: list of float32 (T_i, 560) LFR+CMVN features
+        batch_size: max utterances per encoder run
+        max_batch_frames: max padded frames (utterances x longest, prompt included) per run,
+            bounds the (B, T, vocab) ctc_logits memory (not needed by a decode model)
+        with_timestamps: return {"text", "tokens"} dicts with per-token frames/seconds instead of texts
+        Return: list of results, in the order of speech_list
+        """
+        logging.debug(f"inference_batch start, {len(speech_list)} items")
+        query = self.query(language, use_itn)
+        n_query = query.shape[0]
+        lengths = [feat.shape[0] + n_query for feat in speech_list]
+        results = [None] * len(speech_list)
+        for batch in self.make_batches(lengths, max(1, batch_size), max_batch_frames):
+            decoded = self._decode_batch([speech_list[i] for i in batch], query, with_timestamps)
+            for row, i in enumerate(batch):
+                results[i] = decoded[row]
+        return results
+
+    def inference_batch_iter(
+        self,
+        speech_iter,
+        language: int,
+        use_itn: bool,
+        batch_size: int = 8,
+        max_batch_frames: int = 1000,
+        with_timestamps: bool = False,
+    ):
+        """
+        inference_batch() for features produced one at a time (e.g. per VAD segment).
+
+        Items are batched in arrival order, not sorted: a batch runs as soon as it holds
+        batch_size items or the next item would take it over max_batch_frames padded frames,
+        so only one batch of features is kept in memory.
+        Yield: the results, in the order of speech_iter
+        """
+        query = self.query(language, use_itn)
+        n_query = query.shape[0]
+        batch_size = max(1, batch_size)
+        batch, longest = [], 0
+        for feat in speech_iter:
+            length = feat.shape[0] + n_query
+            if batch and (len(batch) >= batch_size
+                          or (len(batch) + 1) * max(longest, length) > max_batch_frames):
+                yield from self._decode_batch(batch, query, with_timestamps)
+                batch, longest = [], 0
+            batch.append(feat)
+            longest = max(longest, length)
+        if batch:
+            yield from self._decode_batch(batch, query, with_timestamps)
+
+    def _decode_batch(self, feats: list, query: np.ndarray, with_timestamps: bool) -> list:
+        """一批 (T_i, 560) 特征补齐到最长者(分桶时为桶长)后推理一次, 结果与 feats 顺序相同"""
+        n_query = query.shape[0]
+        lengths = [feat.shape[0] + n_query for feat in feats]
+        input_content, input_length = self._input_buffers(len(feats), self.padded_length(max(lengths)))
+        input_content[:, :n_query] = query
+        for row, feat in enumerate(feats):
+            input_content[row, n_query:lengths[row]] = feat
+            input_content[row, lengths[row]:] = 0
+            input_length[row] = lengths[row]
+
+        encoder_out = self._encode(input_content, input_length)
+        token_ids, out_lens = encoder_out[TOKEN_IDS], encoder_out["encoder_out_lens"]
+        return self.decoder.decode(token_ids, out_lens, with_timestamps=with_timestamps)
+
+    def _window_token_ids(self, speech: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """单个窗口 (T, dim) 的逐帧 token id, 长度 4 + T(含提示帧)"""
+        n_query = query.shape[0]
+        frames = n_query + speech.shape[0]
+        input_content, input_length = self._input_buffers(1, self.padded_length(frames))
+        input_content[0, :n_query] = query
+        input_content[0, n_query:frames] = speech
+        input_content[0, frames:] = 0
+        input_length[0] = frames
+        encoder_out = self._encode(input_content, input_length)
+        length = int(encoder_out["encoder_out_lens"][0])
+        return np.array(encoder_out[TOKEN_IDS][0, :length])
+
+    def inference_chunked(
+        self,
+        feats_iter,
+        language: int,
+        use_itn: bool,
+        window: int = 500,
+        overlap: int = 50,
+        with_timestamps: bool = False,
+    ):
+        """
+        Sliding-window inference for long audio with bounded memory.
+
+        feats_iter: iterable of float32 (n, 560) LFR+CMVN feature blocks of any size
+            (e.g. WavFrontend.pop_features() while streaming); only one window is kept.
+        window / overlap: encoder window and overlap in LFR frames (60 ms each).
+        Consecutive windows are stitched inside their overlap at a frame both windows align
+        to blank (see stitch_cut): tokens before the cut come from the earlier window, the
+        rest from the later one, so border words are neither duplicated nor dropped.
+        Only the first window's prompt tokens (language/event tags) are kept.
+        Return: text, or {"text", "tokens"} with with_timestamps (same as inference()).
+        """
+        query = self.query(language, use_itn)
+        n_query = query.shape[0]
+        if not 0 <= overlap < window:
+            raise ValueError(f"overlap 必须在 [0, window) 之间: window={window}, overlap={overlap}")
+        step = window - overlap
+
+        buf = np.zeros((0, query.shape[1]), dtype=np.float32)
+        buf_beg = 0             # buf[0] 的全局帧号
+        win_beg = 0             # 当前窗口的全局起始帧
+        prev = None             # 上一个窗口: (起始帧, 逐帧 id)
+        pending = None          # 上一个窗口尚未确定的 token: (ids, start, end), 解码器坐标
+        kept = []
+        for block in chain(feats_iter, [None]):
+            is_final = block is None
+            if not is_final and block.shape[0] > 0:
+                buf = np.concatenate((buf, block))
+            buf_end = buf_beg + buf.shape[0]
+            while buf_end >= win_beg + window or (
+                is_final and (prev is None or prev[0] + prev[1].shape[0] - n_query < buf_end)
+            ):
+                win_end = min(win_beg + window, buf_end)
+                token_ids = self._window_token_ids(buf[win_beg - buf_beg : win_end - buf_beg], query)
+                ids, starts, ends = ctc_collapse(token_ids, blank_id=self.blank_id)[0]
+                # 解码器坐标: 全局语音帧 + 提示帧数; 提示帧上的 token 坐标小于 win_beg + n_query
+                starts, ends = starts + win_beg, ends + win_beg
+                cut = 0
+                if prev is not None:
+                    prev_beg, prev_ids = prev
+                    overlap_end = prev_beg + prev_ids.shape[0] - n_query
+                    cut = win_beg + stitch_cut(
+                        prev_ids[n_query + win_beg - prev_beg :],
+                        token_ids[n_query : n_query + overlap_end - win_beg],
+                        self.blank_id,
+                    )
+                    p_ids, p_starts, p_ends = pending
+                    keep = p_starts < cut + n_query
+                    kept.append((p_ids[keep], p_starts[keep], p_ends[keep]))
+                    keep = starts >= cut + n_query
+                    ids, starts, ends = ids[keep], starts[keep], ends[keep]
+                pending = (ids, starts, ends)
+                prev = (win_beg, token_ids)
+                win_beg += step
+            # 只保留下一个窗口需要的特征
+            drop = min(max(0, win_beg - buf_beg), buf.shape[0])
+            buf = buf[drop:]
+            buf_beg += drop
+        if pending is not None:
+            kept.append(pending)
+        if not kept:
+            empty = np.zeros(0, dtype=np.int64)
+            kept = [(empty, empty, empty)]
+        collapsed = tuple(np.concatenate(part) for part in zip(*kept))
+        return self.decoder.decode_collapsed([collapsed], with_timestamps=with_timestamps)[0]
@@ -0,0 +1,138 @@
+# =========================================
+# -*- coding: utf-8 -*-
+# Project     : SenseVoiceOne
+# Module      : session_profiles.py
+# Author      : KyleWang[kylewang1977@gmail.com]
+# Time        : 2026-10-17 18:30
+# Version     : 1.0.0
+# Last Updated:
+# Description : ORT 会话配置方案(profile)与执行后端(EP)选择。
+#               profile 包括: 线程数(intra/inter)、执行模式、线程自旋、内存池、内存模式、EP 顺序。
+#               EP 按顺序尝试, 当前环境不可用的自动跳过, 最后总是回退到 CPU。
+#               各 profile 在本机的 RTF 对比: python -m libsensevoiceOne.profile_bench
+# =========================================
+import json
+import logging
+
+from onnxruntime import ExecutionMode, SessionOptions, get_available_providers
+
+CPU_EP = "CPUExecutionProvider"
+
+# intra_op_num_threads / vad_intra_op_num_threads 为 None 时使用调用方给出的线程数
+# (SenseVoiceOne 的 n_threads; VAD 为 ORT 默认值), 0 表示由 ORT 按物理核数决定。
+SESSION_PROFILES = {
+    # 原有的行为: CUDA(device>=0 时)或 CPU, 不使用内存池
+    "default": {
+        "intra_op_num_threads": None,
+        "inter_op_num_threads": 0,
+        "execution_mode": "sequential",
+        "allow_spinning": True,
+        "enable_cpu_mem_arena": False,
+        "enable_mem_pattern": True,
+        "providers": None,
+        "vad_intra_op_num_threads": None,
+        # 线程池各线程的 CPU 绑定("session.intra_op_thread_affinities", 编号从 1 开始),
+        # 由 ThreadBudget 设置(见 libsensevoiceOne.thread_budget)
+        "intra_op_thread_affinities": None,
+        "vad_intra_op_thread_affinities": None,
+    },
+    # 树莓派 5 实时字幕: 4 核全部留给编码器, 不自旋(录音线程与界面需要 CPU),
+    # 内存池复用降低分配抖动, 优先 XNNPACK
+    "pi5-realtime": {
+        "intra_op_num_threads": 4,
+        "inter_op_num_threads": 1,
+        "execution_mode": "sequential",
+        "allow_spinning": False,
+        "enable_cpu_mem_arena": True,
+        "enable_mem_pattern": True,
+        "providers": ["XnnpackExecutionProvider", CPU_EP],
+        "vad_intra_op_num_threads": 1,
+    },
+    # 台式机批量转写: 线程数由 ORT 决定, 自旋等待降低单次延迟, 优先 GPU
+    "desktop-batch": {
+        "intra_op_num_threads": 0,
+        "inter_op_num_threads": 0,
+        "execution_mode": "sequential",
+        "allow_spinning": True,
+        "enable_cpu_mem_arena": True,
+        "enable_mem_pattern": True,
+        "providers": ["CUDAExecutionProvider", "DmlExecutionProvider", CPU_EP],
+        "vad_intra_op_num_threads": 1,
+    },
+    # 低内存: 关闭内存池与内存模式, 少量线程
+    "low-memory": {
+        "intra_op_num_threads": 2,
+        "inter_op_num_threads": 1,
+        "execution_mode": "sequential",
+        "allow_spinning": False,
+        "enable_cpu_mem_arena": False,
+        "enable_mem_pattern": False,
+        "providers": [CPU_EP],
+        "vad_intra_op_num_threads": 1,
+    },
+}
+
+
+def get_profile(profile) -> dict:
+    """profile: 名称或 dict(未给出的项取 "default" 的值)"""
+    if profile is None:
+        profile = "default"
+    if isinstance(profile, str):
+        if profile not in SESSION_PROFILES:
+            raise ValueError(f"未知的 session profile: {profile}, 可选: {list(SESSION_PROFILES)}")
+        profile = SESSION_PROFILES[profile]
+    return {**SESSION_PROFILES["default"], **profile}
+
+
+def profile_key(profile) -> str:
+    """profile 合并默认值后按键排序的 JSON 字符串, 用作 ORT 缓存键的一部分"""
+    return json.dumps(get_profile(profile), sort_keys=True, default=str)
+
+
+def make_session_options(profile, intra_op_num_threads: int = None, vad: bool = False) -> SessionOptions:
+    """
+    Build SessionOptions from a profile. intra_op_num_threads is used when the
+    profile leaves the thread count to the caller (None).
+    """
+    profile = get_profile(profile)
+    prefix = "vad_" if vad else ""
+    threads = profile[prefix + "intra_op_num_threads"]
+    if threads is None:
+        threads = intra_op_num_threads
+    sess_opt = SessionOptions()
+    if threads is not None:
+        sess_opt.intra_op_num_threads = threads
+    sess_opt.inter_op_num_threads = profile["inter_op_num_threads"]
+    affinities = profile[prefix + "intra_op_thread_affinities"]
+    if affinities and threads:
+        # 线程数必须显式给出, 每个线程池线程(threads - 1 个)一组
+        sess_opt.add_session_config_entry("session.intra_op_thread_affinities", affinities)
+    sess_opt.execution_mode = (
+        ExecutionMode.ORT_PARALLEL if profile["execution_mode"] == "parallel"
+        else ExecutionMode.ORT_SEQUENTIAL)
+    sess_opt.enable_cpu_mem_arena = profile["enable_cpu_mem_arena"]
+    sess_opt.enable_mem_pattern = profile["enable_mem_pattern"]
+    spinning = "1" if profile["allow_spinning"] else "0"
+    sess_opt.add_session_config_entry("session.intra_op.allow_spinning", spinning)
+    sess_opt.add_session_config_entry("session.inter_op.allow_spinning", spinning)
+    return sess_opt
+
+
+def resolve_providers(providers: list, provider_options: dict = None) -> list:
+    """
+    Keep the available providers of an ordered EP list, always ending with CPU.
+    provider_options: {ep_name: options dict}
+    Return: ORT providers list of (name, options)
+    """
+    provider_options = provider_options or {}
+    available = get_available_providers()
+    resolved = []
+    for ep in providers:
+        if ep == CPU_EP:
+            continue
+        if ep in available:
+            resolved.append((ep, provider_options.get(ep, {})))
+        else:
+            logging.info(f"{ep} 不可用, 跳过")
+    resolved.append((CPU_EP, provider_options.get(CPU_EP, {})))
+    return resolved
@@ -0,0 +1,138 @@
+# =========================================
+# -*- coding: utf-8 -*-
+# Project     : SenseVoiceOne
+# Module      : pool.py
+# Author      : KyleWang[kylewang1977@gmail.com]
+# Time        : 2026-10-17 17:20
+# Version     : 1.0.0
+# Last Updated:
+# Description : 多进程转写池。每个工作进程只加载一次 SenseVoiceOne(独立的 ORT 会话),
+#               n_threads 默认取 CPU核数 // 进程数, 使 进程数 x 线程数 = 核数。
+#               用于大批量文件转写:
+#                   with TranscriberPool(workers=4) as pool:
+#                       for res in pool.map(files, use_itn=True):
+#                           ...
+# =========================================
+import logging
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Iterable, Iterator, Tuple
+
+_END = object()
+# 工作进程内的模型对象, 由 _init_worker 创建
+_worker_model = None
+
+
+def cpu_cores() -> int:
+    """当前进程可用的 CPU 核数"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _init_worker(load_kwargs: dict) -> None:
+    global _worker_model
+    from libsensevoiceOne.model import SenseVoiceOne
+    _worker_model = SenseVoiceOne()
+    _worker_model.load_model(**load_kwargs)
+    logging.debug(f"worker {os.getpid()} ready, n_threads={load_kwargs.get('n_threads')}")
+
+
+def _transcribe(audio, transcribe_kwargs: dict):
+    return _worker_model.transcribe(audio, **transcribe_kwargs)
+
+
+class TranscriberPool:
+    """
+    A pool of worker processes, each holding its own loaded SenseVoiceOne.
+
+    Parameters
+    ----------
+    workers : int
+        number of worker processes, default: CPU cores.
+    n_threads : int
+        ORT intra-op threads per worker, default: max(1, cores // workers).
+    mp_context : str
+        multiprocessing start method, default "spawn" (safe with ORT/Qt threads in the parent).
+    max_pending : int
+        max jobs in flight for map()/imap_unordered(), default 2 x workers; limits the
+        number of pickled ndarray jobs held in memory.
+    **load_kwargs :
+        passed to SenseVoiceOne.load_model() in every worker.
+    """
+
+    def __init__(
+        self,
+        workers: int = None,
+        n_threads: int = None,
+        mp_context: str = "spawn",
+        max_pending: int = None,
+        **load_kwargs,
+    ) -> None:
+        cores = cpu_cores()
+        self.workers = workers or cores
+        self.n_threads = n_threads or max(1, cores // self.workers)
+        self.max_pending = max_pending or 2 * self.workers
+        load_kwargs["n_threads"] = self.n_threads
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context(mp_context),
+            initializer=_init_worker,
+            initargs=(load_kwargs,),
+        )
+        logging.info(f"TranscriberPool: {self.workers} workers x {self.n_threads} threads")
+
+    def submit(self, audio, **transcribe_kwargs) -> Future:
+        """提交一个任务(文件路径或 ndarray), 返回 Future, 结果同 SenseVoiceOne.transcribe()"""
+        return self._executor.submit(_transcribe, audio, transcribe_kwargs)
+
+    def imap_unordered(self, audios: Iterable, **transcribe_kwargs) -> Iterator[Tuple[int, object]]:
+        """按完成顺序返回 (提交序号, 结果)"""
+        audios = iter(audios)
+        pending = {}
+        index = 0
+        while True:
+            while len(pending) < self.max_pending:
+                audio = next(audios, _END)
+                if audio is _END:
+                    break
+                pending[self.submit(audio, **transcribe_kwargs)] = index
+                index += 1
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+
+    def map(self, audios: Iterable, ordered: bool = True, **transcribe_kwargs) -> Iterator:
+        """
+        Transcribe every item of audios.
+        ordered=True: yield results in submission order;
+        ordered=False: yield (index, result) in completion order (same as imap_unordered).
+        """
+        if not ordered:
+            yield from self.imap_unordered(audios, **transcribe_kwargs)
+            return
+        audios = iter(audios)
+        pending = deque()
+        while True:
+            while len(pending) < self.max_pending:
+                audio = next(audios, _END)
+                if audio is _END:
+                    break
+                pending.append(self.submit(audio, **transcribe_kwargs))
+            if not pending:
+                return
+            yield pending.popleft().result()
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def __enter__(self) -> "TranscriberPool":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        # 异常退出时取消尚未开始的任务
+        self.shutdown(wait=True, cancel_futures=exc_type is not None)
@@ -0,0 +1,107 @@
+# =========================================
+# -*- coding: utf-8 -*-
+# Project     : SenseVoiceOne
+# Module      : profile_bench.py
+# Author      : KyleWang[kylewang1977@gmail.com]
+# Time        : 2026-10-17 18:50
+# Version     : 1.0.0
+# Last Updated:
+# Description : ORT 会话配置方案(profile)的 RTF 基准测试, 用于为每台机器选择最合适的 profile。
+#               python -m libsensevoiceOne.profile_bench [--audio ref.wav] [--profiles pi5-realtime low-memory]
+#               RTF(real time factor) = 转写耗时 / 音频时长, 越小越好, < 1 才能实时。
+#               未给出 --audio 时使用合成的 10 秒测试音频(只测速度, 不关心识别结果)。
+# =========================================
+import argparse
+import gc
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+if __name__ == "__main__":
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    sys.path.insert(0, project_root)
+
+
+def reference_clip(seconds: float = 10.0, sr: int = 16000) -> np.ndarray:
+    """合成的测试音频: 噪声背景上的若干段谐波'语音', float32 [-1, 1]"""
+    rng = np.random.default_rng(0)
+    n = int(seconds * sr)
+    wav = 0.003 * rng.standard_normal(n)
+    t = np.arange(n) / sr
+    for beg in np.arange(0.5, seconds - 1.0, 2.0):
+        mask = (t >= beg) & (t < beg + 1.5)
+        tt = t[mask] - beg
+        f0 = rng.uniform(100, 250)
+        wav[mask] += 0.1 * sum(np.sin(2 * np.pi * f0 * k * tt) / k for k in range(1, 10))
+    return wav.astype(np.float32)
+
+
+def bench_profile(profile: str, audio, runs: int = 5, **load_kwargs) -> dict:
+    """加载一次模型并多次转写 audio, 返回加载耗时、首次延迟与 RTF(中位数)"""
+    from libsensevoiceOne.model import SenseVoiceOne
+
+    model = SenseVoiceOne()
+    start = time.perf_counter()
+    model.load_model(profile=profile, **load_kwargs)
+    load_seconds = time.perf_counter() - start
+
+    waveform = model.load_audio(audio, True)
+    duration = waveform.shape[1] / 16000
+    start = time.perf_counter()
+    model.transcribe(waveform)
+    first = time.perf_counter() - start
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        model.transcribe(waveform)
+        times.append(time.perf_counter() - start)
+    providers = model.model.encoder.session.get_providers()
+    del model
+    gc.collect()
+    return {
+        "profile": profile,
+        "providers": providers,
+        "load": load_seconds,
+        "first": first,
+        "rtf": statistics.median(times) / duration,
+    }
+
+
+def main(argv=None) -> int:
+    from libsensevoiceOne.onnx.session_profiles import SESSION_PROFILES
+
+    parser = argparse.ArgumentParser(description="RTF benchmark of the ORT session profiles")
+    parser.add_argument("--audio", default=None, help="reference clip, default: 10 s synthetic audio")
+    parser.add_argument("--profiles", nargs="+", default=list(SESSION_PROFILES))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--model-file", default="sense-voice-encoder-int8.onnx")
+    parser.add_argument("--model-dir", default="./resources/SenseVoice")
+    parser.add_argument("--n-threads", type=int, default=4,
+                        help="threads for profiles that leave the count to the caller")
+    parser.add_argument("--no-vad", action="store_true", help="do not load the VAD model")
+    args = parser.parse_args(argv)
+
+    audio = args.audio if args.audio is not None else reference_clip()
+    results = []
+    for profile in args.profiles:
+        res = bench_profile(
+            profile, audio, runs=args.runs,
+            senseVoice_model_file=args.model_file,
+            senseVoice_model_dir=args.model_dir,
+            n_threads=args.n_threads,
+            is_vad=not args.no_vad,
+        )
+        results.append(res)
+        print(f"{res['profile']:<16}load {res['load']:6.2f} s  first {res['first'] * 1000:8.1f} ms  "
+              f"RTF {res['rtf']:.3f}  [{', '.join(res['providers'])}]")
+
+    best = min(results, key=lambda r: r["rtf"])
+    print(f"\nbest profile: {best['profile']} (RTF {best['rtf']:.3f})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
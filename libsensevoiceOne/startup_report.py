@@ -0,0 +1,110 @@
+# =========================================
+# -*- coding: utf-8 -*-
+# Project     : SenseVoiceOne
+# Module      : startup_report.py
+# Author      : KyleWang[kylewang1977@gmail.com]
+# Time        : 2026-10-17 13:40
+# Version     : 1.0.0
+# Last Updated:
+# Description : 冷启动耗时报告。统计各依赖的导入耗时与模型加载各阶段的耗时。
+#               python -m libsensevoiceOne.startup_report [--model-file xxx.onnx] [--budget 3.0]
+#               --budget: 总耗时超过预算时返回非 0, 可用于持续检查冷启动时间。
+# =========================================
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+if __name__ == "__main__":
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    sys.path.insert(0, project_root)
+
+# 每个模块在独立的新进程中导入, 耗时包含其依赖(如 numpy)
+IMPORT_MODULES = [
+    "numpy",
+    "libsensevoiceOne.model",
+    "kaldi_native_fbank",
+    "soundfile",
+    "yaml",
+    "sentencepiece",
+    "onnxruntime",
+    "PyQt5.QtWidgets",
+    "pyaudio",
+]
+
+_IMPORT_CODE = (
+    "import time, sys\n"
+    "sys.path.insert(0, {root!r})\n"
+    "t = time.perf_counter()\n"
+    "import {module}\n"
+    "print(time.perf_counter() - t)\n"
+)
+
+
+def measure_import(module: str) -> float:
+    """在新的解释器中导入 module, 返回导入耗时(秒); 未安装时返回 None"""
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    proc = subprocess.run(
+        [sys.executable, "-c", _IMPORT_CODE.format(root=root, module=module)],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        return None
+    return float(proc.stdout.strip().splitlines()[-1])
+
+
+def measure_model_load(**load_kwargs) -> dict:
+    """在当前进程中加载模型, 返回各阶段耗时(秒)"""
+    start = time.perf_counter()
+    from libsensevoiceOne.model import SenseVoiceOne
+    times = {"import libsensevoiceOne.model": time.perf_counter() - start}
+    model = SenseVoiceOne()
+    start = time.perf_counter()
+    model.load_model(**load_kwargs)
+    times["load_model (total)"] = time.perf_counter() - start
+    for name, seconds in model.load_times.items():
+        times[f"  {name}"] = seconds
+    return times
+
+
+def print_table(title: str, rows: dict) -> None:
+    print(f"\n{title}")
+    print("-" * 48)
+    for name, seconds in rows.items():
+        value = "not installed" if seconds is None else f"{seconds * 1000:9.1f} ms"
+        print(f"{name:<34}{value:>14}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="PowerTrans cold start report")
+    parser.add_argument("--model-file", default="sense-voice-encoder-int8.onnx")
+    parser.add_argument("--model-dir", default="./resources/SenseVoice")
+    parser.add_argument("--no-vad", action="store_true", help="do not load the VAD model")
+    parser.add_argument("--skip-model", action="store_true", help="only report import times")
+    parser.add_argument("--budget", type=float, default=None,
+                        help="fail (exit 1) if import + model load exceeds this many seconds")
+    args = parser.parse_args(argv)
+
+    imports = {name: measure_import(name) for name in IMPORT_MODULES}
+    print_table("Import time (fresh interpreter, incl. dependencies)", imports)
+
+    total = imports["libsensevoiceOne.model"] or 0.0
+    if not args.skip_model:
+        loads = measure_model_load(
+            senseVoice_model_file=args.model_file,
+            senseVoice_model_dir=args.model_dir,
+            is_vad=not args.no_vad,
+        )
+        print_table("Model load", loads)
+        total = loads["import libsensevoiceOne.model"] + loads["load_model (total)"]
+
+    print(f"\ncold start total: {total:.3f} s")
+    if args.budget is not None and total > args.budget:
+        print(f"over budget: {total:.3f} s > {args.budget:.3f} s")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+# =========================================
+# -*- coding: utf-8 -*-
+# Project     : SenseVoiceOne
+# Module      : thread_budget.py
+# Author      : KyleWang[kylewang1977@gmail.com]
+# Time        : 2026-10-17 19:20
+# Version     : 1.0.0
+# Last Updated:
+# Description : 进程级的线程预算。按可用核数为 录音线程、界面线程 与 ASR/VAD 推理线程池 分配 CPU,
+#               避免超额订阅(4 核的 Pi 5 上 n_threads=4 + VAD 默认线程池 + 录音 + Qt 会抢占录音线程,
+#               导致录音溢出、字幕卡顿)。
+#                   budget = ThreadBudget(pin=True)
+#                   model.load_model(thread_budget=budget)
+#                   recorder.run(..., cpu_affinity=budget.capture_cores)
+#               调用 transcribe() 的线程也参与 intra-op 计算, 需要 budget.pin_inference_thread()。
+#               budget.plan() 返回选择的方案。
+# =========================================
+import logging
+import os
+
+
+def available_cores() -> list:
+    """当前进程允许使用的 CPU 编号"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def pin_current_thread(cores) -> bool:
+    """
+    把调用线程绑定到 cores(Linux 上 sched_setaffinity(0) 只作用于调用线程)。
+    平台不支持时返回 False, 不报错。
+    """
+    if not cores or not hasattr(os, "sched_setaffinity"):
+        return False
+    try:
+        os.sched_setaffinity(0, set(cores))
+        return True
+    except OSError as e:
+        logging.warning(f"CPU 绑定失败 {cores}: {e}")
+        return False
+
+
+def intra_op_affinities(cores, threads: int) -> str:
+    """
+    ORT "session.intra_op_thread_affinities" for an intra-op pool of `threads` threads:
+    one core per pool thread, cores[1:threads]. The first "thread" is the caller of run(),
+    which is pinned separately. ORT processor ids start from 1.
+    Return: e.g. "2;3;4", None when there is no pool thread to bind.
+    """
+    if threads is None or threads <= 1 or len(cores) < threads:
+        return None
+    return ";".join(str(core + 1) for core in cores[1:threads])
+
+
+class ThreadBudget:
+    """
+    Split the available cores between the capture thread and the inference pools.
+
+    Parameters
+    ----------
+    cores : list
+        CPU ids to plan for, default: the process affinity.
+    capture_cores : int
+        cores reserved for the capture (and UI) threads; the inference pools get the rest.
+        Ignored when only one core is available.
+    vad_threads : int
+        intra-op threads of the VAD session. The VAD and ASR sessions run one after the
+        other, so they share the inference cores.
+    pin : bool
+        bind the capture thread to the reserved cores and each ORT intra-op pool thread to
+        one inference core (SessionOptions "session.intra_op_thread_affinities"). The thread
+        calling transcribe() runs part of the work itself and is pinned with
+        pin_inference_thread().
+    """
+
+    def __init__(
+        self,
+        cores: list = None,
+        capture_cores: int = 1,
+        vad_threads: int = 1,
+        pin: bool = False,
+    ) -> None:
+        self.cores = list(cores) if cores else available_cores()
+        reserved = capture_cores if len(self.cores) > capture_cores else 0
+        self.capture_cores = self.cores[:reserved]
+        self.inference_cores = self.cores[reserved:]
+        self.asr_threads = len(self.inference_cores)
+        self.vad_threads = max(1, min(vad_threads, self.asr_threads))
+        self.pin = pin
+
+    def plan(self) -> dict:
+        return {
+            "cores": self.cores,
+            "capture_cores": self.capture_cores,
+            "inference_cores": self.inference_cores,
+            "asr_intra_op_threads": self.asr_threads,
+            "vad_intra_op_threads": self.vad_threads,
+            "inter_op_threads": 1,
+            "pin": self.pin,
+        }
+
+    def profile(self, base=None) -> dict:
+        """session profile (see session_profiles) with this plan's thread settings"""
+        from libsensevoiceOne.onnx.session_profiles import get_profile
+
+        profile = get_profile(base)
+        profile.update({
+            "intra_op_num_threads": self.asr_threads,
+            "inter_op_num_threads": 1,
+            "execution_mode": "sequential",
+            "vad_intra_op_num_threads": self.vad_threads,
+        })
+        if self.pin:
+            profile["intra_op_thread_affinities"] = intra_op_affinities(self.inference_cores, self.asr_threads)
+            profile["vad_intra_op_thread_affinities"] = intra_op_affinities(self.inference_cores, self.vad_threads)
+        return profile
+
+    def pin_capture_thread(self) -> bool:
+        """在录音线程中调用"""
+        return self.pin and pin_current_thread(self.capture_cores)
+
+    def pin_inference_thread(self) -> bool:
+        """
+        在调用 transcribe() 的线程中调用(该线程也参与 intra-op 计算),
+        例如作为推理线程池的 initializer。
+        """
+        return self.pin and pin_current_thread(self.inference_cores)
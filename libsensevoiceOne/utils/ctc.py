@@ -0,0 +1,123 @@
+# =========================================
+# -*- coding: utf-8 -*-
+# Project     : SenseVoiceOne
+# Module      : ctc.py
+# Author      : KyleWang[kylewang1977@gmail.com]
+# Time        : 2026-10-17 16:50
+# Version     : 1.0.0
+# Last Updated:
+# Description : 向量化的批量 CTC 贪心解码。
+#               输入编码器每帧的 token id (B, T) 与有效长度, 合并连续重复、去掉 blank,
+#               返回每个 token 的起止帧号, 并按 LFR 帧率(6 x 10ms = 60ms)换算为秒。
+#               前 4 帧是提示(语言/事件/情感/ITN)的输出, 计算时间时减去。
+# =========================================
+import numpy as np
+
+# LFR(7/6) 后每帧对应 6 个 10ms 的 fbank 帧
+LFR_FRAME_SHIFT = 0.06
+PROMPT_FRAMES = 4
+
+
+def ctc_collapse(token_ids: np.ndarray, lengths=None, blank_id: int = 0) -> list:
+    """
+    Greedy CTC collapse of a batch, without Python loops over frames.
+
+    token_ids: int (B, T) (or (T,)) per-frame argmax ids
+    lengths: valid frames per row, default T
+    Return: list of B tuples (ids, start, end), int64 arrays; frames [start, end) of each token
+    """
+    token_ids = np.asarray(token_ids)
+    if token_ids.ndim == 1:
+        token_ids = token_ids[None, :]
+    batch, frames = token_ids.shape
+    if lengths is None:
+        lengths = np.full(batch, frames)
+    lengths = np.minimum(np.asarray(lengths, dtype=np.int64).reshape(-1), frames)
+    if frames == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return [(empty, empty, empty) for _ in range(batch)]
+
+    # 无效帧(补齐部分)置为 -1, 自成一段, 不会与有效 token 合并
+    ids = np.where(np.arange(frames)[None, :] < lengths[:, None], token_ids, -1).astype(np.int64)
+    flat = ids.reshape(-1)
+    change = np.ones(flat.shape[0], dtype=bool)
+    change[1:] = flat[1:] != flat[:-1]
+    change[::frames] = True     # 每行从新的一段开始
+    run_starts = np.flatnonzero(change)
+    run_ends = np.append(run_starts[1:], flat.shape[0])
+    run_ids = flat[run_starts]
+
+    keep = (run_ids != blank_id) & (run_ids >= 0)
+    run_starts, run_ends, run_ids = run_starts[keep], run_ends[keep], run_ids[keep]
+    rows = run_starts // frames
+    starts = run_starts - rows * frames
+    ends = run_ends - rows * frames
+    bounds = np.searchsorted(rows, np.arange(batch + 1))
+    return [
+        (run_ids[bounds[b]:bounds[b + 1]], starts[bounds[b]:bounds[b + 1]], ends[bounds[b]:bounds[b + 1]])
+        for b in range(batch)
+    ]
+
+
+class CTCGreedyDecoder:
+    """
+    Batched CTC greedy decoder on top of a sentencepiece model.
+    decode() returns the texts; decode(..., with_timestamps=True) returns for each row
+    {"text": str, "tokens": [{"token": piece, "id": id, "frames": [s, e], "times": [s_sec, e_sec]}]}.
+    """
+
+    def __init__(
+        self,
+        sp,
+        blank_id: int = 0,
+        prompt_frames: int = PROMPT_FRAMES,
+        frame_shift: float = LFR_FRAME_SHIFT,
+    ) -> None:
+        self.sp = sp
+        self.blank_id = blank_id
+        self.prompt_frames = prompt_frames
+        self.frame_shift = frame_shift
+
+    def frames_to_seconds(self, frames: np.ndarray) -> np.ndarray:
+        """编码器输出帧号 -> 语音内的时间(秒), 提示帧对应 0"""
+        return np.maximum(np.asarray(frames) - self.prompt_frames, 0) * self.frame_shift
+
+    def decode(self, token_ids: np.ndarray, lengths=None, with_timestamps: bool = False) -> list:
+        collapsed = ctc_collapse(token_ids, lengths, self.blank_id)
+        return self.decode_collapsed(collapsed, with_timestamps)
+
+    def decode_collapsed(self, collapsed: list, with_timestamps: bool = False) -> list:
+        """collapsed: list of (ids, start, end) as returned by ctc_collapse"""
+        texts = self.sp.decode([ids.tolist() for ids, _, _ in collapsed])
+        if not with_timestamps:
+            return texts
+        results = []
+        for text, (ids, starts, ends) in zip(texts, collapsed):
+            pieces = self.sp.id_to_piece(ids.tolist())
+            start_s = self.frames_to_seconds(starts).round(3).tolist()
+            end_s = self.frames_to_seconds(ends).round(3).tolist()
+            results.append({
+                "text": text,
+                "tokens": [
+                    {"token": piece, "id": tid, "frames": [s, e], "times": [ss, es]}
+                    for piece, tid, s, e, ss, es in zip(
+                        pieces, ids.tolist(), starts.tolist(), ends.tolist(), start_s, end_s)
+                ],
+            })
+        return results
+
+
+def stitch_cut(prev_ids: np.ndarray, cur_ids: np.ndarray, blank_id: int = 0) -> int:
+    """
+    Choose where to cut the overlap of two consecutive windows.
+    prev_ids / cur_ids: per-frame ids of the two windows over the same overlap frames.
+    Return: offset into the overlap. Preferably a frame that both windows align to blank,
+    closest to the middle of the overlap, so no token of either window crosses the cut;
+    otherwise the middle itself.
+    """
+    n = min(prev_ids.shape[0], cur_ids.shape[0])
+    mid = n // 2
+    both_blank = np.flatnonzero((prev_ids[:n] == blank_id) & (cur_ids[:n] == blank_id))
+    if both_blank.shape[0] == 0:
+        return mid
+    return int(both_blank[np.argmin(np.abs(both_blank - mid))])
@@ -3,12 +3,20 @@
 # @Time      :2024/7/18 09:39
 # @Author    :lovemefan
 # @Email     :lovemefan@outlook.com
+import glob
+import hashlib
+import os
 from typing import Tuple, Union
 import kaldi_native_fbank as knf
 import numpy as np
-import soundfile as sf
 import logging
 
+from libsensevoiceOne.utils.fbank import NumpyFbank
+
+# fbank 计算后端: "kaldi" 为 kaldi_native_fbank(默认, 与原结果一致);
+# "numpy" 为向量化实现(批量, 快), 与 kaldi 的 log-mel 绝对误差 < 2e-3, 需显式选用
+FBANK_BACKENDS = ("kaldi", "numpy")
+
 
 class WavFrontend:
     """Conventional frontend structure for ASR."""
@@ -24,8 +32,14 @@ class WavFrontend:
         lfr_m: int = 7,
         lfr_n: int = 6,
         dither: float = 0,
+        fbank_backend: str = "kaldi",
         **kwargs,
     ) -> None:
+        if fbank_backend not in FBANK_BACKENDS:
+            raise ValueError(f"fbank_backend 只能是 {FBANK_BACKENDS}, 实际是: {fbank_backend}")
+        if fbank_backend == "numpy" and dither != 0:
+            logging.warning("numpy fbank 不支持 dither, 改用 kaldi 后端")
+            fbank_backend = "kaldi"
         opts = knf.FbankOptions()
         opts.frame_opts.samp_freq = fs
         opts.frame_opts.dither = dither
@@ -37,6 +51,12 @@ class WavFrontend:
         opts.frame_opts.snip_edges = True
         opts.mel_opts.debug_mel = False
         self.opts = opts
+        self.frame_length_samples = int(fs * frame_length / 1000)
+        self.frame_shift_samples = int(fs * frame_shift / 1000)
+        self.fbank_backend = fbank_backend
+        self.np_fbank = None
+        if fbank_backend == "numpy":
+            self.np_fbank = NumpyFbank(fs, window, n_mels, frame_length, frame_shift)
 
         self.lfr_m = lfr_m
         self.lfr_n = lfr_n
@@ -49,44 +69,169 @@ class WavFrontend:
         self.reset_status()
 
     def reset_status(self):
+        """重置流式(accept_waveform/pop_features)状态"""
         self.fbank_fn = knf.OnlineFbank(self.opts)
         self.fbank_beg_idx = 0
+        self.wav_remain = np.zeros(0, dtype=np.float32)  # 不足一帧、尚未计算 fbank 的采样点
+        self.lfr_buf = None     # 左侧已补齐的 fbank 缓存, 行号从 lfr_buf_beg 开始(padded 坐标)
+        self.lfr_buf_beg = 0
+        self.lfr_out_idx = 0    # 下一个待输出的 LFR 帧序号
+        self.fbank_frames = 0   # 已计算的 fbank 总帧数
+
+    def accept_waveform(self, waveform: np.ndarray) -> int:
+        """
+        流式输入一段音频(float32 [-1, 1] 或 int16), 计算所有完整帧的 fbank 并缓存。
+        fbank 状态、不足一帧的余量和 LFR 左侧上下文都会跨调用保留。
+
+        Return: 本次新增的 fbank 帧数
+        """
+        if self.np_fbank is not None:
+            if waveform.dtype == np.int16:
+                waveform = waveform.astype(np.float32) / (1 << 15)
+            buf = np.concatenate((self.wav_remain, np.asarray(waveform, dtype=np.float32)))
+            feat = self.np_fbank(buf)
+            frames = feat.shape[0]
+            self.wav_remain = buf[frames * self.np_fbank.frame_shift :]
+        else:
+            if waveform.dtype == np.int16:
+                waveform = waveform.astype(np.float32)
+            else:
+                waveform = waveform * (1 << 15)
+            self.fbank_fn.accept_waveform(self.opts.frame_opts.samp_freq, waveform)
+            frames = self.fbank_fn.num_frames_ready - self.fbank_beg_idx
+            feat = np.empty([frames, self.opts.mel_opts.num_bins], dtype=np.float32)
+            for i in range(frames):
+                feat[i, :] = self.fbank_fn.get_frame(self.fbank_beg_idx + i)
+            self.fbank_fn.pop(frames)
+            self.fbank_beg_idx += frames
+
+        if frames > 0:
+            if self.lfr_buf is None:
+                # 第一帧: 左侧补 (lfr_m-1)//2 个首帧, 与 apply_lfr 一致
+                left = np.repeat(feat[:1], (self.lfr_m - 1) // 2, axis=0)
+                self.lfr_buf = np.concatenate((left, feat))
+            else:
+                self.lfr_buf = np.concatenate((self.lfr_buf, feat))
+            self.fbank_frames += frames
+        return frames
+
+    def pop_features(self, is_final: bool = False) -> np.ndarray:
+        """
+        取出所有已完整的 LFR+CMVN 特征帧。拼接后与离线 get_features 的结果一致。
+
+        is_final: 输入结束。按 apply_lfr 的方式用最后一帧补齐右侧, 输出剩余帧, 并重置状态。
+        Return: float32 ndarray, shape (frames, lfr_m * n_mels)
+        """
+        dim = self.opts.mel_opts.num_bins * self.lfr_m
+        if self.lfr_buf is None:
+            if is_final:
+                self.reset_status()
+            return np.zeros((0, dim), dtype=np.float32)
+
+        buf = self.lfr_buf
+        buf_end = self.lfr_buf_beg + buf.shape[0]  # padded 坐标下的缓存末尾
+        if is_final:
+            T_lfr = int(np.ceil(self.fbank_frames / self.lfr_n))
+            right = max(0, (T_lfr - 1) * self.lfr_n + self.lfr_m - buf_end)
+            buf = np.pad(buf, ((0, right), (0, 0)), mode="edge")
+        else:
+            T_lfr = max(0, (buf_end - self.lfr_m) // self.lfr_n + 1)
+        num = max(0, T_lfr - self.lfr_out_idx)
+        offset = self.lfr_out_idx * self.lfr_n - self.lfr_buf_beg
+        feats = self._lfr_view(buf[offset:], num, self.lfr_m, self.lfr_n).astype(np.float32)
+        if self.cmvn_file:
+            feats = self.apply_cmvn(feats, inplace=True)
+
+        if is_final:
+            self.reset_status()
+        else:
+            self.lfr_out_idx += num
+            drop = min(self.lfr_out_idx * self.lfr_n - self.lfr_buf_beg, self.lfr_buf.shape[0])
+            self.lfr_buf = self.lfr_buf[drop:]
+            self.lfr_buf_beg += drop
+        return feats
 
     def fbank(self, waveform: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        waveform: float32 [-1, 1] 或 int16 的 1-D ndarray.
+        Return: (feat: float32 (frames, n_mels), feat_len)
+        """
+        if self.np_fbank is not None:
+            feat = self.np_fbank(waveform)
+            return feat, np.array(feat.shape[0]).astype(np.int32)
+
         # 波形数据预处理：
         # 将波形数据乘以 2^15，这是为了将其转换为 16 位整数的范围
-        # （通常音频数据是浮点数，范围在 -1 到 1 之间）
-        waveform = waveform * (1 << 15) # 放大音频信号到16位整数范围
+        # （通常音频数据是浮点数，范围在 -1 到 1 之间）; int16 数据保持不变
+        if waveform.dtype == np.int16:
+            waveform = waveform.astype(np.float32)
+        else:
+            waveform = waveform * (1 << 15) # 放大音频信号到16位整数范围
         
         # 初始化：创建 OnlineFbank 实例，
         # 使用 self.opts 中存储的配置选项来初始化。
         # 配置选项中通常包含采样率、帧参数（如帧长、帧移）以及 
         #   Mel 滤波器的数量。
-        self.fbank_fn = knf.OnlineFbank(self.opts) # 初始化 OnlineFbank 实例
+        # 离线计算使用局部实例, 不影响流式接口(accept_waveform)的 self.fbank_fn 状态
+        fbank_fn = knf.OnlineFbank(self.opts) # 初始化 OnlineFbank 实例
         
-        # 接受波形数据：调用 accept_waveform 方法，
-        # 将音频数据传入 OnlineFbank。
+        # 接受波形数据：调用 accept_waveform 方法，直接传入 ndarray(不再 tolist)。
         # 此方法会将音频波形转换为 Mel 频谱特征并存储在内部缓冲区中。
-        self.fbank_fn.accept_waveform(self.opts.frame_opts.samp_freq, waveform.tolist())
-        frames = self.fbank_fn.num_frames_ready # 获取帧数
-        mat = np.empty([frames, self.opts.mel_opts.num_bins]) # 创建存储Mel频谱特征的矩阵
+        fbank_fn.accept_waveform(self.opts.frame_opts.samp_freq, waveform)
+        frames = fbank_fn.num_frames_ready # 获取帧数
+        feat = np.empty([frames, self.opts.mel_opts.num_bins], dtype=np.float32)
         for i in range(frames): # 遍历每一帧，提取 Mel 频谱
-            mat[i, :] = self.fbank_fn.get_frame(i)
-        feat = mat.astype(np.float32) # 转换为 float32 类型
-        feat_len = np.array(mat.shape[0]).astype(np.int32)
+            feat[i, :] = fbank_fn.get_frame(i)
+        feat_len = np.array(feat.shape[0]).astype(np.int32)
         return feat, feat_len
 
+    def same_fbank(self, other: "WavFrontend") -> bool:
+        """两个前端的 fbank 配置(采样率、窗、帧长、帧移、mel 数、后端)是否完全一致"""
+        a, b = self.opts, other.opts
+        return (
+            self.fbank_backend == other.fbank_backend
+            and a.frame_opts.samp_freq == b.frame_opts.samp_freq
+            and a.frame_opts.window_type == b.frame_opts.window_type
+            and a.frame_opts.frame_length_ms == b.frame_opts.frame_length_ms
+            and a.frame_opts.frame_shift_ms == b.frame_opts.frame_shift_ms
+            and a.frame_opts.dither == 0 and b.frame_opts.dither == 0
+            and a.mel_opts.num_bins == b.mel_opts.num_bins
+        )
+
+    def slice_fbank(
+        self, fbank: np.ndarray, beg_sample: int, end_sample: int, num_samples: int
+    ) -> Union[np.ndarray, None]:
+        """
+        从整段音频的 fbank 中取出 waveform[beg_sample:end_sample] 对应的帧(视图, 不复制)。
+        每帧只依赖自身的采样点, 所以结果与对该片段重新计算 fbank 一致。
+
+        Return: None if beg_sample is not aligned to the frame shift.
+        """
+        if beg_sample % self.frame_shift_samples != 0:
+            return None
+        end_sample = min(end_sample, num_samples)
+        span = end_sample - beg_sample
+        if span < self.frame_length_samples:
+            frames = 0
+        else:
+            frames = 1 + (span - self.frame_length_samples) // self.frame_shift_samples
+        beg_frame = beg_sample // self.frame_shift_samples
+        return fbank[beg_frame : beg_frame + frames]
+
     def lfr_cmvn(self, feat: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        original = feat
         if self.lfr_m != 1 or self.lfr_n != 1:
             feat = self.apply_lfr(feat, self.lfr_m, self.lfr_n)
 
         if self.cmvn_file:
-            feat = self.apply_cmvn(feat)
+            # 只在 apply_lfr 返回了新矩阵时原地归一化; lfr_m == lfr_n == 1 时 feat 仍是调用方的数组, 不能改写
+            feat = self.apply_cmvn(feat, inplace=feat is not original and feat.dtype == np.float32)
 
         feat_len = np.array(feat.shape[0]).astype(np.int32)
         return feat, feat_len
 
     def load_audio(self, filename: str) -> Tuple[np.ndarray, int]:
+        import soundfile as sf
         data, sample_rate = sf.read(
             filename,
             always_2d=True,
@@ -103,37 +248,46 @@ class WavFrontend:
 
     @staticmethod
     def apply_lfr(inputs: np.ndarray, lfr_m: int, lfr_n: int) -> np.ndarray:
-        LFR_inputs = []
+        """
+        Low frame rate: stack `lfr_m` frames every `lfr_n` frames.
 
+        The input is edge-padded once ((lfr_m-1)//2 copies of the first frame on
+        the left, copies of the last frame on the right), then every LFR frame is
+        a row of a strided view over the padded matrix. Only the final float32
+        cast copies data.
+        """
         T = inputs.shape[0]
         T_lfr = int(np.ceil(T / lfr_n))
-        left_padding = np.tile(inputs[0], ((lfr_m - 1) // 2, 1))
-        inputs = np.vstack((left_padding, inputs))
-        T = T + (lfr_m - 1) // 2
-        for i in range(T_lfr):
-            if lfr_m <= T - i * lfr_n:
-                LFR_inputs.append(
-                    (inputs[i * lfr_n : i * lfr_n + lfr_m]).reshape(1, -1)
-                )
-            else:
-                # process last LFR frame
-                num_padding = lfr_m - (T - i * lfr_n)
-                frame = inputs[i * lfr_n :].reshape(-1)
-                for _ in range(num_padding):
-                    frame = np.hstack((frame, inputs[-1]))
-
-                LFR_inputs.append(frame)
-        LFR_outputs = np.vstack(LFR_inputs).astype(np.float32)
+        left = (lfr_m - 1) // 2
+        right = max(0, (T_lfr - 1) * lfr_n + lfr_m - (T + left))
+        padded = np.pad(inputs, ((left, right), (0, 0)), mode="edge")
+        LFR_outputs = WavFrontend._lfr_view(padded, T_lfr, lfr_m, lfr_n).astype(np.float32)
         return LFR_outputs
 
-    def apply_cmvn(self, inputs: np.ndarray) -> np.ndarray:
+    @staticmethod
+    def _lfr_view(padded: np.ndarray, T_lfr: int, lfr_m: int, lfr_n: int) -> np.ndarray:
+        """只读的 LFR 视图: 第 i 行是 padded[i*lfr_n : i*lfr_n+lfr_m] 展平, 不复制数据"""
+        padded = np.ascontiguousarray(padded)
+        row_stride, item_stride = padded.strides
+        return np.lib.stride_tricks.as_strided(
+            padded,
+            shape=(T_lfr, lfr_m * padded.shape[1]),
+            strides=(lfr_n * row_stride, item_stride),
+            writeable=False,
+        )
+
+    def apply_cmvn(self, inputs: np.ndarray, inplace: bool = False) -> np.ndarray:
         """
-        Apply CMVN with mvn data
+        Apply CMVN with mvn data. float32 broadcasting, no tiled matrices.
+
+        inplace: normalize `inputs` in place (it must be a writable float32 array),
+                 e.g. the fresh matrix returned by apply_lfr.
         """
-        frame, dim = inputs.shape
-        means = np.tile(self.cmvn[0:1, :dim], (frame, 1))
-        vars = np.tile(self.cmvn[1:2, :dim], (frame, 1))
-        inputs = (inputs + means) * vars
+        dim = inputs.shape[1]
+        if not inplace:
+            inputs = inputs.astype(np.float32)
+        inputs += self.cmvn[0, :dim]
+        inputs *= self.cmvn[1, :dim]
         return inputs
 
     def get_features(self, inputs: Union[str, np.ndarray]) -> Tuple[np.ndarray, int]:
@@ -141,19 +295,53 @@ class WavFrontend:
         if isinstance(inputs, str):
             inputs, _ = self.load_audio(inputs)
         fbank, _ = self.fbank(inputs)
-        feats = self.apply_cmvn(self.apply_lfr(fbank, self.lfr_m, self.lfr_n))
+        feats, _ = self.lfr_cmvn(fbank)
         return feats
 
     def load_cmvn(
         self,
     ) -> np.ndarray:
-        with open(self.cmvn_file, "r", encoding="utf-8") as f:
-            lines = f.readlines()
+        """
+        Load the Kaldi-text cmvn file as a float32 (2, dim) array [means; vars].
+
+        The parsed result is cached in a `.npy` sidecar next to the source
+        (`<cmvn_file>.<mtime>-<md5>.npy`), so later starts skip text parsing.
+        A changed mtime or content gives a new key and the stale sidecar is replaced.
+        """
+        cmvn_file = str(self.cmvn_file)
+        with open(cmvn_file, "rb") as f:
+            content = f.read()
+        key = "{:x}-{}".format(
+            os.stat(cmvn_file).st_mtime_ns, hashlib.md5(content).hexdigest()[:16])
+        cache_file = f"{cmvn_file}.{key}.npy"
+        if os.path.exists(cache_file):
+            try:
+                return np.load(cache_file)
+            except (OSError, ValueError) as e:
+                logging.warning(f"cmvn 缓存文件 {cache_file} 读取失败, 重新解析: {e}")
+
+        cmvn = self.parse_cmvn(content.decode("utf-8"))
+        try:
+            for stale in glob.glob(glob.escape(cmvn_file) + ".*.npy"):
+                os.remove(stale)
+            tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, "wb") as f:
+                np.save(f, cmvn)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            logging.debug(f"cmvn 缓存文件 {cache_file} 写入失败: {e}")
+        return cmvn
+
+    @staticmethod
+    def parse_cmvn(text: str) -> np.ndarray:
+        lines = text.splitlines()
 
         means_list = []
         vars_list = []
         for i in range(len(lines)):
             line_item = lines[i].split()
+            if not line_item:
+                continue
             if line_item[0] == "<AddShift>":
                 line_item = lines[i + 1].split()
                 if line_item[0] == "<LearnRateCoef>":
@@ -167,7 +355,7 @@ class WavFrontend:
                     vars_list = list(rescale_line)
                     continue
 
-        means = np.array(means_list).astype(np.float64)
-        vars = np.array(vars_list).astype(np.float64)
+        means = np.array(means_list).astype(np.float32)
+        vars = np.array(vars_list).astype(np.float32)
         cmvn = np.array([means, vars])
         return cmvn
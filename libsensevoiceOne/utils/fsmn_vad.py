@@ -3,6 +3,7 @@
 # @Time      :2024/8/31 16:50
 # @Author    :lovemefan
 # @Email     :lovemefan@outlook.com
+import bisect
 import logging
 import math
 import os
@@ -11,8 +12,6 @@ from pathlib import Path
 from typing import Any, Dict, List, Tuple, Union
 
 import numpy as np
-import soundfile as sf
-import yaml
 
 from libsensevoiceOne.onnx.fsmn_vad_ort_session import VadOrtInferRuntimeSession
 from libsensevoiceOne.utils.frontend import WavFrontend
@@ -22,6 +21,7 @@ def read_yaml(yaml_path: Union[str, Path]) -> Dict:
     if not Path(yaml_path).exists():
         raise FileExistsError(f"The {yaml_path} does not exist.")
 
+    import yaml
     with open(str(yaml_path), "rb") as f:
         data = yaml.load(f, Loader=yaml.Loader)
     return data
@@ -54,11 +54,32 @@ class VadDetectMode(Enum):
     kVadMutipleUtteranceDetectMode = 1
 
 
+# 状态机内部使用的整数编码(取值与上面各 Enum 的 value 相同), 避免逐帧比较 Enum 成员
+FRAME_INVALID = FrameState.kFrameStateInvalid.value
+FRAME_SIL = FrameState.kFrameStateSil.value
+FRAME_SPEECH = FrameState.kFrameStateSpeech.value
+CHANGE_SPEECH2SPEECH = AudioChangeState.kChangeStateSpeech2Speech.value
+CHANGE_SPEECH2SIL = AudioChangeState.kChangeStateSpeech2Sil.value
+CHANGE_SIL2SIL = AudioChangeState.kChangeStateSil2Sil.value
+CHANGE_SIL2SPEECH = AudioChangeState.kChangeStateSil2Speech.value
+CHANGE_INVALID = AudioChangeState.kChangeStateInvalid.value
+STATE_START_NOT_DETECTED = VadStateMachine.kVadInStateStartPointNotDetected.value
+STATE_IN_SPEECH = VadStateMachine.kVadInStateInSpeechSegment.value
+STATE_END_DETECTED = VadStateMachine.kVadInStateEndPointDetected.value
+SINGLE_UTTERANCE_MODE = VadDetectMode.kVadSingleUtteranceDetectMode.value
+MULTIPLE_UTTERANCE_MODE = VadDetectMode.kVadMutipleUtteranceDetectMode.value
+
+_FRAME_STATES = {
+    FRAME_SIL: FrameState.kFrameStateSil,
+    FRAME_SPEECH: FrameState.kFrameStateSpeech,
+}
+
+
 class VADXOptions:
     def __init__(
         self,
         sample_rate: int = 16000,
-        detect_mode: int = VadDetectMode.kVadMutipleUtteranceDetectMode.value,
+        detect_mode: int = MULTIPLE_UTTERANCE_MODE,
         snr_mode: int = 0,
         max_end_silence_time: int = 800,
         max_start_silence_time: int = 3000,
@@ -146,6 +167,13 @@ class E2EVadFrameProb(object):
 
 
 class WindowDetector(object):
+    """
+    Sliding window of the last win_size_frame frame states (0 silence / 1 speech) with
+    hysteresis: silence -> speech when the window sum reaches sil_to_speech_frmcnt_thres,
+    speech -> silence when it falls to speech_to_sil_frmcnt_thres. States and returned
+    changes are the integer codes FRAME_* / CHANGE_*.
+    """
+
     def __init__(
         self,
         window_size_ms: int,
@@ -163,8 +191,8 @@ class WindowDetector(object):
         self.win_state = [0] * self.win_size_frame  # 初始化窗
 
         self.cur_win_pos = 0
-        self.pre_frame_state = FrameState.kFrameStateSil
-        self.cur_frame_state = FrameState.kFrameStateSil
+        self.pre_frame_state = FRAME_SIL
+        self.cur_frame_state = FRAME_SIL
         self.sil_to_speech_frmcnt_thres = int(sil_to_speech_time / frame_size_ms)
         self.speech_to_sil_frmcnt_thres = int(speech_to_sil_time / frame_size_ms)
 
@@ -176,8 +204,8 @@ class WindowDetector(object):
         self.cur_win_pos = 0
         self.win_sum = 0
         self.win_state = [0] * self.win_size_frame
-        self.pre_frame_state = FrameState.kFrameStateSil
-        self.cur_frame_state = FrameState.kFrameStateSil
+        self.pre_frame_state = FRAME_SIL
+        self.cur_frame_state = FRAME_SIL
         self.voice_last_frame_count = 0
         self.noise_last_frame_count = 0
         self.hydre_frame_count = 0
@@ -185,56 +213,68 @@ class WindowDetector(object):
     def get_win_size(self) -> int:
         return int(self.win_size_frame)
 
-    def detect_one_frame(
-        self, frameState: FrameState, frame_count: int
-    ) -> AudioChangeState:
-        cur_frame_state = FrameState.kFrameStateSil
-        if frameState == FrameState.kFrameStateSpeech:
-            cur_frame_state = 1
-        elif frameState == FrameState.kFrameStateSil:
-            cur_frame_state = 0
-        else:
-            return AudioChangeState.kChangeStateInvalid
+    def detect_one_frame(self, frameState: int, frame_count: int) -> int:
+        cur_frame_state = getattr(frameState, "value", frameState)
+        if cur_frame_state != FRAME_SPEECH and cur_frame_state != FRAME_SIL:
+            return CHANGE_INVALID
         self.win_sum -= self.win_state[self.cur_win_pos]
         self.win_sum += cur_frame_state
         self.win_state[self.cur_win_pos] = cur_frame_state
         self.cur_win_pos = (self.cur_win_pos + 1) % self.win_size_frame
-
-        if (
-            self.pre_frame_state == FrameState.kFrameStateSil
-            and self.win_sum >= self.sil_to_speech_frmcnt_thres
-        ):
-            self.pre_frame_state = FrameState.kFrameStateSpeech
-            return AudioChangeState.kChangeStateSil2Speech
-
-        if (
-            self.pre_frame_state == FrameState.kFrameStateSpeech
-            and self.win_sum <= self.speech_to_sil_frmcnt_thres
-        ):
-            self.pre_frame_state = FrameState.kFrameStateSil
-            return AudioChangeState.kChangeStateSpeech2Sil
-
-        if self.pre_frame_state == FrameState.kFrameStateSil:
-            return AudioChangeState.kChangeStateSil2Sil
-        if self.pre_frame_state == FrameState.kFrameStateSpeech:
-            return AudioChangeState.kChangeStateSpeech2Speech
-        return AudioChangeState.kChangeStateInvalid
+        return self._hysteresis(self.win_sum)
+
+    def _hysteresis(self, win_sum: int) -> int:
+        if self.pre_frame_state == FRAME_SIL:
+            if win_sum >= self.sil_to_speech_frmcnt_thres:
+                self.pre_frame_state = FRAME_SPEECH
+                return CHANGE_SIL2SPEECH
+            return CHANGE_SIL2SIL
+        if win_sum <= self.speech_to_sil_frmcnt_thres:
+            self.pre_frame_state = FRAME_SIL
+            return CHANGE_SPEECH2SIL
+        return CHANGE_SPEECH2SPEECH
+
+    def detect_frames(self, states: np.ndarray) -> List[int]:
+        """
+        detect_one_frame() for a block of states (0/1) at once: the window sums of all
+        frames come from one cumulative sum over the window history followed by the block.
+        Return: change code of every frame.
+        """
+        size = self.win_size_frame
+        history = self.win_state[self.cur_win_pos :] + self.win_state[: self.cur_win_pos]
+        seq = np.concatenate((np.asarray(history, dtype=np.int64), np.asarray(states, dtype=np.int64)))
+        csum = np.concatenate(([0], np.cumsum(seq)))
+        win_sums = (csum[size + 1 :] - csum[1 : seq.shape[0] - size + 1]).tolist()
+        # 窗口按时间顺序保存, 下一帧覆盖最早的一帧
+        self.win_state = seq[seq.shape[0] - size :].tolist()
+        self.cur_win_pos = 0
+        self.win_sum = win_sums[-1] if win_sums else self.win_sum
+        hysteresis = self._hysteresis
+        return [hysteresis(win_sum) for win_sum in win_sums]
 
     def frame_size_ms(self) -> int:
         return int(self.frame_size_ms)
 
 
 class E2EVadModel:
-    def __init__(self, config, vad_post_args: Dict[str, Any], root_dir: Path):
+    def __init__(
+        self, config, vad_post_args: Dict[str, Any], root_dir: Path, use_ort_cache: bool = True,
+        profile=None, session: VadOrtInferRuntimeSession = None,
+    ):
+        """session: 已创建的 ORT 会话, 多个 E2EVadModel(如流式会话)可以共用一个"""
         super(E2EVadModel, self).__init__()
         self.vad_opts = VADXOptions(**vad_post_args)
+        # fe_prior_thres 不随帧变化: 为 False 时所有语音帧都按静音处理
+        self.fe_prior_speech = math.fabs(1.0) > float(self.vad_opts.fe_prior_thres)
         self.windows_detector = WindowDetector(
             self.vad_opts.window_size_ms,
             self.vad_opts.sil_to_speech_time_thres,
             self.vad_opts.speech_to_sil_time_thres,
             self.vad_opts.frame_in_ms,
         )
-        self.model = VadOrtInferRuntimeSession(config, root_dir)
+        if session is None:
+            session = VadOrtInferRuntimeSession(config, root_dir, use_ort_cache, profile)
+        self.model = session
         self.all_reset_detection()
 
     def all_reset_detection(self):
@@ -245,7 +285,7 @@ class E2EVadModel:
         self.latest_confirmed_speech_frame = 0
         self.lastest_confirmed_silence_frame = -1
         self.continous_silence_frame_count = 0
-        self.vad_state_machine = VadStateMachine.kVadInStateStartPointNotDetected
+        self.vad_state_machine = STATE_START_NOT_DETECTED
         self.confirmed_start_frame = -1
         self.confirmed_end_frame = -1
         self.number_end_time_detected = 0
@@ -265,7 +305,7 @@ class E2EVadModel:
         self.scores = None
         self.scores_offset = 0
         self.max_time_out = False
-        self.decibel = []
+        self.decibel = np.zeros(0, dtype=np.float32)
         self.decibel_offset = 0
         self.data_buf_size = 0
         self.data_buf_all_size = 0
@@ -278,7 +318,7 @@ class E2EVadModel:
         self.lastest_confirmed_silence_frame = -1
         self.confirmed_start_frame = -1
         self.confirmed_end_frame = -1
-        self.vad_state_machine = VadStateMachine.kVadInStateStartPointNotDetected
+        self.vad_state_machine = STATE_START_NOT_DETECTED
         self.windows_detector.reset()
         self.sil_frame = 0
         self.frame_probs = []
@@ -296,21 +336,32 @@ class E2EVadModel:
         else:
             self.data_buf_all_size += len(self.waveform[0])
 
-        for offset in range(
-            0, self.waveform.shape[1] - frame_sample_length + 1, frame_shift_length
-        ):
-            self.decibel.append(
-                10
-                * np.log10(
-                    np.square(
-                        self.waveform[0][offset : offset + frame_sample_length]
-                    ).sum()
-                    + 1e-6
-                )
-            )
-
-    def compute_scores(self, feats: np.ndarray) -> None:
+        # 所有帧一次计算: 按帧移取步长视图(不复制), 每行的平方和与逐帧计算的 .sum() 完全相同。
+        # 分块计算, 平方后的临时数组不超过 block 帧。
+        wave = self.waveform[0]
+        n_frames = max(0, (wave.shape[0] - frame_sample_length) // frame_shift_length + 1)
+        # 与逐帧的标量运算 (sum + 1e-6) 保持同样的类型提升(与 NumPy 版本有关)
+        dtype = (np.square(wave[:1]).sum() + 1e-6).dtype
+        decibel = np.empty(n_frames, dtype=dtype)
+        if n_frames > 0:
+            frames = np.lib.stride_tricks.sliding_window_view(
+                wave[: (n_frames - 1) * frame_shift_length + frame_sample_length],
+                frame_sample_length,
+            )[::frame_shift_length]
+            block = 4096
+            for beg in range(0, n_frames, block):
+                energy = np.square(frames[beg : beg + block]).sum(axis=1).astype(dtype)
+                decibel[beg : beg + block] = 10 * np.log10(energy + dtype.type(1e-6))
+        self.decibel = np.concatenate((self.decibel, decibel))
+
+    def compute_scores(self, feats: np.ndarray, left_context: int = 0) -> None:
+        """
+        left_context: the first left_context frames of feats are history, only given as
+        FSMN memory context; their scores are dropped.
+        """
         scores = self.model(feats)
+        if left_context:
+            scores = [scores[0][:, left_context:]] + list(scores[1:])
         self.vad_opts.nn_eval_block_size = scores[0].shape[1]
         self.frm_cnt += scores[0].shape[1]  # count total frames
         if isinstance(feats, list):
@@ -318,7 +369,7 @@ class E2EVadModel:
             feats = feats[0]
 
         assert (
-            scores[0].shape[1] == feats.shape[1]
+            scores[0].shape[1] == feats.shape[1] - left_context
         ), "The shape between feats and scores does not match"
 
         self.scores = scores[0]  # the first calculation
@@ -327,16 +378,11 @@ class E2EVadModel:
         return scores[1:]
 
     def pop_data_buf_till_frame(self, frame_idx: int) -> None:  # need check again
-        while self.data_buf_start_frame < frame_idx:
-            if self.data_buf_size >= int(
-                self.vad_opts.frame_in_ms * self.vad_opts.sample_rate / 1000
-            ):
-                self.data_buf_start_frame += 1
-                self.data_buf_size = (
-                    self.data_buf_all_size
-                    - self.data_buf_start_frame
-                    * int(self.vad_opts.frame_in_ms * self.vad_opts.sample_rate / 1000)
-                )
+        # 等价于逐帧前移 data_buf_start_frame 到 frame_idx, 直接计算结果
+        frame_shift = int(self.vad_opts.frame_in_ms * self.vad_opts.sample_rate / 1000)
+        if self.data_buf_start_frame < frame_idx and self.data_buf_size >= frame_shift:
+            self.data_buf_start_frame = frame_idx
+            self.data_buf_size = self.data_buf_all_size - frame_idx * frame_shift
 
     def pop_data_to_output_buf(
         self,
@@ -373,7 +419,6 @@ class E2EVadModel:
         cur_seg = self.output_data_buf[-1]
         if cur_seg.end_ms != start_frm * self.vad_opts.frame_in_ms:
             logging.error("warning\n")
-        out_pos = len(cur_seg.buffer)  # cur_seg.buff现在没做任何操作
         data_to_pop = 0
         if end_point_is_sent_end:
             data_to_pop = expected_sample_number
@@ -386,13 +431,8 @@ class E2EVadModel:
             data_to_pop = self.data_buf_size
             expected_sample_number = self.data_buf_size
 
+        # 不复制音频数据(cur_seg.buffer 不使用), 只更新片段的起止时间
         cur_seg.doa = 0
-        for sample_cpy_out in range(0, data_to_pop):
-            # cur_seg.buffer[out_pos ++] = data_buf_.back();
-            out_pos += 1
-        for sample_cpy_out in range(data_to_pop, expected_sample_number):
-            # cur_seg.buffer[out_pos++] = data_buf_.back()
-            out_pos += 1
         if cur_seg.end_ms != start_frm * self.vad_opts.frame_in_ms:
             logging.error("Something wrong with the VAD algorithm\n")
         self.data_buf_start_frame += frm_cnt
@@ -404,15 +444,42 @@ class E2EVadModel:
 
     def on_silence_detected(self, valid_frame: int):
         self.lastest_confirmed_silence_frame = valid_frame
-        if self.vad_state_machine == VadStateMachine.kVadInStateStartPointNotDetected:
+        if self.vad_state_machine == STATE_START_NOT_DETECTED:
             self.pop_data_buf_till_frame(valid_frame)
         # silence_detected_callback_
         # pass
 
+    def on_silence_detected_range(self, first: int, end: int) -> None:
+        """on_silence_detected(t) for t in range(first, end) in one step"""
+        if first >= end:
+            return
+        self.lastest_confirmed_silence_frame = end - 1
+        if self.vad_state_machine != STATE_START_NOT_DETECTED:
+            return
+        # pop_data_buf_till_frame(t) 依次前移到每个 t, 直到剩余数据不足一帧
+        frame_shift = int(self.vad_opts.frame_in_ms * self.vad_opts.sample_rate / 1000)
+        first = max(first, self.data_buf_start_frame + 1)
+        if first < end:
+            self.pop_data_buf_till_frame(max(first, min(end - 1, self.data_buf_all_size // frame_shift)))
+
     def on_voice_detected(self, valid_frame: int) -> None:
         self.latest_confirmed_speech_frame = valid_frame
         self.pop_data_to_output_buf(valid_frame, 1, False, False, False)
 
+    def on_voice_detected_frames(self, frames) -> None:
+        """
+        on_voice_detected(t) for t in frames (non-decreasing, steps of 0 or 1) in one step.
+        After the first frame data_buf_start_frame is past every following t, so each
+        further call only advances it by one and moves the segment end.
+        """
+        if len(frames) == 0:
+            return
+        self.on_voice_detected(frames[0])
+        if len(frames) > 1:
+            self.latest_confirmed_speech_frame = frames[-1]
+            self.data_buf_start_frame += len(frames) - 1
+            self.output_data_buf[-1].end_ms = (frames[-1] + 1) * self.vad_opts.frame_in_ms
+
     def on_voice_start(self, start_frame: int, fake_result: bool = False) -> None:
         if self.vad_opts.do_start_point_detection:
             pass
@@ -424,7 +491,7 @@ class E2EVadModel:
         if (
             not fake_result
             and self.vad_state_machine
-            == VadStateMachine.kVadInStateStartPointNotDetected
+            == STATE_START_NOT_DETECTED
         ):
             self.pop_data_to_output_buf(
                 self.confirmed_start_frame, 1, True, False, False
@@ -433,8 +500,7 @@ class E2EVadModel:
     def on_voice_end(
         self, end_frame: int, fake_result: bool, is_last_frame: bool
     ) -> None:
-        for t in range(self.latest_confirmed_speech_frame + 1, end_frame):
-            self.on_voice_detected(t)
+        self.on_voice_detected_frames(range(self.latest_confirmed_speech_frame + 1, end_frame))
         if self.vad_opts.do_end_point_detection:
             pass
         if self.confirmed_end_frame != -1:
@@ -453,7 +519,7 @@ class E2EVadModel:
     ) -> None:
         if is_final_frame:
             self.on_voice_end(cur_frm_idx, False, True)
-            self.vad_state_machine = VadStateMachine.kVadInStateEndPointDetected
+            self.vad_state_machine = STATE_END_DETECTED
 
     def get_latency(self) -> int:
         return int(self.latency_frm_num_at_start_point() * self.vad_opts.frame_in_ms)
@@ -518,6 +584,98 @@ class E2EVadModel:
 
         return frame_state
 
+    def classify_frames(self, first: int, count: int) -> np.ndarray:
+        """
+        Block version of get_frame_state() for frames [first, first + count).
+        Return: int8 array of FrameState values (kFrameStateSil / kFrameStateSpeech).
+
+        The speech/noise decisions are computed on the whole block in float64; frames whose
+        margin to a threshold is too small to be decided safely that way are re-checked with
+        the scalar expressions of get_frame_state(), and the noise floor recurrence is run
+        with the same scalar arithmetic, so the states (and noise_average_decibel) are
+        identical to calling get_frame_state() frame by frame.
+        """
+        opts = self.vad_opts
+        frames = np.arange(first, first + count)
+        dec = self.decibel[frames - self.decibel_offset]
+        states = np.full(count, FrameState.kFrameStateSil.value, dtype=np.int8)
+        # 低于 decibel_thres 的帧直接判为静音, 不参与噪声估计
+        loud = np.flatnonzero(dec >= opts.decibel_thres)
+        if loud.shape[0] == 0:
+            return states
+
+        assert len(self.sil_pdf_ids) == opts.silence_pdf_num
+        assert len(self.scores) == 1  # 只支持batch_size = 1的测试
+        rows = self.scores[0][frames[loud] - self.scores_offset]
+        sil = rows[:, self.sil_pdf_ids[0]]
+        for sil_pdf_id in self.sil_pdf_ids[1:]:
+            sil = sil + rows[:, sil_pdf_id]
+        sil = sil.astype(np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            speech_prob = np.exp(np.log(1.0 - sil))
+            noise_prob = np.exp(np.log(sil) * opts.speech_2_noise_ratio) + self.speech_noise_thres
+        is_speech = speech_prob >= noise_prob
+        # 接近阈值(或 log 无定义)的帧按原来的标量公式判断
+        for k in np.flatnonzero(~(np.abs(speech_prob - noise_prob) > 1e-6)):
+            sil_pdf_scores = [rows[k][sil_pdf_id] for sil_pdf_id in self.sil_pdf_ids]
+            sum_score = sum(sil_pdf_scores)
+            noise = math.log(sum_score) * opts.speech_2_noise_ratio
+            speech = math.log(1.0 - sum_score)
+            is_speech[k] = math.exp(speech) >= math.exp(noise) + self.speech_noise_thres
+
+        # 噪声帧上的噪声平均分贝递推(与 get_frame_state 相同的标量运算)
+        frame_num = opts.noise_frame_num_used_for_snr
+
+        def noise_step(noise_average, cur_decibel):
+            if noise_average < -99.9:
+                return cur_decibel
+            return (cur_decibel + noise_average * (frame_num - 1)) / frame_num
+
+        noise_dec = dec[loud[~is_speech]]
+        noise_avgs = np.empty(noise_dec.shape[0] + 1, dtype=object)
+        noise_avgs[0] = self.noise_average_decibel
+        noise_avgs[1:] = list(noise_dec)
+        noise_avgs = np.frompyfunc(noise_step, 2, 1).accumulate(noise_avgs)
+        self.noise_average_decibel = noise_avgs[-1]
+
+        # 语音帧的 SNR 使用该帧之前的噪声平均分贝
+        cand = np.flatnonzero(is_speech)
+        before = np.cumsum(~is_speech)[cand]
+        cand_dec = dec[loud[cand]]
+        snr = cand_dec.astype(np.float64) - noise_avgs[before].astype(np.float64)
+        snr_ok = snr >= opts.snr_thres
+        for k in np.flatnonzero(~(np.abs(snr - opts.snr_thres) > 1e-3)):
+            snr_ok[k] = cand_dec[k] - noise_avgs[before[k]] >= opts.snr_thres
+        states[loud[cand[snr_ok]]] = FrameState.kFrameStateSpeech.value
+        return states
+
+    def detect_block(self, is_final: bool) -> np.ndarray:
+        """
+        Classify the last nn_eval_block_size frames at once (classify_frames) and run the
+        state machine over them; the last frame is the final one when is_final.
+        Return: int8 frame states of the block.
+        """
+        count = self.vad_opts.nn_eval_block_size
+        first = self.frm_cnt - count
+        if self.vad_opts.output_frame_probs or not self.sil_pdf_ids:
+            # 需要逐帧概率时使用逐帧的实现
+            states = []
+            for t in range(first, self.frm_cnt):
+                frame_state = self.get_frame_state(t)
+                states.append(frame_state.value)
+                self.detect_one_frame(frame_state, t, is_final and t == self.frm_cnt - 1)
+            return np.asarray(states, dtype=np.int8)
+
+        codes = self.classify_frames(first, count)
+        frames = np.arange(first, self.frm_cnt)
+        # get_frame_state 对低于 decibel_thres 的帧会多处理一次(判为静音)
+        repeats = 1 + (self.decibel[frames - self.decibel_offset] < self.vad_opts.decibel_thres)
+        finals = [False] * int(repeats.sum())
+        if finals:
+            finals[-1] = is_final
+        self.detect_frames(np.repeat(codes, repeats), np.repeat(frames, repeats).tolist(), finals)
+        return codes
+
     def infer_offline(
         self,
         feats: np.ndarray,
@@ -585,27 +743,32 @@ class E2EVadModel:
         segments = []
         # only support batch_size = 1 now
         for batch_num in range(0, feats[0].shape[0]):
-            if len(self.output_data_buf) > 0:
-                for i in range(self.output_data_buf_offset, len(self.output_data_buf)):
-                    if not self.output_data_buf[i].contain_seg_start_point:
-                        continue
-                    if (
-                        not self.next_seg
-                        and not self.output_data_buf[i].contain_seg_end_point
-                    ):
-                        continue
-                    start_ms = self.output_data_buf[i].start_ms if self.next_seg else -1
-                    if self.output_data_buf[i].contain_seg_end_point:
-                        end_ms = self.output_data_buf[i].end_ms
-                        self.next_seg = True
-                        self.output_data_buf_offset += 1
-                    else:
-                        end_ms = -1
-                        self.next_seg = False
-                    segments.append([start_ms, end_ms])
+            segments.extend(self.pop_online_segments())
 
         return segments, in_cache
 
+    def pop_online_segments(self) -> List[List[int]]:
+        """
+        Segments decided since the last call: [start_ms, end_ms], with end_ms = -1 while
+        the segment is still open and start_ms = -1 when an already reported start ends.
+        """
+        segments = []
+        for i in range(self.output_data_buf_offset, len(self.output_data_buf)):
+            if not self.output_data_buf[i].contain_seg_start_point:
+                continue
+            if not self.next_seg and not self.output_data_buf[i].contain_seg_end_point:
+                continue
+            start_ms = self.output_data_buf[i].start_ms if self.next_seg else -1
+            if self.output_data_buf[i].contain_seg_end_point:
+                end_ms = self.output_data_buf[i].end_ms
+                self.next_seg = True
+                self.output_data_buf_offset += 1
+            else:
+                end_ms = -1
+                self.next_seg = False
+            segments.append([start_ms, end_ms])
+        return segments
+
     def get_frames_state(
         self,
         feats: np.ndarray,
@@ -627,159 +790,211 @@ class E2EVadModel:
         in_cache = self.compute_scores(feats)
         self.compute_decibel()
 
-        if self.vad_state_machine == VadStateMachine.kVadInStateEndPointDetected:
+        if self.vad_state_machine == STATE_END_DETECTED:
             return states
 
-        for i in range(self.vad_opts.nn_eval_block_size - 1, -1, -1):
-            frame_state = FrameState.kFrameStateInvalid
-            frame_state = self.get_frame_state(self.frm_cnt - 1 - i)
-            states.append(frame_state)
-            if i == 0 and is_final:
-                logging.info("last frame detected")
-                self.detect_one_frame(frame_state, self.frm_cnt - 1, True)
-            else:
-                self.detect_one_frame(frame_state, self.frm_cnt - 1 - i, False)
-
-        return states
+        if is_final:
+            logging.info("last frame detected")
+        return [_FRAME_STATES[code] for code in self.detect_block(is_final).tolist()]
 
     def detect_common_frames(self) -> int:
-        if self.vad_state_machine == VadStateMachine.kVadInStateEndPointDetected:
+        if self.vad_state_machine == STATE_END_DETECTED:
             return 0
-        for i in range(self.vad_opts.nn_eval_block_size - 1, -1, -1):
-            frame_state = FrameState.kFrameStateInvalid
-            frame_state = self.get_frame_state(self.frm_cnt - 1 - i)
-            # print(f"cur frame: {self.frm_cnt - 1 - i}, state is {frame_state}")
-            self.detect_one_frame(frame_state, self.frm_cnt - 1 - i, False)
+        self.detect_block(False)
 
         self.decibel = self.decibel[self.vad_opts.nn_eval_block_size - 1 :]
-        self.decibel_offset = self.frm_cnt - 1 - i
+        self.decibel_offset = self.frm_cnt - 1
         return 0
 
     def detect_last_frames(self) -> int:
-        if self.vad_state_machine == VadStateMachine.kVadInStateEndPointDetected:
+        if self.vad_state_machine == STATE_END_DETECTED:
             return 0
-        for i in range(self.vad_opts.nn_eval_block_size - 1, -1, -1):
-            frame_state = FrameState.kFrameStateInvalid
-            frame_state = self.get_frame_state(self.frm_cnt - 1 - i)
-            if i != 0:
-                self.detect_one_frame(frame_state, self.frm_cnt - 1 - i, False)
-            else:
-                self.detect_one_frame(frame_state, self.frm_cnt - 1, True)
+        self.detect_block(True)
 
         return 0
 
+    def detect_frames(self, states: np.ndarray, frames: List[int], finals: List[bool]) -> None:
+        """
+        detect_one_frame() for a sequence of frame states (FRAME_SIL / FRAME_SPEECH):
+        the window changes of up to block frames are computed at once by the window
+        detector, then fed to the state machine. Runs of the same steady change go through
+        on_steady_frames() as a whole; transitions, timeouts and the final frame go through
+        on_state_change() one by one. When the state machine resets the window (end point
+        in multiple utterance mode) the rest is recomputed from the reset window.
+        """
+        if not self.fe_prior_speech:
+            states = np.full(len(states), FRAME_SIL, dtype=np.int8)
+        block = 512
+        pos = 0
+        while pos < len(frames):
+            changes = self.windows_detector.detect_frames(states[pos : pos + block])
+            base = pos
+            # 最后一帧可能是 is_final, 总是逐帧处理
+            steady_end = base + len(changes) - (1 if finals[base + len(changes) - 1] else 0)
+            run_ends = np.flatnonzero(np.diff(changes)) + base + 1
+            reset = False
+            for run_end in run_ends.tolist() + [base + len(changes)]:
+                state_change = changes[pos - base]
+                while pos < run_end and not reset:
+                    pos += self.on_steady_frames(state_change, frames[pos : min(run_end, steady_end)])
+                    if pos < run_end:
+                        pos += 1
+                        reset = self.on_state_change(state_change, frames[pos - 1], finals[pos - 1])
+                if reset:
+                    break
+
+    def on_steady_frames(self, state_change: int, frames: List[int]) -> int:
+        """
+        on_state_change() for a run of non-final frames with the same steady change
+        (sil2sil / speech2speech), handled as a whole up to the first frame that may time
+        out or end the segment; that frame and the rest are left to on_state_change().
+        Return: number of frames handled.
+        """
+        count = len(frames)
+        if count == 0:
+            return 0
+        frm_shift_in_ms = self.vad_opts.frame_in_ms
+        state = self.vad_state_machine
+        if state == STATE_END_DETECTED and self.vad_opts.detect_mode == MULTIPLE_UTTERANCE_MODE:
+            return 0
+        if state_change == CHANGE_SPEECH2SPEECH:
+            self.continous_silence_frame_count = 0
+            if state == STATE_IN_SPEECH:
+                # t - confirmed_start_frame + 1 > max_single_segment_time 的帧结束片段
+                limit = self.vad_opts.max_single_segment_time / frm_shift_in_ms + self.confirmed_start_frame - 1
+                count = bisect.bisect_right(frames, limit)
+                self.on_voice_detected_frames(frames[:count])
+            return count
+        if state_change != CHANGE_SIL2SIL or state == STATE_IN_SPEECH:
+            # 语音后的静音最长 max_end_silence_time, 逐帧处理
+            return 0
+        if state == STATE_START_NOT_DETECTED:
+            if self.vad_opts.detect_mode == SINGLE_UTTERANCE_MODE:
+                # 静音计数超过 max_start_silence_time 的帧超时
+                max_count = int(self.vad_opts.max_start_silence_time // frm_shift_in_ms)
+                count = max(0, min(count, max_count - self.continous_silence_frame_count))
+            latency = self.latency_frm_num_at_start_point()
+            if count and frames[count - 1] >= latency:
+                self.on_silence_detected_range(max(frames[0], latency) - latency, frames[count - 1] - latency + 1)
+        self.continous_silence_frame_count += count
+        return count
+
     def detect_one_frame(
-        self, cur_frm_state: FrameState, cur_frm_idx: int, is_final_frame: bool
+        self, cur_frm_state: int, cur_frm_idx: int, is_final_frame: bool
     ) -> None:
-        tmp_cur_frm_state = FrameState.kFrameStateInvalid
-        if cur_frm_state == FrameState.kFrameStateSpeech:
-            if math.fabs(1.0) > float(self.vad_opts.fe_prior_thres):
-                tmp_cur_frm_state = FrameState.kFrameStateSpeech
+        cur_frm_state = getattr(cur_frm_state, "value", cur_frm_state)
+        tmp_cur_frm_state = FRAME_INVALID
+        if cur_frm_state == FRAME_SPEECH:
+            if self.fe_prior_speech:
+                tmp_cur_frm_state = FRAME_SPEECH
             else:
-                tmp_cur_frm_state = FrameState.kFrameStateSil
-        elif cur_frm_state == FrameState.kFrameStateSil:
-            tmp_cur_frm_state = FrameState.kFrameStateSil
+                tmp_cur_frm_state = FRAME_SIL
+        elif cur_frm_state == FRAME_SIL:
+            tmp_cur_frm_state = FRAME_SIL
         state_change = self.windows_detector.detect_one_frame(
             tmp_cur_frm_state, cur_frm_idx
         )
+        self.on_state_change(state_change, cur_frm_idx, is_final_frame)
+
+    def on_state_change(
+        self, state_change: int, cur_frm_idx: int, is_final_frame: bool
+    ) -> bool:
+        """Advance the VAD state machine by one frame; True when it was reset (end point)."""
         frm_shift_in_ms = self.vad_opts.frame_in_ms
-        if AudioChangeState.kChangeStateSil2Speech == state_change:
+        if CHANGE_SIL2SPEECH == state_change:
             self.continous_silence_frame_count = 0
             self.pre_end_silence_detected = False
 
             if (
                 self.vad_state_machine
-                == VadStateMachine.kVadInStateStartPointNotDetected
+                == STATE_START_NOT_DETECTED
             ):
                 start_frame = max(
                     self.data_buf_start_frame,
                     cur_frm_idx - self.latency_frm_num_at_start_point(),
                 )
                 self.on_voice_start(start_frame)
-                self.vad_state_machine = VadStateMachine.kVadInStateInSpeechSegment
-                for t in range(start_frame + 1, cur_frm_idx + 1):
-                    self.on_voice_detected(t)
-            elif self.vad_state_machine == VadStateMachine.kVadInStateInSpeechSegment:
-                for t in range(self.latest_confirmed_speech_frame + 1, cur_frm_idx):
-                    self.on_voice_detected(t)
+                self.vad_state_machine = STATE_IN_SPEECH
+                self.on_voice_detected_frames(range(start_frame + 1, cur_frm_idx + 1))
+            elif self.vad_state_machine == STATE_IN_SPEECH:
+                self.on_voice_detected_frames(range(self.latest_confirmed_speech_frame + 1, cur_frm_idx))
                 if (
                     cur_frm_idx - self.confirmed_start_frame + 1
                     > self.vad_opts.max_single_segment_time / frm_shift_in_ms
                 ):
                     self.on_voice_end(cur_frm_idx, False, False)
-                    self.vad_state_machine = VadStateMachine.kVadInStateEndPointDetected
+                    self.vad_state_machine = STATE_END_DETECTED
                 elif not is_final_frame:
                     self.on_voice_detected(cur_frm_idx)
                 else:
                     self.maybe_on_voice_end_last_frame(is_final_frame, cur_frm_idx)
             else:
                 pass
-        elif AudioChangeState.kChangeStateSpeech2Sil == state_change:
+        elif CHANGE_SPEECH2SIL == state_change:
             self.continous_silence_frame_count = 0
             if (
                 self.vad_state_machine
-                == VadStateMachine.kVadInStateStartPointNotDetected
+                == STATE_START_NOT_DETECTED
             ):
                 pass
-            elif self.vad_state_machine == VadStateMachine.kVadInStateInSpeechSegment:
+            elif self.vad_state_machine == STATE_IN_SPEECH:
                 if (
                     cur_frm_idx - self.confirmed_start_frame + 1
                     > self.vad_opts.max_single_segment_time / frm_shift_in_ms
                 ):
                     self.on_voice_end(cur_frm_idx, False, False)
-                    self.vad_state_machine = VadStateMachine.kVadInStateEndPointDetected
+                    self.vad_state_machine = STATE_END_DETECTED
                 elif not is_final_frame:
                     self.on_voice_detected(cur_frm_idx)
                 else:
                     self.maybe_on_voice_end_last_frame(is_final_frame, cur_frm_idx)
             else:
                 pass
-        elif AudioChangeState.kChangeStateSpeech2Speech == state_change:
+        elif CHANGE_SPEECH2SPEECH == state_change:
             self.continous_silence_frame_count = 0
-            if self.vad_state_machine == VadStateMachine.kVadInStateInSpeechSegment:
+            if self.vad_state_machine == STATE_IN_SPEECH:
                 if (
                     cur_frm_idx - self.confirmed_start_frame + 1
                     > self.vad_opts.max_single_segment_time / frm_shift_in_ms
                 ):
                     self.max_time_out = True
                     self.on_voice_end(cur_frm_idx, False, False)
-                    self.vad_state_machine = VadStateMachine.kVadInStateEndPointDetected
+                    self.vad_state_machine = STATE_END_DETECTED
                 elif not is_final_frame:
                     self.on_voice_detected(cur_frm_idx)
                 else:
                     self.maybe_on_voice_end_last_frame(is_final_frame, cur_frm_idx)
             else:
                 pass
-        elif AudioChangeState.kChangeStateSil2Sil == state_change:
+        elif CHANGE_SIL2SIL == state_change:
             self.continous_silence_frame_count += 1
             if (
                 self.vad_state_machine
-                == VadStateMachine.kVadInStateStartPointNotDetected
+                == STATE_START_NOT_DETECTED
             ):
                 # silence timeout, return zero length decision
                 if (
                     (
                         self.vad_opts.detect_mode
-                        == VadDetectMode.kVadSingleUtteranceDetectMode.value
+                        == SINGLE_UTTERANCE_MODE
                     )
                     and (
                         self.continous_silence_frame_count * frm_shift_in_ms
                         > self.vad_opts.max_start_silence_time
                     )
                 ) or (is_final_frame and self.number_end_time_detected == 0):
-                    for t in range(
+                    self.on_silence_detected_range(
                         self.lastest_confirmed_silence_frame + 1, cur_frm_idx
-                    ):
-                        self.on_silence_detected(t)
+                    )
                     self.on_voice_start(0, True)
                     self.on_voice_end(0, True, False)
-                    self.vad_state_machine = VadStateMachine.kVadInStateEndPointDetected
+                    self.vad_state_machine = STATE_END_DETECTED
                 else:
                     if cur_frm_idx >= self.latency_frm_num_at_start_point():
                         self.on_silence_detected(
                             cur_frm_idx - self.latency_frm_num_at_start_point()
                         )
-            elif self.vad_state_machine == VadStateMachine.kVadInStateInSpeechSegment:
+            elif self.vad_state_machine == STATE_IN_SPEECH:
                 if (
                     self.continous_silence_frame_count * frm_shift_in_ms
                     >= self.max_end_sil_frame_cnt_thresh
@@ -794,13 +1009,13 @@ class E2EVadModel:
                         lookback_frame -= 1
                         lookback_frame = max(0, lookback_frame)
                     self.on_voice_end(cur_frm_idx - lookback_frame, False, False)
-                    self.vad_state_machine = VadStateMachine.kVadInStateEndPointDetected
+                    self.vad_state_machine = STATE_END_DETECTED
                 elif (
                     cur_frm_idx - self.confirmed_start_frame + 1
                     > self.vad_opts.max_single_segment_time / frm_shift_in_ms
                 ):
                     self.on_voice_end(cur_frm_idx, False, False)
-                    self.vad_state_machine = VadStateMachine.kVadInStateEndPointDetected
+                    self.vad_state_machine = STATE_END_DETECTED
                 elif self.vad_opts.do_extend and not is_final_frame:
                     if self.continous_silence_frame_count <= int(
                         self.vad_opts.lookahead_time_end_point / frm_shift_in_ms
@@ -812,16 +1027,19 @@ class E2EVadModel:
                 pass
 
         if (
-            self.vad_state_machine == VadStateMachine.kVadInStateEndPointDetected
+            self.vad_state_machine == STATE_END_DETECTED
             and self.vad_opts.detect_mode
-            == VadDetectMode.kVadMutipleUtteranceDetectMode.value
+            == MULTIPLE_UTTERANCE_MODE
         ):
             self.reset_detection()
+            return True
+        return False
 
 
 class FSMNVad(object):
-    def __init__(self, config_dir: str):
+    def __init__(self, config_dir: str, use_ort_cache: bool = True, profile=None):
         config_dir = Path(config_dir)
+        self.config_dir = config_dir
         self.config = read_yaml(config_dir / "fsmn-config.yaml")
         self.frontend = WavFrontend(
             cmvn_file=config_dir / "fsmn-am.mvn",
@@ -831,22 +1049,37 @@ class FSMNVad(object):
         self.config["FSMN"]["model_path"] = "fsmnvad-offline.onnx"
 
         self.vad = E2EVadModel(
-            self.config["FSMN"], self.config["vadPostArgs"], config_dir
+            self.config["FSMN"], self.config["vadPostArgs"], config_dir, use_ort_cache, profile
         )
 
     def set_parameters(self, mode):
         pass
 
-    def extract_feature(self, waveform):
-        fbank, _ = self.frontend.fbank(waveform)
+    def extract_feature(self, waveform, fbank: np.ndarray = None):
+        """fbank: 已计算好的整段 fbank(与 self.frontend 配置一致时可共享), 为 None 则重新计算"""
+        if fbank is None:
+            fbank, _ = self.frontend.fbank(waveform)
         feats, feats_len = self.frontend.lfr_cmvn(fbank)
-        return feats.astype(np.float32), feats_len
+        return feats, feats_len
+
+    def stream(self, max_end_sil: int = None) -> "FSMNVadStream":
+        """
+        A streaming VAD session sharing this object's ORT session, see FSMNVadStream.
+        max_end_sil: trailing silence (ms) that ends a segment, default: vadPostArgs max_end_silence_time.
+        """
+        return FSMNVadStream(self, max_end_sil)
 
     def is_speech(self, buf, sample_rate=16000):
         assert sample_rate == 16000, "only support 16k sample rate"
 
-    def segments_offline(self, waveform_path: Union[str, Path, np.ndarray]):
-        """get sements of audio"""
+    def segments_offline(
+        self, waveform_path: Union[str, Path, np.ndarray], fbank: np.ndarray = None
+    ):
+        """
+        get sements of audio
+
+        fbank: optional precomputed fbank of the whole waveform (see extract_feature).
+        """
         logging.debug(f"vad segments start")
         if isinstance(waveform_path, np.ndarray):
             waveform = waveform_path
@@ -854,6 +1087,7 @@ class FSMNVad(object):
             if not os.path.exists(waveform_path):
                 raise FileExistsError(f"{waveform_path} is not exist.")
             if os.path.isfile(waveform_path):
+                import soundfile as sf
                 logging.info(f"load audio {waveform_path}")
                 waveform, _sample_rate = sf.read(
                     waveform_path,
@@ -865,9 +1099,126 @@ class FSMNVad(object):
                 _sample_rate == 16000
             ), f"only support 16k sample rate, current sample rate is {_sample_rate}"
 
-        feats, feats_len = self.extract_feature(waveform)
+        feats, feats_len = self.extract_feature(waveform, fbank)
         waveform = waveform[None, ...]
         segments_part, in_cache = self.vad.infer_offline(
             feats[None, ...], waveform, is_final=True
         )
         return segments_part[0] if segments_part else []
+
+
+class FSMNVadStream(object):
+    """
+    Streaming VAD: accept() audio chunks of any size, get (start_ms, end_ms) events as
+    soon as they are decided (times from the start of the stream):
+
+        stream = vad.stream()
+        for chunk in chunks:
+            for start_ms, end_ms in stream.accept(chunk):
+                ...
+        events = stream.finish()
+
+    (start_ms, -1): speech started, end not decided yet; (-1, end_ms): the open segment
+    ended; (start_ms, end_ms): a whole segment decided at once.
+
+    Frontend (fbank/LFR/CMVN), decibel and score history and the post-processing state are
+    kept between calls, so the segments are the same as segments_offline() on the whole
+    audio. Models with FSMN cache inputs (in_cache0..) get their caches threaded through;
+    the offline model has none, so the last fsmn_layers x (lorder - 1) feature frames (the
+    FSMN memory span) are fed again as left context of every block.
+    """
+
+    def __init__(self, vad: FSMNVad, max_end_sil: int = None) -> None:
+        self.frontend = WavFrontend(
+            cmvn_file=vad.config_dir / "fsmn-am.mvn",
+            **vad.config["WavFrontend"]["frontend_conf"],
+        )
+        self.vad = E2EVadModel(
+            vad.config["FSMN"], vad.config["vadPostArgs"], vad.config_dir, session=vad.vad.model
+        )
+        opts = self.vad.vad_opts
+        self.max_end_sil = max_end_sil
+        self.frame_shift = int(opts.frame_in_ms * opts.sample_rate / 1000)
+        self.frame_length = int(opts.frame_length_ms * opts.sample_rate / 1000)
+        self.use_cache = any(name.startswith("in_cache") for name in self.vad.model.get_input_names())
+        encoder_conf = vad.config["FSMN"]["encoder_conf"]
+        self.cache_shape = (1, encoder_conf["proj_dim"], encoder_conf["lorder"] - 1, 1)
+        self.cache_layers = encoder_conf["fsmn_layers"]
+        self.context_frames = encoder_conf["fsmn_layers"] * (encoder_conf["lorder"] - 1)
+        self.reset()
+
+    def reset(self) -> None:
+        self.frontend.reset_status()
+        self.vad.all_reset_detection()
+        if self.max_end_sil is not None:
+            self.vad.max_end_sil_frame_cnt_thresh = (
+                self.max_end_sil - self.vad.vad_opts.speech_to_sil_time_thres
+            )
+        self.samples = np.zeros(0, dtype=np.float32)  # 从第 frames_done 帧起始处开始的音频
+        self.samples_total = 0
+        self.frames_done = 0
+        self.pending = None     # 已取出、尚未送入 VAD 的特征帧
+        self.context = None     # FSMN 记忆的左侧上下文(已处理的最后若干特征帧)
+        self.in_cache = [np.zeros(self.cache_shape, dtype=np.float32) for _ in range(self.cache_layers)]
+
+    def accept(self, chunk: np.ndarray) -> List[Tuple[int, int]]:
+        """chunk: mono float32 [-1, 1] or int16 samples. Return: events decided so far"""
+        chunk = np.asarray(chunk).reshape(-1)
+        if chunk.dtype == np.int16:
+            chunk = chunk.astype(np.float32) / (1 << 15)
+        chunk = chunk.astype(np.float32, copy=False)
+        self.samples = np.concatenate((self.samples, chunk))
+        self.samples_total += chunk.shape[0]
+        self.frontend.accept_waveform(chunk)
+        self._append(self.frontend.pop_features())
+        # 留下最后一帧, 在 finish() 时作为最后一帧(is_final)处理
+        if self.pending is not None and self.pending.shape[0] > 1:
+            feats = self.pending[:-1]
+            self.pending = self.pending[-1:]
+            self._process(feats, False)
+        return self._events()
+
+    def finish(self) -> List[Tuple[int, int]]:
+        """End of input: decide the last frames, return the remaining events and reset the stream."""
+        self._append(self.frontend.pop_features(is_final=True))
+        events = []
+        if self.pending is not None and self.pending.shape[0] > 0:
+            feats, self.pending = self.pending, None
+            self._process(feats, True)
+            events = self._events()
+        self.reset()
+        return events
+
+    def _append(self, feats: np.ndarray) -> None:
+        if feats.shape[0] == 0:
+            return
+        self.pending = feats if self.pending is None else np.concatenate((self.pending, feats))
+
+    def _process(self, feats: np.ndarray, is_final: bool) -> None:
+        vad = self.vad
+        count = feats.shape[0]
+        # 分贝: 第 f 帧对应采样 [f * frame_shift, f * frame_shift + frame_length)。
+        # 每块重新对齐 decibel 与帧号(detect_common_frames 的截取只适用于第一块)
+        vad.decibel = vad.decibel[:0]
+        vad.decibel_offset = self.frames_done
+        vad.waveform = self.samples[None, : (count - 1) * self.frame_shift + self.frame_length]
+        vad.compute_decibel()
+        vad.data_buf_all_size = self.samples_total
+
+        if self.use_cache:
+            self.in_cache = vad.compute_scores([feats[None, ...]] + self.in_cache)
+        else:
+            left = 0 if self.context is None else self.context.shape[0]
+            inputs = feats if self.context is None else np.concatenate((self.context, feats))
+            vad.compute_scores(inputs[None, ...], left_context=left)
+            self.context = inputs[-self.context_frames :]
+
+        if is_final:
+            vad.detect_last_frames()
+        else:
+            vad.detect_common_frames()
+        self.frames_done += count
+        self.samples = self.samples[count * self.frame_shift :]
+
+    def _events(self) -> List[Tuple[int, int]]:
+        return [(start_ms, end_ms) for start_ms, end_ms in self.vad.pop_online_segments()]
@@ -0,0 +1,161 @@
+# =========================================
+# -*- coding: utf-8 -*-
+# Project     : SenseVoiceOne
+# Module      : resample.py
+# Author      : KyleWang[kylewang1977@gmail.com]
+# Time        : 2026-10-17 11:05
+# Version     : 1.0.0
+# Last Updated:
+# Description : 多相(polyphase)重采样, 替代 librosa.resample。
+#               Kaiser 窗 sinc 低通滤波器(与 scipy.signal.resample_poly 的默认设计相同),
+#               常用采样率比例的滤波器组预先计算并缓存。
+#               支持有状态的分块(流式)处理: 分块结果拼接后与一次性处理一致(差异在 float32 舍入误差内)。
+# =========================================
+from functools import lru_cache
+from math import gcd
+from typing import Tuple
+
+import numpy as np
+
+# 常用输入采样率(目标 16k), 其滤波器组可以通过 precompute_filter_banks() 预先生成
+COMMON_RATES = (48000, 44100, 22050, 8000)
+# 单次计算的输出采样点数(约数), 限制 (周期数 x 周期窗口长度) 窗口矩阵的内存
+_BLOCK_OUTPUTS = 16384
+
+
+@lru_cache(maxsize=None)
+def get_filter_bank(orig_sr: int, target_sr: int) -> Tuple[np.ndarray, int, int, int]:
+    """
+    Design (and cache) the polyphase filter bank for orig_sr -> target_sr.
+
+    Return: (bank, up, down, delay)
+        bank: float32 (up, taps_per_phase), bank[p, k] = h[p + k*up]
+        delay: group delay of h, in samples of the upsampled signal
+    """
+    g = gcd(int(orig_sr), int(target_sr))
+    up, down = int(target_sr) // g, int(orig_sr) // g
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    length = 2 * half_len + 1
+    n = np.arange(length) - half_len
+    h = np.sinc(n / max_rate) / max_rate * np.kaiser(length, 5.0)
+    h *= up / h.sum()
+
+    taps = -(-length // up)
+    h = np.concatenate((h, np.zeros(taps * up - length)))
+    bank = np.ascontiguousarray(h.reshape(taps, up).T, dtype=np.float32)
+    bank.setflags(write=False)
+    return bank, up, down, half_len
+
+
+@lru_cache(maxsize=None)
+def get_period_filter(orig_sr: int, target_sr: int) -> Tuple[int, np.ndarray]:
+    """
+    The filter bank laid out per output period: outputs q*up .. q*up+up-1 all read
+    input samples [q*down + period_beg, q*down + period_beg + period_len), so one period is
+    window @ period_filter.
+
+    Return: (period_beg, period_filter)
+        period_filter: float32 (period_len, up), column r holds the phase filter of output
+        q*up + r (time order) at that output's offset in the window, zeros elsewhere
+    """
+    bank, up, down, delay = get_filter_bank(orig_sr, target_sr)
+    taps = bank.shape[1]
+    m = np.arange(up) * down + delay
+    ends = m // up                          # 第 r 个输出的最后一个输入采样点(相对 q*down)
+    period_beg = int(ends[0]) - (taps - 1)
+    period_filter = np.zeros((int(ends[-1] - ends[0]) + taps, up), dtype=np.float32)
+    rows = (ends - ends[0])[:, None] + np.arange(taps)[None, :]
+    period_filter[rows, np.arange(up)[:, None]] = bank[m % up, ::-1]
+    period_filter.setflags(write=False)
+    return period_beg, period_filter
+
+
+def precompute_filter_banks(target_sr: int = 16000) -> None:
+    """预先生成 COMMON_RATES -> target_sr 的滤波器组"""
+    for sr in COMMON_RATES:
+        if sr != target_sr:
+            get_period_filter(sr, target_sr)
+
+
+class PolyphaseResampler:
+    """
+    Stateful polyphase resampler for (channels, frames) or (frames,) float audio.
+
+    `process(chunk)` returns every output sample that can already be computed;
+    `process(chunk, is_final=True)` flushes the filter tail. The concatenated
+    output equals `resample(whole_signal)` up to float32 rounding, length ceil(frames * target_sr / orig_sr).
+    """
+
+    def __init__(self, orig_sr: int, target_sr: int = 16000) -> None:
+        self.orig_sr = orig_sr
+        self.target_sr = target_sr
+        self.bank, self.up, self.down, self.delay = get_filter_bank(orig_sr, target_sr)
+        self.taps = self.bank.shape[1]
+        self.period_beg, self.period_filter = get_period_filter(orig_sr, target_sr)
+        self.period_len = self.period_filter.shape[0]
+        self.reset()
+
+    def reset(self) -> None:
+        self.buf = None         # 输入缓存, 第 0 列对应输入采样点 buf_beg
+        self.buf_beg = -(self.taps - 1)
+        self.out_idx = 0        # 下一个输出采样点的序号
+        self.in_samples = 0     # 已输入的采样点总数
+
+    def process(self, waveform: np.ndarray, is_final: bool = False) -> np.ndarray:
+        is_1d = waveform.ndim == 1
+        x = np.asarray(waveform, dtype=np.float32)
+        if is_1d:
+            x = x[None, :]
+        if self.buf is None:
+            self.buf = np.zeros((x.shape[0], self.taps - 1), dtype=np.float32)
+        self.buf = np.concatenate((self.buf, x), axis=1)
+        self.in_samples += x.shape[1]
+
+        buf_end = self.buf_beg + self.buf.shape[1]
+        if is_final:
+            out_stop = -(-self.in_samples * self.up // self.down)
+            need_end = (max(out_stop - 1, 0) * self.down + self.delay) // self.up + 1
+            if need_end > buf_end:
+                pad = np.zeros((self.buf.shape[0], need_end - buf_end), dtype=np.float32)
+                self.buf = np.concatenate((self.buf, pad), axis=1)
+        else:
+            out_stop = max(0, (buf_end * self.up - 1 - self.delay) // self.down + 1)
+
+        channels, buf_len = self.buf.shape
+        out = np.empty((channels, max(0, out_stop - self.out_idx)), dtype=np.float32)
+        # 按周期计算: 周期 q 的 up 个输出只用到输入 [q*down + period_beg, +period_len),
+        # 各周期的窗口是 buf 上步长为 down 的滑动窗口视图, 每块只需一次矩阵乘
+        step = max(1, _BLOCK_OUTPUTS // self.up)
+        for q_beg in range(self.out_idx // self.up, -(-out_stop // self.up), step):
+            q_end = min(q_beg + step, -(-out_stop // self.up))
+            lo = q_beg * self.down + self.period_beg - self.buf_beg
+            hi = (q_end - 1) * self.down + self.period_beg + self.period_len - self.buf_beg
+            seg = self.buf[:, max(lo, 0) : min(hi, buf_len)]
+            if lo < 0 or hi > buf_len:
+                # 周期内 out_idx 之前、out_stop 之后的输出会被丢弃, 其缺少的输入补 0
+                seg = np.pad(seg, ((0, 0), (max(0, -lo), max(0, hi - buf_len))))
+            windows = np.lib.stride_tricks.sliding_window_view(seg, self.period_len, axis=1)[:, :: self.down]
+            res = (windows @ self.period_filter).reshape(channels, -1)
+            beg, end = max(self.out_idx, q_beg * self.up), min(out_stop, q_end * self.up)
+            out[:, beg - self.out_idx : end - self.out_idx] = res[:, beg - q_beg * self.up : end - q_beg * self.up]
+
+        if is_final:
+            self.reset()
+        else:
+            self.out_idx = out_stop
+            keep_beg = (out_stop * self.down + self.delay) // self.up - (self.taps - 1)
+            drop = min(max(0, keep_beg - self.buf_beg), self.buf.shape[1])
+            self.buf = self.buf[:, drop:]
+            self.buf_beg += drop
+        return out[0] if is_1d else out
+
+
+def resample(waveform: np.ndarray, orig_sr: int, target_sr: int = 16000) -> np.ndarray:
+    """
+    One-shot resampling along the last axis.
+    waveform: (frames,) or (channels, frames); Return float32, same layout.
+    """
+    if orig_sr == target_sr:
+        return np.asarray(waveform, dtype=np.float32)
+    return PolyphaseResampler(orig_sr, target_sr).process(waveform, is_final=True)
@@ -17,6 +17,7 @@ import platform
 import ctypes
 import pyaudio
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 from PyQt5.QtGui import QIcon, QPainter, QPen
@@ -25,6 +26,7 @@ from PyQt5.QtWidgets import (
 from ui.settingWin import Ui_Dialog
 from ui.subtitle import SubtitleWindow
 from libsensevoiceOne.model import SenseVoiceOne
+from libsensevoiceOne.thread_budget import ThreadBudget
 from libpowertrans.funcsLib import logging, log_init
 from libpowertrans.AudioCapture import Recorder
 import numpy as np
@@ -96,7 +98,14 @@ class MainWindow(QDialog, Ui_Dialog):
         self.model_file = "sense-voice-encoder-int8.onnx"
         self.language = "zh"
         self.ssOnnx = SenseVoiceOne()
-        self.isModelLoaded = False
+        # 线程预算: 留一个核给录音(与界面)线程, 其余给 ASR/VAD 推理
+        self.thread_budget = ThreadBudget(capture_cores=1, pin=True)
+        # transcribe 的调用线程也参与 intra-op 计算: 在绑定到推理核的线程中执行, 不在界面线程中
+        self.asr_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ASR",
+                                             initializer=self.thread_budget.pin_inference_thread)
+        # 启动时即在后台并行加载模型, 只有在需要识别而模型尚未就绪时才会等待
+        self.ssOnnx.load_model(senseVoice_model_file=self.model_file, block=False,
+                               thread_budget=self.thread_budget)
 
     def init_ui(self):
         self.setWindowTitle("PowerTrans")
@@ -298,24 +307,26 @@ class MainWindow(QDialog, Ui_Dialog):
             self.recoder.run(seconds=5, 
                              save_wave=True, 
                              mute_check=True, 
-                             speech_completeness=True
+                             speech_completeness=True,
+                             cpu_affinity=self.thread_budget.capture_cores,
                             )
 
     def timer_sub_func(self):
-        if not self.isModelLoaded:
-            self.ssOnnx.load_model(senseVoice_model_file=self.model_file)
-            self.isModelLoaded = True
         audio_res = self.recoder.get(False)
         res = ""
         if audio_res is not None:
+            if not self.ssOnnx.ready():
+                logging.info("等待模型加载完成...")
+                self.ssOnnx.wait_ready()
             logging.info("\033[34m 取得数据. array.shape={}. 队列长度:{}\033[0m".format(
                 audio_res["array"].shape, self.recoder.audio_queue.qsize()))
-            res = self.ssOnnx.transcribe(audio_res["array"], 
+            res = self.asr_worker.submit(self.ssOnnx.transcribe,
+                                         audio_res["array"], 
                                          language=self.language,
                                          use_itn=True,
                                          use_vad=True,
                                          ForceMono=True,
-                                         str_result=True)
+                                         str_result=True).result()
         # TODO 长语句的换行显示、时间
         # 没有用到GPU
         text1 = self.subtitle1
@@ -351,6 +362,7 @@ class MainWindow(QDialog, Ui_Dialog):
 
         if reply == QMessageBox.Yes:
             self.stop_get_voice_data()
+            self.asr_worker.shutdown(wait=False)
             event.accept()  # 接受关闭事件，窗口会关闭
         else:
             event.ignore()  # 忽略关闭事件，窗口不会关闭
@@ -0,0 +1,121 @@
+# -*- coding:utf-8 -*-
+# CTC 贪心合并、重叠区切点与滑动窗口拼接(不需要模型: 用按特征给出逐帧 id 的假编码器)
+import numpy as np
+import pytest
+
+from libsensevoiceOne.onnx.sense_voice_ort_session import SenseVoiceInferenceSession
+from libsensevoiceOne.utils.ctc import CTCGreedyDecoder, ctc_collapse, stitch_cut
+
+PROMPT_IDS = [24884, 24992, 25004, 25016]
+
+
+def reference_collapse(ids, blank_id=0):
+    """逐帧循环的 CTC 合并: [(id, start, end)]"""
+    tokens = []
+    for t, tid in enumerate(ids):
+        if t > 0 and tid == ids[t - 1]:
+            if tid != blank_id:
+                tokens[-1][2] = t + 1
+        elif tid != blank_id:
+            tokens.append([tid, t, t + 1])
+    return [tuple(tok) for tok in tokens]
+
+
+def as_tuples(collapsed):
+    ids, starts, ends = collapsed
+    return list(zip(ids.tolist(), starts.tolist(), ends.tolist()))
+
+
+def test_ctc_collapse_matches_loop():
+    rng = np.random.default_rng(0)
+    token_ids = rng.integers(0, 4, (5, 40))
+    lengths = np.array([40, 0, 17, 1, 33])
+    collapsed = ctc_collapse(token_ids, lengths)
+    assert len(collapsed) == 5
+    for row, length, result in zip(token_ids.tolist(), lengths, collapsed):
+        assert as_tuples(result) == reference_collapse(row[:length])
+
+
+def test_ctc_collapse_rows_do_not_merge():
+    # 上一行末尾与下一行开头是同一个 token, 也不能合成一个
+    collapsed = ctc_collapse(np.array([[0, 5, 5], [5, 5, 0]]))
+    assert as_tuples(collapsed[0]) == [(5, 1, 3)]
+    assert as_tuples(collapsed[1]) == [(5, 0, 2)]
+    assert as_tuples(ctc_collapse(np.array([7, 7, 0, 7]))[0]) == [(7, 0, 2), (7, 3, 4)]
+
+
+def test_stitch_cut():
+    prev = np.array([3, 0, 0, 4, 4, 0, 0, 5])
+    cur = np.array([9, 0, 4, 4, 4, 0, 0, 5])
+    # 两边都是 blank 的帧: 1, 5, 6; 离中点 4 最近的是 5
+    assert stitch_cut(prev, cur) == 5
+    # 没有共同的 blank 帧时取中点
+    assert stitch_cut(np.array([1, 2, 0, 3]), np.array([0, 2, 3, 0])) == 2
+
+
+class _FakeSentencePiece:
+    def decode(self, batch):
+        return [" ".join(map(str, ids)) for ids in batch]
+
+    def id_to_piece(self, ids):
+        return [str(i) for i in ids]
+
+
+class _FakeSession(SenseVoiceInferenceSession):
+    """
+    特征第 0 列是该帧的 '真实' token id, 第 1 列是全局帧号。
+    窗口内部的边界(不是音频首尾)附近上下文不足, 前后 edge 帧输出错误的 token, 与真实编码器一样
+    只有重叠区中部可信。
+    """
+
+    def __init__(self, total_frames, edge=3):
+        self.blank_id = 0
+        self.decoder = CTCGreedyDecoder(_FakeSentencePiece(), self.blank_id)
+        self.total_frames = total_frames
+        self.edge = edge
+
+    def query(self, language, use_itn):
+        return np.zeros((len(PROMPT_IDS), 2), dtype=np.float32)
+
+    def _window_token_ids(self, speech, query):
+        ids = speech[:, 0].astype(np.int64)
+        frame = speech[:, 1].astype(np.int64)
+        noisy = ((np.arange(ids.shape[0]) < self.edge) & (frame[0] > 0)) | (
+            (np.arange(ids.shape[0]) >= ids.shape[0] - self.edge) & (frame[-1] < self.total_frames - 1))
+        ids = np.where(noisy, 100 + frame % 7, ids)
+        return np.concatenate((PROMPT_IDS, ids))
+
+
+def synth_frame_ids(frames, rng):
+    """长 1~6 帧的 token 与长 1~3 帧的 blank 交替"""
+    ids = []
+    while len(ids) < frames:
+        ids += [int(rng.integers(1, 50))] * int(rng.integers(1, 7))
+        ids += [0] * int(rng.integers(1, 4))
+    return np.array(ids[:frames])
+
+
+@pytest.mark.parametrize("window, overlap", [(40, 12), (64, 16), (100, 30), (500, 50)])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_inference_chunked_matches_single_pass(window, overlap, seed):
+    rng = np.random.default_rng(seed)
+    frame_ids = synth_frame_ids(337, rng)
+    feats = np.stack((frame_ids, np.arange(frame_ids.shape[0])), axis=1).astype(np.float32)
+    session = _FakeSession(feats.shape[0])
+
+    # 整段一次推理: 没有内部边界, 全部是真实 id
+    single = session.decoder.decode(
+        session._window_token_ids(feats, session.query(0, False))[None, :], with_timestamps=True)[0]
+    # 任意大小的特征块
+    sizes = rng.integers(1, 90, 40)
+    blocks = np.split(feats, np.cumsum(sizes)[np.cumsum(sizes) < feats.shape[0]])
+    chunked = session.inference_chunked(
+        iter(blocks), language=0, use_itn=False, window=window, overlap=overlap, with_timestamps=True)
+    assert chunked == single
+
+    # 至少有一个 token 横跨窗口重叠区, 确实测到了拼接
+    starts = [tok["frames"][0] - len(PROMPT_IDS) for tok in single["tokens"]]
+    ends = [tok["frames"][1] - len(PROMPT_IDS) for tok in single["tokens"]]
+    step = window - overlap
+    assert window >= feats.shape[0] or any(
+        s < w + overlap and e > w for w in range(step, feats.shape[0], step) for s, e in zip(starts, ends))
@@ -0,0 +1,46 @@
+# -*- coding:utf-8 -*-
+# decode 模型生成: 默认只追加 ArgMax(与 prompt 切片), log 概率需显式开启
+import numpy as np
+import pytest
+
+from libsensevoiceOne.onnx.decode_model import PROMPT_LOGITS, TOKEN_IDS, TOKEN_LOGPROB, make_decode_model
+
+onnx = pytest.importorskip("onnx")
+ort = pytest.importorskip("onnxruntime")
+
+
+@pytest.fixture
+def encoder_file(tmp_path):
+    """一个只把输入当作 ctc_logits 输出的最小 '编码器'"""
+    from onnx import TensorProto, helper
+
+    speech = helper.make_tensor_value_info("speech", TensorProto.FLOAT, ["B", "T", 10])
+    logits = helper.make_tensor_value_info("ctc_logits", TensorProto.FLOAT, ["B", "T", 10])
+    graph = helper.make_graph(
+        [helper.make_node("Identity", ["speech"], ["ctc_logits"])], "encoder", [speech], [logits])
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 17)], ir_version=8)
+    path = tmp_path / "encoder.onnx"
+    onnx.save(model, str(path))
+    return path
+
+
+def run(model_file, x):
+    session = ort.InferenceSession(str(model_file), providers=["CPUExecutionProvider"])
+    names = [o.name for o in session.get_outputs()]
+    return dict(zip(names, session.run(names, {"speech": x})))
+
+
+def test_default_has_no_logprob(encoder_file):
+    x = np.random.default_rng(0).standard_normal((2, 6, 10)).astype(np.float32)
+    out = run(make_decode_model(encoder_file, prompt_frames=4), x)
+    assert set(out) == {TOKEN_IDS, PROMPT_LOGITS}
+    np.testing.assert_array_equal(out[TOKEN_IDS], x.argmax(axis=-1))
+    np.testing.assert_array_equal(out[PROMPT_LOGITS], x[:, :4])
+
+
+def test_with_logprob(encoder_file, tmp_path):
+    x = np.random.default_rng(1).standard_normal((1, 5, 10)).astype(np.float32)
+    out = run(make_decode_model(encoder_file, tmp_path / "lp.onnx", with_logprob=True, prompt_frames=0), x)
+    assert set(out) == {TOKEN_IDS, TOKEN_LOGPROB}
+    log_softmax = x - np.log(np.exp(x).sum(axis=-1, keepdims=True))
+    np.testing.assert_allclose(out[TOKEN_LOGPROB], log_softmax.max(axis=-1), rtol=1e-5, atol=1e-6)
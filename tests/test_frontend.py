@@ -0,0 +1,100 @@
+# -*- coding:utf-8 -*-
+# 前端(LFR)向量化实现与原逐帧实现的一致性测试
+import numpy as np
+import pytest
+
+from libsensevoiceOne.utils.frontend import WavFrontend
+
+
+def reference_apply_lfr(inputs: np.ndarray, lfr_m: int, lfr_n: int) -> np.ndarray:
+    """原来的逐帧 apply_lfr 实现"""
+    LFR_inputs = []
+
+    T = inputs.shape[0]
+    T_lfr = int(np.ceil(T / lfr_n))
+    left_padding = np.tile(inputs[0], ((lfr_m - 1) // 2, 1))
+    inputs = np.vstack((left_padding, inputs))
+    T = T + (lfr_m - 1) // 2
+    for i in range(T_lfr):
+        if lfr_m <= T - i * lfr_n:
+            LFR_inputs.append(
+                (inputs[i * lfr_n : i * lfr_n + lfr_m]).reshape(1, -1)
+            )
+        else:
+            # process last LFR frame
+            num_padding = lfr_m - (T - i * lfr_n)
+            frame = inputs[i * lfr_n :].reshape(-1)
+            for _ in range(num_padding):
+                frame = np.hstack((frame, inputs[-1]))
+
+            LFR_inputs.append(frame)
+    LFR_outputs = np.vstack(LFR_inputs).astype(np.float32)
+    return LFR_outputs
+
+
+@pytest.mark.parametrize("lfr_m, lfr_n", [(7, 6), (5, 1), (1, 1), (3, 2)])
+@pytest.mark.parametrize("frames", [1, 2, 5, 6, 7, 13, 100, 997])
+def test_apply_lfr_matches_reference(lfr_m, lfr_n, frames):
+    rng = np.random.default_rng(frames * 31 + lfr_m)
+    fbank = rng.standard_normal((frames, 80)).astype(np.float32)
+
+    expected = reference_apply_lfr(fbank, lfr_m, lfr_n)
+    actual = WavFrontend.apply_lfr(fbank, lfr_m, lfr_n)
+
+    assert actual.dtype == np.float32
+    assert actual.shape == expected.shape
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=0)
+
+
+def test_default_fbank_backend_is_kaldi():
+    assert WavFrontend().fbank_backend == "kaldi"
+    assert WavFrontend(fbank_backend="numpy").fbank_backend == "numpy"
+
+
+@pytest.mark.parametrize("lfr_m, lfr_n", [(1, 1), (7, 6)])
+def test_lfr_cmvn_does_not_modify_input(tmp_path, lfr_m, lfr_n):
+    dim = 80 * lfr_m
+    cmvn_file = tmp_path / "am.mvn"
+    cmvn_file.write_text(
+        "<AddShift> %d %d\n<LearnRateCoef> 0 [ %s ]\n"
+        "<Rescale> %d %d\n<LearnRateCoef> 0 [ %s ]\n"
+        % (dim, dim, " ".join(["-1.5"] * dim), dim, dim, " ".join(["0.5"] * dim))
+    )
+    front = WavFrontend(str(cmvn_file), lfr_m=lfr_m, lfr_n=lfr_n)
+    fbank = np.random.default_rng(0).standard_normal((50, 80)).astype(np.float32)
+    before = fbank.copy()
+
+    feat, feat_len = front.lfr_cmvn(fbank)
+
+    np.testing.assert_array_equal(fbank, before)
+    expected = (reference_apply_lfr(before, lfr_m, lfr_n) - 1.5) * 0.5
+    np.testing.assert_allclose(feat, expected, rtol=1e-6)
+    assert feat_len == expected.shape[0]
+
+
+def synth_speech(seconds: float, seed: int, sr: int = 16000) -> np.ndarray:
+    """噪声背景上的谐波'语音', float32 [-1, 1]"""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sr)
+    wav = 0.003 * rng.standard_normal(n)
+    t = np.arange(n) / sr
+    for beg in np.arange(0.2, seconds - 0.5, 1.3):
+        mask = (t >= beg) & (t < beg + rng.uniform(0.3, 1.0))
+        tt = t[mask] - beg
+        f0 = rng.uniform(100, 250)
+        wav[mask] += rng.uniform(0.05, 0.3) * sum(np.sin(2 * np.pi * f0 * k * tt) / k for k in range(1, 12))
+    return wav.astype(np.float32)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_numpy_fbank_close_to_kaldi(seed):
+    # NumpyFbank 与 kaldi_native_fbank 的 log-mel 绝对误差 < 2e-3 (见 fbank.py)
+    kaldi = WavFrontend()
+    numpy_fb = WavFrontend(fbank_backend="numpy")
+    wav = synth_speech(6, seed)
+    noise = np.random.default_rng(seed).uniform(-1, 1, 16000 * 2).astype(np.float32)
+    for x in (wav, (wav * 32767).astype(np.int16), noise):
+        expected, _ = kaldi.fbank(x)
+        actual, _ = numpy_fb.fbank(x)
+        assert actual.shape == expected.shape
+        np.testing.assert_allclose(actual, expected, rtol=0, atol=2e-3)
@@ -0,0 +1,181 @@
+# -*- coding:utf-8 -*-
+# FSMN VAD 后处理(整数编码状态机、按块检测)与原 Enum 状态机的一致性测试
+import os
+from enum import Enum
+
+import numpy as np
+import pytest
+
+from libsensevoiceOne.utils.fsmn_vad import (
+    FSMNVad,
+    MULTIPLE_UTTERANCE_MODE,
+    SINGLE_UTTERANCE_MODE,
+    WindowDetector,
+)
+
+VAD_DIR = os.path.join(os.path.dirname(__file__), "..", "resources", "vad")
+
+# 原 Enum 状态机(873c498)在 synth_clip(30, seed) 上得到的语音片段 [start_ms, end_ms]
+ENUM_SEGMENTS = {
+    (0, SINGLE_UTTERANCE_MODE): [[780, 2370]],
+    (0, MULTIPLE_UTTERANCE_MODE): [
+        [780, 2370], [3480, 4370], [5400, 5960], [6400, 9290], [9910, 11740],
+        [12330, 13360], [14990, 18100], [19640, 21790], [23350, 26980], [27670, 28770],
+    ],
+    (1, SINGLE_UTTERANCE_MODE): [[60, 7150]],
+    (1, MULTIPLE_UTTERANCE_MODE): [
+        [60, 7150], [7920, 8910], [9450, 10710], [12260, 13290], [14360, 16460],
+        [17670, 19010], [20380, 21340], [23710, 27890], [28470, 29980],
+    ],
+    (2, SINGLE_UTTERANCE_MODE): [[1520, 5350]],
+    (2, MULTIPLE_UTTERANCE_MODE): [
+        [1520, 5350], [6640, 9670], [10260, 11210], [12010, 14340], [15380, 17440],
+        [18300, 20630], [21920, 24670], [25160, 26550],
+    ],
+}
+
+
+def synth_clip(seconds: float, seed: int, sr: int = 16000) -> np.ndarray:
+    """噪声背景上长短、响度、间隔随机的谐波'语音', float32 [-1, 1]"""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sr)
+    wav = 0.003 * rng.standard_normal(n)
+    t = 0
+    while t < n:
+        gap = int(rng.uniform(0.3, 2.0) * sr)
+        dur = int(rng.uniform(0.5, 4.0) * sr)
+        beg = min(n, t + gap)
+        end = min(n, beg + dur)
+        tt = np.arange(end - beg) / sr
+        f0 = rng.uniform(100, 250)
+        voice = sum(np.sin(2 * np.pi * f0 * k * tt + rng.uniform(0, 6)) / k for k in range(1, 12))
+        env = (0.5 + 0.5 * np.sin(2 * np.pi * rng.uniform(2, 6) * tt)) * rng.uniform(0.05, 0.3)
+        wav[beg:end] += voice * env + 0.02 * rng.standard_normal(end - beg)
+        t = end
+    return wav.astype(np.float32)
+
+
+@pytest.fixture(scope="module")
+def vad():
+    return FSMNVad(VAD_DIR, use_ort_cache=False)
+
+
+def run_segments(vad, waveform, detect_mode, per_frame):
+    opts = vad.vad.vad_opts
+    saved = opts.detect_mode, opts.output_frame_probs
+    # output_frame_probs 时 detect_block 逐帧走 get_frame_state/detect_one_frame
+    opts.detect_mode, opts.output_frame_probs = detect_mode, per_frame
+    try:
+        return vad.segments_offline(waveform)
+    finally:
+        opts.detect_mode, opts.output_frame_probs = saved
+        vad.vad.all_reset_detection()
+
+
+@pytest.mark.parametrize("per_frame", [False, True], ids=["block", "per_frame"])
+@pytest.mark.parametrize("seed, detect_mode", sorted(ENUM_SEGMENTS))
+def test_segments_match_enum_state_machine(vad, seed, detect_mode, per_frame):
+    segments = run_segments(vad, synth_clip(30, seed), detect_mode, per_frame)
+    assert segments == ENUM_SEGMENTS[(seed, detect_mode)]
+
+
+class _EnumFrame(Enum):
+    sil = 0
+    speech = 1
+
+
+class _EnumChange(Enum):
+    speech2speech = 0
+    speech2sil = 1
+    sil2sil = 2
+    sil2speech = 3
+
+
+class EnumWindowDetector:
+    """原 Enum 版 WindowDetector.detect_one_frame 的滑动窗口与迟滞判断"""
+
+    def __init__(self, window_size_ms, sil_to_speech_time, speech_to_sil_time, frame_size_ms):
+        self.win_size_frame = int(window_size_ms / frame_size_ms)
+        self.win_sum = 0
+        self.win_state = [0] * self.win_size_frame
+        self.cur_win_pos = 0
+        self.pre_frame_state = _EnumFrame.sil
+        self.sil_to_speech_frmcnt_thres = int(sil_to_speech_time / frame_size_ms)
+        self.speech_to_sil_frmcnt_thres = int(speech_to_sil_time / frame_size_ms)
+
+    def detect_one_frame(self, frame_state: _EnumFrame) -> _EnumChange:
+        cur_frame_state = 1 if frame_state == _EnumFrame.speech else 0
+        self.win_sum -= self.win_state[self.cur_win_pos]
+        self.win_sum += cur_frame_state
+        self.win_state[self.cur_win_pos] = cur_frame_state
+        self.cur_win_pos = (self.cur_win_pos + 1) % self.win_size_frame
+
+        if self.pre_frame_state == _EnumFrame.sil and self.win_sum >= self.sil_to_speech_frmcnt_thres:
+            self.pre_frame_state = _EnumFrame.speech
+            return _EnumChange.sil2speech
+        if self.pre_frame_state == _EnumFrame.speech and self.win_sum <= self.speech_to_sil_frmcnt_thres:
+            self.pre_frame_state = _EnumFrame.sil
+            return _EnumChange.speech2sil
+        if self.pre_frame_state == _EnumFrame.sil:
+            return _EnumChange.sil2sil
+        return _EnumChange.speech2speech
+
+
+@pytest.mark.parametrize("block", [1, 7, 64, 512])
+def test_window_detector_matches_enum(block):
+    rng = np.random.default_rng(block)
+    # 长短不一的语音/静音段, 含频繁抖动的部分
+    states = np.repeat(rng.integers(0, 2, 400), rng.integers(1, 40, 400)).astype(np.int8)
+    args = (200, 150, 150, 10)
+    ref = EnumWindowDetector(*args)
+    expected = [ref.detect_one_frame(_EnumFrame(s)).value for s in states.tolist()]
+
+    one = WindowDetector(*args)
+    assert [one.detect_one_frame(s, t) for t, s in enumerate(states.tolist())] == expected
+
+    blocks = WindowDetector(*args)
+    changes = []
+    for pos in range(0, states.shape[0], block):
+        changes += blocks.detect_frames(states[pos : pos + block])
+    assert changes == expected
+
+
+STATE_FIELDS = (
+    "vad_state_machine", "data_buf_start_frame", "data_buf_size", "latest_confirmed_speech_frame",
+    "lastest_confirmed_silence_frame", "continous_silence_frame_count", "confirmed_start_frame",
+    "confirmed_end_frame", "number_end_time_detected", "noise_average_decibel",
+)
+
+
+def stream_states(vad, waveform, options, per_frame, chunk=4000):
+    """流式处理, 每个块之后记录状态机的全部计数与已输出的片段"""
+    stream = vad.stream()
+    opts = stream.vad.vad_opts
+    for name, value in options.items():
+        setattr(opts, name, value)
+    opts.output_frame_probs = per_frame
+    states = []
+    for beg in range(0, waveform.shape[0], chunk):
+        events = stream.accept(waveform[beg : beg + chunk])
+        e2e = stream.vad
+        states.append((
+            events,
+            [getattr(e2e, name) for name in STATE_FIELDS],
+            [(seg.start_ms, seg.end_ms, seg.contain_seg_start_point, seg.contain_seg_end_point)
+             for seg in e2e.output_data_buf],
+        ))
+    states.append(stream.finish())
+    return states
+
+
+@pytest.mark.parametrize("options", [
+    {"detect_mode": MULTIPLE_UTTERANCE_MODE},
+    {"detect_mode": MULTIPLE_UTTERANCE_MODE, "max_single_segment_time": 1500},
+    {"detect_mode": SINGLE_UTTERANCE_MODE},
+    {"detect_mode": SINGLE_UTTERANCE_MODE, "max_start_silence_time": 700},
+    {"detect_mode": SINGLE_UTTERANCE_MODE, "max_single_segment_time": 900},
+], ids=["multiple", "multiple-seg-timeout", "single", "single-start-timeout", "single-seg-timeout"])
+def test_steady_runs_match_per_frame(vad, options):
+    # 按块检测时稳定的 sil2sil / speech2speech 整段处理, 各计数与逐帧处理完全一致(包括超时)
+    waveform = synth_clip(20, 3)
+    assert stream_states(vad, waveform, options, False) == stream_states(vad, waveform, options, True)
@@ -0,0 +1,85 @@
+# -*- coding:utf-8 -*-
+# ORT 优化模型缓存: 缓存键覆盖模型、会话选项、profile 与 CPU 特性
+import os
+import shutil
+
+import pytest
+from onnxruntime import ExecutionMode, GraphOptimizationLevel
+
+from libsensevoiceOne.onnx import ort_cache
+from libsensevoiceOne.onnx.ort_cache import cached_session
+from libsensevoiceOne.onnx.session_profiles import make_session_options, profile_key
+
+CPU = ["CPUExecutionProvider"]
+VAD_MODEL = os.path.join(os.path.dirname(__file__), "..", "resources", "vad", "fsmnvad-offline.onnx")
+
+
+@pytest.fixture
+def model_file(tmp_path):
+    path = tmp_path / "model.onnx"
+    shutil.copyfile(VAD_MODEL, path)
+    return path
+
+
+def make_options(profile=None, mode=ExecutionMode.ORT_SEQUENTIAL):
+    sess_opt = make_session_options(profile, vad=True)
+    sess_opt.log_severity_level = 4
+    sess_opt.graph_optimization_level = GraphOptimizationLevel.ORT_ENABLE_ALL
+    sess_opt.execution_mode = mode
+    return sess_opt
+
+
+def cache_files(cache_dir):
+    return sorted(p.name for p in cache_dir.glob("model.*.onnx"))
+
+
+def load(model_file, cache_dir, profile=None, **kwargs):
+    sess_opt = make_options(profile, **kwargs)
+    cached_session(model_file, sess_opt, CPU, cache_dir, options_key=profile_key(profile))
+    return cache_files(cache_dir)
+
+
+def test_same_settings_hit_cache(model_file, tmp_path):
+    cache_dir = tmp_path / "cache"
+    first = load(model_file, cache_dir)
+    assert len(first) == 1
+    mtime = (cache_dir / first[0]).stat().st_mtime_ns
+
+    sess_opt = make_options()
+    cached_session(model_file, sess_opt, CPU, cache_dir, options_key=profile_key(None))
+    # 命中时关闭图优化, 直接加载缓存的模型
+    assert sess_opt.graph_optimization_level == GraphOptimizationLevel.ORT_DISABLE_ALL
+    assert cache_files(cache_dir) == first
+    assert (cache_dir / first[0]).stat().st_mtime_ns == mtime
+
+
+def test_profile_change_misses_cache(model_file, tmp_path):
+    cache_dir = tmp_path / "cache"
+    first = load(model_file, cache_dir, "default")
+    second = load(model_file, cache_dir, "low-memory")
+    assert len(second) == 1 and second != first
+
+
+def test_execution_mode_change_misses_cache(model_file, tmp_path):
+    cache_dir = tmp_path / "cache"
+    first = load(model_file, cache_dir)
+    second = load(model_file, cache_dir, mode=ExecutionMode.ORT_PARALLEL)
+    assert second != first
+
+
+def test_cpu_change_misses_cache(model_file, tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    first = load(model_file, cache_dir)
+    monkeypatch.setattr(ort_cache, "cpu_features", lambda: "fpu sse2")
+    assert load(model_file, cache_dir) != first
+
+
+def test_model_change_misses_cache(model_file, tmp_path):
+    onnx = pytest.importorskip("onnx")
+    cache_dir = tmp_path / "cache"
+    first = load(model_file, cache_dir)
+
+    model = onnx.load(str(model_file))
+    model.doc_string = "changed"
+    onnx.save(model, str(model_file))
+    assert load(model_file, cache_dir) != first
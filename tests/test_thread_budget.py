@@ -0,0 +1,37 @@
+# -*- coding:utf-8 -*-
+# 线程预算: 通过公开的 SessionOptions 设置线程数与线程池的 CPU 绑定
+import pytest
+
+from libsensevoiceOne.onnx.session_profiles import make_session_options
+from libsensevoiceOne.thread_budget import ThreadBudget, intra_op_affinities
+
+AFFINITY_ENTRY = "session.intra_op_thread_affinities"
+
+
+def test_intra_op_affinities():
+    # 第一个"线程"是调用者, 其余每个线程池线程一个核, ORT 的编号从 1 开始
+    assert intra_op_affinities([1, 2, 3], 3) == "3;4"
+    assert intra_op_affinities([1, 2, 3], 2) == "3"
+    assert intra_op_affinities([1, 2, 3], 1) is None
+    assert intra_op_affinities([1], 2) is None
+
+
+def test_budget_profile_sets_affinities():
+    budget = ThreadBudget(cores=[0, 1, 2, 3], capture_cores=1, vad_threads=1, pin=True)
+    assert budget.capture_cores == [0] and budget.inference_cores == [1, 2, 3]
+
+    asr = make_session_options(budget.profile())
+    assert asr.intra_op_num_threads == 3
+    assert asr.get_session_config_entry(AFFINITY_ENTRY) == "3;4"
+
+    vad = make_session_options(budget.profile(), vad=True)
+    assert vad.intra_op_num_threads == 1
+    with pytest.raises(RuntimeError):
+        vad.get_session_config_entry(AFFINITY_ENTRY)
+
+
+def test_unpinned_budget_has_no_affinities():
+    sess_opt = make_session_options(ThreadBudget(cores=[0, 1, 2, 3]).profile())
+    assert sess_opt.intra_op_num_threads == 3
+    with pytest.raises(RuntimeError):
+        sess_opt.get_session_config_entry(AFFINITY_ENTRY)